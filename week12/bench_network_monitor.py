@@ -0,0 +1,187 @@
+"""Throughput benchmark for network_monitor.
+
+For each size, generates a seeded synthetic traffic log with
+traffic_generator, then measures in a fresh process:
+
+- parse rate of load_traffic_log in lines per second
+- analyze_traffic time
+- peak resident memory of that process
+
+A fresh process per size keeps the peak RSS of one run from hiding the
+next. Use --json to save a run and --baseline to compare against one.
+
+Usage: python bench_network_monitor.py [--sizes 10000,100000,1000000,10000000]
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DEFAULT_SIZES = (10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+REGRESSION_TOLERANCE = 0.10
+
+
+def measure(log_path: str, engine: str, workers: int) -> dict:
+    """Load and analyze one log in this process and return the timings."""
+    from network_monitor import (
+        NetworkConfig,
+        aggregate_traffic_log,
+        analyze_traffic,
+        load_traffic_log,
+        setup_logging,
+        stop_logging
+    )
+
+    setup_logging(log_file=str(Path(log_path).with_suffix(".bench.log")), log_level="CRITICAL")
+    config = NetworkConfig()
+
+    with open(log_path, "rb") as file:
+        lines = sum(1 for _ in file)
+
+    try:
+        started = time.perf_counter()
+        if workers > 1:
+            traffic = aggregate_traffic_log(log_path, workers, config)
+        else:
+            traffic = load_traffic_log(log_path)
+        parse_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = analyze_traffic(traffic, config, engine=engine)
+        analyze_seconds = time.perf_counter() - started
+    finally:
+        stop_logging()
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+
+    return {
+        "lines": lines,
+        "packets": results["total_packets"],
+        "parse_seconds": parse_seconds,
+        "lines_per_second": lines / parse_seconds if parse_seconds else 0.0,
+        "analyze_seconds": analyze_seconds,
+        "peak_rss_mb": peak / 1024
+    }
+
+
+def run_size(size: int, directory: Path, engine: str, workers: int, seed: int) -> dict:
+    """Generate a log of ``size`` packets and measure it in a child process."""
+    from traffic_generator import write_traffic_log
+
+    log_path = directory / f"traffic_{size}_{seed}.log"
+    if not log_path.exists():
+        write_traffic_log(log_path, size, seed=seed)
+
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", str(log_path), "--engine", engine, "--workers", str(workers)],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).resolve().parent
+    ).stdout
+
+    result = json.loads(output)
+    result["size"] = size
+    result["file_mb"] = log_path.stat().st_size / 1024 / 1024
+    return result
+
+
+def change(current: float, previous: float) -> str:
+    """Format a relative change, marking slowdowns past the tolerance."""
+    if not previous:
+        return ""
+    ratio = current / previous - 1
+    marker = " !" if ratio > REGRESSION_TOLERANCE else ""
+    return f"{ratio:+.0%}{marker}"
+
+
+def print_table(results: list, baseline=None):
+    """Print one row per size, with changes against a baseline if given."""
+    previous = {row["size"]: row for row in baseline or []}
+
+    header = f"{'Packets':>10} {'File MB':>8} {'Lines/sec':>12} {'Analyze s':>10} {'Peak RSS MB':>12}"
+    if baseline:
+        header += f" {'Parse time':>11} {'Analyze':>9} {'RSS':>7}"
+    print(header)
+    print("-" * len(header))
+
+    for row in results:
+        line = (
+            f"{row['size']:>10,} {row['file_mb']:>8.1f} {row['lines_per_second']:>12,.0f} "
+            f"{row['analyze_seconds']:>10.3f} {row['peak_rss_mb']:>12.1f}"
+        )
+
+        old = previous.get(row["size"])
+        if old:
+            line += (
+                f" {change(row['parse_seconds'], old['parse_seconds']):>11}"
+                f" {change(row['analyze_seconds'], old['analyze_seconds']):>9}"
+                f" {change(row['peak_rss_mb'], old['peak_rss_mb']):>7}"
+            )
+        print(line)
+
+
+def parse_sizes(text: str) -> list:
+    try:
+        sizes = [int(float(part)) for part in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Sizes must be comma separated numbers: {text}")
+
+    if any(size < 1 for size in sizes):
+        raise argparse.ArgumentTypeError("Sizes must be positive")
+    return sizes
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Benchmark network_monitor parsing and analysis")
+
+    parser.add_argument("--sizes", type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help="Comma separated packet counts, e.g. 1e4,1e5")
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", type=Path, help="Keep generated logs here and reuse them between runs")
+    parser.add_argument("--json", type=Path, help="Save the results to this file")
+    parser.add_argument("--baseline", type=Path, help="Compare against results saved with --json")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+
+    return parser
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.engine, args.workers)))
+        return 0
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = args.data_dir or Path(temp_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        for size in args.sizes:
+            print(f"Running {size:,} packets...", file=sys.stderr)
+            results.append(run_size(size, directory, args.engine, args.workers, args.seed))
+
+    print_table(results, baseline)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=4))
+        print(f"\nResults saved to: {args.json}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
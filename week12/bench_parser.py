@@ -0,0 +1,94 @@
+"""Microbenchmark for network_monitor packet line parsing.
+
+Compares the strict parser (parse_packet_line + PacketTable.append) with
+the fast path (parse_packet_fast, falling back to the strict parser for
+lines it does not accept). Prints lines per second for both.
+
+Usage: python bench_parser.py [line_count]
+"""
+
+import random
+import sys
+import time
+
+from network_monitor import PacketTable, parse_packet_fast, parse_packet_line
+
+
+def make_lines(count, messy_ratio=0.01, seed=42):
+    """Build synthetic traffic lines, a few of them padded or lower-case."""
+    rng = random.Random(seed)
+    lines = []
+
+    for _ in range(count):
+        line = (
+            f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)},"
+            f"192.168.{rng.randint(0, 255)}.{rng.randint(1, 254)},"
+            f"{rng.randint(1024, 65535)},{rng.randint(1, 1024)},"
+            f"{rng.choice(['TCP', 'UDP'])},{rng.choice(['SYN', 'ACK', 'FIN'])}\n"
+        )
+
+        if rng.random() < messy_ratio:
+            line = " " + line.lower().replace(",", " , ")
+
+        lines.append(line)
+
+    return lines
+
+
+def run_strict(lines):
+    table = PacketTable()
+    for line in lines:
+        line = line.strip()
+        if line:
+            table.append(parse_packet_line(line))
+    return table
+
+
+def run_fast(lines):
+    table = PacketTable()
+    for line in lines:
+        values = parse_packet_fast(line)
+        if values is not None:
+            table.append_values(*values)
+        else:
+            line = line.strip()
+            if line:
+                table.append(parse_packet_line(line))
+    return table
+
+
+def time_parser(parser, lines, repeat=3):
+    """Return the best lines/sec over a few runs."""
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser(lines)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return len(lines) / best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    lines = make_lines(count)
+
+    if list(run_strict(lines)) != list(run_fast(lines)):
+        print("ERROR: fast and strict parsers disagree")
+        return 1
+
+    strict_rate = time_parser(run_strict, lines)
+    fast_rate = time_parser(run_fast, lines)
+
+    print(f"Lines:          {count}")
+    print(f"Strict parser:  {strict_rate:,.0f} lines/sec")
+    print(f"Fast parser:    {fast_rate:,.0f} lines/sec")
+    print(f"Speedup:        {fast_rate / strict_rate:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
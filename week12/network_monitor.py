@@ -1,8 +1,44 @@
 import argparse
+import asyncio
+import glob
+import gzip
+import hashlib
+import io
+import ipaddress
 import json
 import logging
+import lzma
+import math
+import mmap
+import os
+import queue
+import random
+import struct
 import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import compress, repeat
+from logging.handlers import QueueHandler, QueueListener
+from operator import add, floordiv, lshift, or_, rshift
 from pathlib import Path
+from socket import inet_aton, inet_ntoa
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ENGINES = ("python", "numpy")
 
 
 class NetworkConfig:
@@ -11,15 +47,44 @@ class NetworkConfig:
     DEFAULT_PORT_SCAN_THRESHOLD = 25
     DEFAULT_SYN_FLOOD_THRESHOLD = 100
     DEFAULT_PACKET_RATE_THRESHOLD = 1000
+    DEFAULT_RATE_BUCKET_SECONDS = 1.0
+    DEFAULT_RATE_SLOTS = 8
 
-    def __init__(self, port_scan_threshold=None, syn_flood_threshold=None):
+    DEFAULT_DETECTORS = ("port_scan", "syn_flood", "packet_rate")
+    SKETCH_DETECTORS = ("port_scan_hll", "syn_flood_cms", "packet_rate")
+    DEFAULT_SKETCH_ERROR = 0.05
+    DEFAULT_CMS_EPSILON = 0.00001
+    DEFAULT_CMS_DELTA = 0.01
+
+    def __init__(self, port_scan_threshold=None, syn_flood_threshold=None, sketch=False, sketch_error=None,
+                 packet_rate_threshold=None, rate_bucket_seconds=None, cms_epsilon=None):
         self.port_scan_threshold = port_scan_threshold or self.DEFAULT_PORT_SCAN_THRESHOLD
         self.syn_flood_threshold = syn_flood_threshold or self.DEFAULT_SYN_FLOOD_THRESHOLD
-        self.packet_rate_threshold = self.DEFAULT_PACKET_RATE_THRESHOLD
+        self.packet_rate_threshold = packet_rate_threshold or self.DEFAULT_PACKET_RATE_THRESHOLD
+        self.rate_bucket_seconds = rate_bucket_seconds or self.DEFAULT_RATE_BUCKET_SECONDS
+        self.rate_slots = self.DEFAULT_RATE_SLOTS
+        self.detectors = self.SKETCH_DETECTORS if sketch else self.DEFAULT_DETECTORS
+        self.sketch_error = sketch_error or self.DEFAULT_SKETCH_ERROR
+        self.cms_epsilon = cms_epsilon or self.DEFAULT_CMS_EPSILON
+        self.cms_delta = self.DEFAULT_CMS_DELTA
+
+
+LOG_EVERY_LINES = 100000
+
+_log_listener = None
 
 
 def setup_logging(log_file="network_monitor.log", log_level="INFO"):
-    """Set up logging for the program."""
+    """Set up logging for the program.
+
+    The file handler runs behind a QueueHandler, so writing to the log
+    file happens on a background thread instead of in the packet loop.
+    Call stop_logging() before exiting to flush it.
+    """
+    global _log_listener
+
+    stop_logging()
+
     logger = logging.getLogger("network_monitor")
     logger.setLevel(logging.DEBUG)
     logger.handlers.clear()
@@ -30,24 +95,75 @@ def setup_logging(log_file="network_monitor.log", log_level="INFO"):
         "%(asctime)s - %(levelname)s - %(message)s"
     ))
 
+    log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _log_listener.start()
+
     console_handler = logging.StreamHandler()
     console_handler.setLevel(getattr(logging, log_level))
     console_handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
 
-    logger.addHandler(file_handler)
+    logger.addHandler(QueueHandler(log_queue))
     logger.addHandler(console_handler)
 
     return logger
 
 
+def stop_logging():
+    """Flush queued log records and stop the background log thread.
+
+    The QueueHandler feeding the thread is removed too, so later records
+    are not left piling up on a queue nobody reads.
+    """
+    global _log_listener
+
+    if _log_listener is not None:
+        logger = logging.getLogger("network_monitor")
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler) and handler.queue is _log_listener.queue:
+                logger.removeHandler(handler)
+
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
 def parse_packet_line(line: str) -> dict:
-    """Parse one packet line from the traffic log."""
+    """Parse one packet line from the traffic log.
+
+    A seventh field, if present, is the packet time in epoch seconds and
+    is returned under "timestamp".
+    """
+    src_ip, dst_ip, src_port, dst_port, protocol, flags, timestamp = parse_packet_fields(line)
+
+    packet = {
+        "src_ip": src_ip,
+        "dst_ip": dst_ip,
+        "src_port": src_port,
+        "dst_port": dst_port,
+        "protocol": protocol,
+        "flags": flags
+    }
+
+    if timestamp is not None:
+        packet["timestamp"] = timestamp
+
+    return packet
+
+
+def parse_packet_fields(line: str) -> tuple:
+    """Parse a packet line like parse_packet_line, but into a tuple.
+
+    Returns (src_ip, dst_ip, src_port, dst_port, protocol, flags,
+    timestamp), with timestamp None when the line has none.
+    """
     parts = [item.strip() for item in line.split(",")]
 
-    if len(parts) != 6:
-        raise ValueError("Packet line must have 6 fields")
+    if len(parts) not in (6, 7):
+        raise ValueError("Packet line must have 6 fields, or 7 with a timestamp")
 
-    src_ip, dst_ip, src_port, dst_port, protocol, flags = parts
+    src_ip, dst_ip, src_port, dst_port, protocol, flags = parts[:6]
 
     try:
         src_port = int(src_port)
@@ -55,14 +171,75 @@ def parse_packet_line(line: str) -> dict:
     except ValueError:
         raise ValueError("Ports must be numbers")
 
-    return {
-        "src_ip": src_ip,
-        "dst_ip": dst_ip,
-        "src_port": src_port,
-        "dst_port": dst_port,
-        "protocol": protocol.upper(),
-        "flags": flags.upper()
-    }
+    timestamp = _parse_timestamp(parts[6]) if len(parts) == 7 else None
+    return src_ip, dst_ip, src_port, dst_port, protocol.upper(), flags.upper(), timestamp
+
+
+def _parse_timestamp(text: str) -> float:
+    try:
+        timestamp = float(text)
+    except ValueError:
+        raise ValueError("Timestamp must be a number of seconds")
+
+    if not math.isfinite(timestamp):
+        raise ValueError("Timestamp must be a number of seconds")
+    return timestamp
+
+
+def parse_packet_fast(line: str):
+    """Parse a clean packet line straight into packed values.
+
+    Handles the common case of a line with no padding, dotted-quad IPs
+    and upper-case protocol and flags, without building a dict or
+    stripping each field. Returns None for anything else so the caller
+    can fall back to parse_packet_line and its error messages. Lines
+    with a timestamp give a seventh value.
+    """
+    fields = line.split(",")
+
+    if len(fields) == 6:
+        src_ip, dst_ip, src_port, dst_port, protocol, flags = fields
+        flags = flags.rstrip("\r\n")
+        timestamp = None
+    elif len(fields) == 7:
+        src_ip, dst_ip, src_port, dst_port, protocol, flags, timestamp = fields
+        try:
+            timestamp = float(timestamp)
+        except ValueError:
+            return None
+        if not math.isfinite(timestamp):
+            return None
+    else:
+        return None
+
+    if not (protocol.isalpha() and protocol.isupper() and flags.isalpha() and flags.isupper()):
+        return None
+
+    try:
+        src_packed = inet_aton(src_ip)
+        dst_packed = inet_aton(dst_ip)
+        src_port = int(src_port)
+        dst_port = int(dst_port)
+    except (OSError, ValueError):
+        return None
+
+    # inet_aton also accepts shorthand like "10.1" or leading zeros,
+    # so only trust addresses that round-trip to the same text.
+    if inet_ntoa(src_packed) != src_ip or inet_ntoa(dst_packed) != dst_ip:
+        return None
+
+    values = (
+        int.from_bytes(src_packed, "big"),
+        int.from_bytes(dst_packed, "big"),
+        src_port,
+        dst_port,
+        protocol,
+        flags
+    )
+
+    if timestamp is not None:
+        values += (timestamp,)
+    return values
 
 
 def is_syn_packet(packet: dict) -> bool:
@@ -70,49 +247,1236 @@ def is_syn_packet(packet: dict) -> bool:
     return packet["protocol"] == "TCP" and packet["flags"] == "SYN"
 
 
-def detect_port_scan(packets: list, src_ip: str, threshold: int) -> bool:
-    """Check if one source IP touched too many destination ports."""
-    ports = set()
+def ip_to_int(ip: str) -> int:
+    """Pack a dotted IPv4 address into an unsigned 32-bit integer."""
+    try:
+        return int(ipaddress.IPv4Address(ip))
+    except ipaddress.AddressValueError:
+        raise ValueError(f"Invalid IPv4 address: {ip}")
+
+
+def int_to_ip(value: int) -> str:
+    """Turn a packed IPv4 address back into dotted form."""
+    return inet_ntoa(value.to_bytes(4, "big"))
 
-    for packet in packets:
-        if packet["src_ip"] == src_ip:
-            ports.add(packet["dst_port"])
 
-    return len(ports) > threshold
+WIDE_ADDRESS_BASE = 1 << 32
 
 
-def detect_syn_flood(packets: list, src_ip: str, threshold: int) -> bool:
+def address_key(ip: str) -> int:
+    """Turn an address into the integer the detectors count it under.
+
+    IPv4 addresses are their packed value. Anything else, such as an
+    IPv6 address or a host name, gets a number above 2**32 built from
+    its text, so it is reported exactly as it was written.
+    """
+    try:
+        return ip_to_int(ip)
+    except ValueError:
+        return WIDE_ADDRESS_BASE + int.from_bytes(b"\x01" + ip.encode("utf-8"), "big")
+
+
+def key_to_address(key: int) -> str:
+    """Turn an address_key back into the address text."""
+    if key < WIDE_ADDRESS_BASE:
+        return int_to_ip(key)
+
+    key -= WIDE_ADDRESS_BASE
+    return key.to_bytes((key.bit_length() + 7) // 8, "big")[1:].decode("utf-8")
+
+
+def domain_labels(domain: str):
+    """Return the lower-case labels of a domain ("*." prefix dropped), or None if malformed."""
+    domain = domain.strip().lower().rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+
+    labels = domain.split(".")
+    if not domain or "" in labels:
+        return None
+    return labels
+
+
+class ThreatLookup:
+    """Known-bad IPs, networks and domains from a threat_aggregator lookup file.
+
+    The file keeps one table per prefix length, keyed by the leading
+    network bits, so a longest-prefix match is at most one dict probe
+    per prefix length in use instead of a scan over every indicator.
+    Domains are a trie of their labels, last label first, so a listed
+    domain also matches its subdomains in one probe per label.
+    """
+
+    FORMAT = "threat_lookup"
+    VERSION = 1
+
+    def __init__(self, data: dict):
+        if not isinstance(data, dict) or data.get("format") != self.FORMAT:
+            raise ValueError("Not a threat lookup file")
+
+        if data.get("version") != self.VERSION:
+            raise ValueError(f"Unsupported threat lookup version: {data.get('version')}")
+
+        try:
+            self.indicators = data["indicators"]
+            self.ipv4 = self._prefix_tables(data["ipv4"], 32)
+            self.ipv6 = self._prefix_tables(data["ipv6"], 128)
+            self.domains = dict(data.get("domains", {}))
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise ValueError("Threat lookup file is incomplete")
+
+    def _prefix_tables(self, tables: dict, bits: int) -> list:
+        """Return (shift, {network bits: indicator}) pairs, longest prefix first."""
+        return [
+            (bits - int(length), {int(key): self.indicators[index] for key, index in table.items()})
+            for length, table in sorted(tables.items(), key=lambda item: int(item[0]), reverse=True)
+        ]
+
+    @classmethod
+    def load(cls, filepath: str):
+        """Read a lookup file written by threat_aggregator.py."""
+        try:
+            with open(filepath, encoding="utf-8") as file:
+                data = json.load(file)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Malformed threat lookup {filepath}: {error}")
+
+        return cls(data)
+
+    def __len__(self) -> int:
+        return len(self.indicators)
+
+    def match_int(self, address: int, version=4):
+        """Return the indicator of the longest network containing a packed address, or None."""
+        for shift, table in (self.ipv4 if version == 4 else self.ipv6):
+            indicator = table.get(address >> shift)
+            if indicator is not None:
+                return indicator
+        return None
+
+    def match_ip(self, ip: str):
+        """Return the indicator of the longest network containing ``ip``, or None."""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        return self.match_int(int(address), address.version)
+
+    def match_domain(self, name: str):
+        """Return the indicator of the longest listed domain that ``name`` is in, or None."""
+        labels = domain_labels(name)
+        if labels is None:
+            return None
+
+        match = None
+        node = self.domains
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            if "" in node:
+                match = node[""]
+
+        return None if match is None else self.indicators[match]
+
+    def match_address(self, address: str):
+        """Return the indicator for an IP address or host name, or None."""
+        indicator = self.match_ip(address)
+        if indicator is None:
+            indicator = self.match_domain(address)
+        return indicator
+
+    def match_key(self, key: int):
+        """Return the indicator for an address_key, IPv4 or not, or None."""
+        if key < WIDE_ADDRESS_BASE:
+            return self.match_int(key)
+        return self.match_address(key_to_address(key))
+
+
+def threat_match(src_ip: str, indicator: dict) -> dict:
+    """Describe a source that matched a threat indicator."""
+    return {
+        "ip": src_ip,
+        "indicator": indicator["value"],
+        "threat_level": indicator["threat_level"],
+        "confidence": indicator["confidence"],
+        "sources": indicator["sources"]
+    }
+
+
+class PacketTable:
+    """Column store for packets backed by typed arrays.
+
+    IPs are packed into uint32, ports into uint16, and protocol and flag
+    strings are interned into one-byte codes. ``timestamps`` stays None
+    until a packet with a timestamp is added; rows without one hold NaN.
+
+    Addresses that are not IPv4, such as IPv6 addresses, are interned in
+    ``addresses`` and stored as ``WIDE_ADDRESS_BASE`` plus their index.
+    The first one widens both address columns to uint64, so pure IPv4
+    traffic keeps the 32-bit columns.
+
+    ``skipped`` counts packets from_packets could not store.
+    """
+
+    def __init__(self):
+        self.src_ips = array("I")
+        self.dst_ips = array("I")
+        self.src_ports = array("H")
+        self.dst_ports = array("H")
+        self.protocols = array("B")
+        self.flags = array("B")
+        self.timestamps = None
+        self.addresses = []
+        self._address_codes = {}
+        self.skipped = 0
+        self.protocol_names = []
+        self.flag_names = []
+        self._protocol_codes = {}
+        self._flag_codes = {}
+
+    def __len__(self):
+        return len(self.src_ips)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.packet(index)
+
+    @classmethod
+    def from_packets(cls, packets):
+        """Build a table from a list of packet dictionaries.
+
+        A packet the table cannot hold, such as one with a port above
+        65535, is counted in ``skipped`` instead of stopping the build.
+        """
+        table = cls()
+        for packet in packets:
+            try:
+                table.append(packet)
+            except ValueError:
+                table.skipped += 1
+        return table
+
+    def _intern(self, value: str, codes: dict, names: list) -> int:
+        code = codes.get(value)
+        if code is None:
+            if len(names) > 255:
+                raise ValueError(f"Too many distinct values, cannot store: {value}")
+            code = codes[value] = len(names)
+            names.append(value)
+        return code
+
+    def protocol_code(self, protocol: str) -> int:
+        """Return the code for a protocol name, adding it if needed."""
+        return self._intern(protocol, self._protocol_codes, self.protocol_names)
+
+    def flag_code(self, flags: str) -> int:
+        """Return the code for a flags value, adding it if needed."""
+        return self._intern(flags, self._flag_codes, self.flag_names)
+
+    def address_code(self, ip: str) -> int:
+        """Return the column value for an address, interning it if it is not IPv4."""
+        try:
+            return ip_to_int(ip)
+        except ValueError:
+            pass
+
+        code = self._address_codes.get(ip)
+        if code is None:
+            if not self.addresses:
+                self.src_ips = array("Q", self.src_ips)
+                self.dst_ips = array("Q", self.dst_ips)
+            code = self._address_codes[ip] = WIDE_ADDRESS_BASE + len(self.addresses)
+            self.addresses.append(ip)
+        return code
+
+    def address(self, code: int) -> str:
+        """Return the address text stored under a column value."""
+        if code < WIDE_ADDRESS_BASE:
+            return int_to_ip(code)
+        return self.addresses[code - WIDE_ADDRESS_BASE]
+
+    def address_keys(self) -> dict:
+        """Map each interned address's column value to its address_key."""
+        return {WIDE_ADDRESS_BASE + index: address_key(ip) for index, ip in enumerate(self.addresses)}
+
+    def append(self, packet: dict):
+        """Add one parsed packet to the table."""
+        self.append_values(
+            self.address_code(packet["src_ip"]),
+            self.address_code(packet["dst_ip"]),
+            packet["src_port"],
+            packet["dst_port"],
+            packet["protocol"],
+            packet["flags"],
+            packet.get("timestamp")
+        )
+
+    def append_values(self, src_ip: int, dst_ip: int, src_port: int, dst_port: int, protocol: str, flags: str,
+                      timestamp=None):
+        """Add one packet from already packed addresses."""
+        if not (0 <= src_port <= 65535 and 0 <= dst_port <= 65535):
+            raise ValueError("Ports must be between 0 and 65535")
+
+        protocol = self.protocol_code(protocol)
+        flags = self.flag_code(flags)
+
+        self.src_ips.append(src_ip)
+        self.dst_ips.append(dst_ip)
+        self.src_ports.append(src_port)
+        self.dst_ports.append(dst_port)
+        self.protocols.append(protocol)
+        self.flags.append(flags)
+
+        if timestamp is not None and self.timestamps is None:
+            self.timestamps = array("d", [math.nan]) * (len(self.src_ips) - 1)
+        if self.timestamps is not None:
+            self.timestamps.append(math.nan if timestamp is None else timestamp)
+
+    def packet(self, index: int) -> dict:
+        """Rebuild the packet dictionary stored at one row."""
+        packet = {
+            "src_ip": self.address(self.src_ips[index]),
+            "dst_ip": self.address(self.dst_ips[index]),
+            "src_port": self.src_ports[index],
+            "dst_port": self.dst_ports[index],
+            "protocol": self.protocol_names[self.protocols[index]],
+            "flags": self.flag_names[self.flags[index]]
+        }
+
+        if self.timestamps is not None and not math.isnan(self.timestamps[index]):
+            packet["timestamp"] = self.timestamps[index]
+        return packet
+
+    COLUMNS = ("src_ips", "dst_ips", "src_ports", "dst_ports", "protocols", "flags")
+
+    @classmethod
+    def from_columns(cls, columns: dict, protocol_names: list, flag_names: list, buffer=None):
+        """Build a table around existing column buffers, such as mmap views.
+
+        ``buffer`` is kept so that a memory map outlives the views into it.
+        """
+        table = cls()
+        for name in cls.COLUMNS:
+            setattr(table, name, columns[name])
+        table.timestamps = columns.get("timestamps")
+
+        for name in protocol_names:
+            table.protocol_code(name)
+        for name in flag_names:
+            table.flag_code(name)
+
+        table._buffer = buffer
+        return table
+
+    def syn_codes(self):
+        """Return the (protocol, flags) codes of TCP SYN, or None if never seen."""
+        protocol = self._protocol_codes.get("TCP")
+        flags = self._flag_codes.get("SYN")
+
+        if protocol is None or flags is None:
+            return None
+        return protocol, flags
+
+
+FIELD_COLUMNS = {
+    "src_ip": "src_ips",
+    "dst_ip": "dst_ips",
+    "src_port": "src_ports",
+    "dst_port": "dst_ports",
+    "protocol": "protocols",
+    "flags": "flags",
+    "timestamp": "timestamps"
+}
+ADDRESS_FIELDS = {"src_ip", "dst_ip"}
+
+DETECTORS = {}
+DETECTOR_BLOCK_SIZE = 65536
+
+
+def register_detector(cls):
+    """Class decorator that makes a detector available by its name."""
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+class Detector:
+    """Base class for batch detectors.
+
+    A detector lists the packet ``fields`` it reads. TrafficAggregator
+    walks the packets once, a block at a time, and calls ``update`` with
+    one column slice per field. The detector keeps a per-source value
+    that is compared against ``config.<threshold_attr>``.
+    """
+
+    name = ""
+    fields = ()
+    result_key = ""
+    threshold_attr = ""
+    alert_message = "%s"
+
+    @classmethod
+    def from_config(cls, config: NetworkConfig) -> "Detector":
+        """Create a detector; override to read settings from the config."""
+        return cls()
+
+    def prepare(self, table: PacketTable):
+        """Look up anything table-specific, such as interned codes."""
+
+    def update(self, *columns):
+        """Count one block of packets."""
+        raise NotImplementedError
+
+    def merge(self, other: "Detector"):
+        """Fold another detector's state for the same traffic into this one."""
+        raise NotImplementedError
+
+    def value(self, src_ip: int) -> int:
+        """Return the current value for one packed source IP."""
+        raise NotImplementedError
+
+    def values(self, sources: list) -> list:
+        """Return the values for many packed source IPs."""
+        return [self.value(src_ip) for src_ip in sources]
+
+    def numpy_values(self, table: PacketTable, sources, inverse):
+        """Return values aligned with ``sources`` using NumPy, or None if unsupported."""
+        return None
+
+    def threshold(self, config: NetworkConfig) -> int:
+        """Return the configured threshold for this detector."""
+        return getattr(config, self.threshold_attr)
+
+    def error_report(self) -> dict:
+        """Describe the estimation error of an approximate detector, or None."""
+        return None
+
+    def state(self) -> dict:
+        """Return the detector's counts as plain JSON data, for partials and checkpoints."""
+        raise NotImplementedError
+
+    def load_state(self, state: dict):
+        """Replace the detector's counts with data returned by ``state``."""
+        raise NotImplementedError
+
+
+@register_detector
+class PortScanDetector(Detector):
+    """Counts distinct destination ports per source IP.
+
+    Each (source, port) pair is stored as one integer, source << 16 | port,
+    so a block is added to the set with C-level map calls instead of a
+    Python loop with a set per source.
+    """
+
+    name = "port_scan"
+    fields = ("src_ip", "dst_port")
+    result_key = "port_scans"
+    threshold_attr = "port_scan_threshold"
+    alert_message = "Port scan detected from %s"
+
+    def __init__(self):
+        self.pairs = set()
+        self._counts = None
+
+    def update(self, src_ips, dst_ports):
+        self.pairs.update(map(or_, map(lshift, src_ips, repeat(16)), dst_ports))
+        self._counts = None
+
+    def merge(self, other):
+        self.pairs |= other.pairs
+        self._counts = None
+
+    def state(self):
+        return {"pairs": list(self.pairs)}
+
+    def load_state(self, state):
+        self.pairs = set(map(int, state["pairs"]))
+        self._counts = None
+
+    def _port_counts(self) -> Counter:
+        if self._counts is None:
+            self._counts = Counter(map(rshift, self.pairs, repeat(16)))
+        return self._counts
+
+    def value(self, src_ip):
+        return self._port_counts().get(src_ip, 0)
+
+    def values(self, sources):
+        return list(map(self._port_counts().get, sources, repeat(0)))
+
+    def numpy_values(self, table, sources, inverse):
+        src_ips = np.frombuffer(table.src_ips, dtype=np.uint32)
+        dst_ports = np.frombuffer(table.dst_ports, dtype=np.uint16)
+
+        pairs = np.unique((src_ips.astype(np.uint64) << 16) | dst_ports)
+        pair_sources = np.searchsorted(sources, (pairs >> 16).astype(np.uint32))
+        return np.bincount(pair_sources, minlength=len(sources))
+
+
+def _match_table(code: int) -> bytes:
+    """Build a bytes.translate table that maps ``code`` to 1 and all else to 0."""
+    return bytes(1 if value == code else 0 for value in range(256))
+
+
+@register_detector
+class SynFloodDetector(Detector):
+    """Counts TCP SYN packets per source IP."""
+
+    name = "syn_flood"
+    fields = ("src_ip", "protocol", "flags")
+    result_key = "syn_floods"
+    threshold_attr = "syn_flood_threshold"
+    alert_message = "SYN flood detected from %s"
+
+    def __init__(self):
+        self.counts = Counter()
+        self._protocol_table = None
+        self._flag_table = None
+
+    def prepare(self, table):
+        syn_codes = table.syn_codes()
+
+        if syn_codes is None:
+            self._protocol_table = None
+        else:
+            self._protocol_table = _match_table(syn_codes[0])
+            self._flag_table = _match_table(syn_codes[1])
+
+    def update(self, src_ips, protocols, flags):
+        if self._protocol_table is None:
+            return
+
+        # Turn each code column into 0/1 bytes and AND them as big integers,
+        # which gives a SYN mask for the block without a Python-level loop.
+        is_tcp = bytes(protocols).translate(self._protocol_table)
+        is_syn = bytes(flags).translate(self._flag_table)
+        mask = int.from_bytes(is_tcp, "little") & int.from_bytes(is_syn, "little")
+
+        self.add_syn_sources(compress(src_ips, mask.to_bytes(len(is_tcp), "little")))
+
+    def add_syn_sources(self, src_ips):
+        """Count one SYN for every source IP in the iterable."""
+        self.counts.update(src_ips)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def state(self):
+        return {"sources": list(self.counts), "counts": list(self.counts.values())}
+
+    def load_state(self, state):
+        self.counts = Counter(dict(zip(map(int, state["sources"]), map(int, state["counts"]))))
+
+    def value(self, src_ip):
+        return self.counts.get(src_ip, 0)
+
+    def values(self, sources):
+        return list(map(self.counts.get, sources, repeat(0)))
+
+    def numpy_values(self, table, sources, inverse):
+        syn_codes = table.syn_codes()
+        if syn_codes is None:
+            return np.zeros(len(sources), dtype=np.int64)
+
+        protocols = np.frombuffer(table.protocols, dtype=np.uint8)
+        flags = np.frombuffer(table.flags, dtype=np.uint8)
+        is_syn = (protocols == syn_codes[0]) & (flags == syn_codes[1])
+        return np.bincount(inverse[is_syn], minlength=len(sources))
+
+
+MASK64 = (1 << 64) - 1
+_HLL_TABLES = {}
+
+
+def _splitmix64(value: int) -> int:
+    """Mix an integer into a well-spread 64-bit hash."""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def _hll_tables(precision: int):
+    """Return the register index and rank of every port for one precision.
+
+    Ports only have 65536 values, so their hashes are worked out once
+    instead of per packet.
+    """
+    if precision not in _HLL_TABLES:
+        rest_bits = 64 - precision
+        indexes = array("H")
+        ranks = array("B")
+
+        for port in range(65536):
+            hashed = _splitmix64(port)
+            indexes.append(hashed >> rest_bits)
+            ranks.append(rest_bits - (hashed & ((1 << rest_bits) - 1)).bit_length() + 1)
+
+        _HLL_TABLES[precision] = (indexes, ranks)
+
+    return _HLL_TABLES[precision]
+
+
+@register_detector
+class HyperLogLogPortScanDetector(Detector):
+    """Estimates distinct destination ports per source with HyperLogLog.
+
+    A source keeps an exact set of ports until it has more than a
+    quarter of the register count, then switches to a fixed-size array
+    of registers. Memory per source is therefore capped no matter how
+    many ports it touches.
+    """
+
+    name = "port_scan_hll"
+    fields = ("src_ip", "dst_port")
+    result_key = "port_scans"
+    threshold_attr = "port_scan_threshold"
+    alert_message = "Port scan detected from %s"
+
+    def __init__(self, relative_error=NetworkConfig.DEFAULT_SKETCH_ERROR):
+        self.precision = min(16, max(4, math.ceil(math.log2((1.04 / relative_error) ** 2))))
+        self.registers = 1 << self.precision
+        self.exact_limit = self.registers // 4
+        self.states = {}
+
+        if self.registers >= 128:
+            self.alpha = 0.7213 / (1 + 1.079 / self.registers)
+        else:
+            self.alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.registers]
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.sketch_error)
+
+    def _to_registers(self, ports) -> bytearray:
+        indexes, ranks = _hll_tables(self.precision)
+        registers = bytearray(self.registers)
+
+        for port in ports:
+            index = indexes[port]
+            if registers[index] < ranks[port]:
+                registers[index] = ranks[port]
+
+        return registers
+
+    def _add_ports(self, src_ip: int, ports):
+        state = self.states.get(src_ip)
+
+        if state is None:
+            state = self.states[src_ip] = set()
+
+        if type(state) is set:
+            state.update(ports)
+            if len(state) > self.exact_limit:
+                self.states[src_ip] = self._to_registers(state)
+            return
+
+        indexes, ranks = _hll_tables(self.precision)
+        for port in ports:
+            index = indexes[port]
+            if state[index] < ranks[port]:
+                state[index] = ranks[port]
+
+    def update(self, src_ips, dst_ports):
+        # Drop repeated (source, port) pairs inside the block before the
+        # per-source work, which is the only Python-level loop here.
+        for pair in set(map(or_, map(lshift, src_ips, repeat(16)), dst_ports)):
+            self._add_ports(pair >> 16, (pair & 0xFFFF,))
+
+    def merge(self, other):
+        for src_ip, state in other.states.items():
+            if type(state) is set:
+                self._add_ports(src_ip, state)
+                continue
+
+            existing = self.states.get(src_ip)
+            if existing is None:
+                self.states[src_ip] = bytearray(state)
+            elif type(existing) is set:
+                registers = bytearray(state)
+                self.states[src_ip] = registers
+                self._add_ports(src_ip, existing)
+            else:
+                self.states[src_ip] = bytearray(map(max, existing, state))
+
+    def state(self):
+        exact = [[src_ip, list(ports)] for src_ip, ports in self.states.items() if type(ports) is set]
+        registers = [[src_ip, list(state)] for src_ip, state in self.states.items() if type(state) is not set]
+        return {"exact": exact, "registers": registers}
+
+    def load_state(self, state):
+        self.states = {int(src_ip): set(map(int, ports)) for src_ip, ports in state["exact"]}
+
+        for src_ip, registers in state["registers"]:
+            if len(registers) != self.registers:
+                raise ValueError(f"HyperLogLog state has {len(registers)} registers, expected {self.registers}")
+            self.states[int(src_ip)] = bytearray(registers)
+
+    def value(self, src_ip):
+        state = self.states.get(src_ip)
+
+        if state is None:
+            return 0
+        if type(state) is set:
+            return len(state)
+
+        estimate = self.alpha * self.registers ** 2 / sum(2.0 ** -rank for rank in state)
+        zeros = state.count(0)
+
+        if estimate <= 2.5 * self.registers and zeros:
+            estimate = self.registers * math.log(self.registers / zeros)
+
+        return min(65536, round(estimate))
+
+    def error_report(self):
+        return {
+            "method": "hyperloglog",
+            "registers": self.registers,
+            "relative_standard_error": round(1.04 / math.sqrt(self.registers), 4),
+            "exact_up_to": self.exact_limit
+        }
+
+
+@register_detector
+class CountMinSynFloodDetector(SynFloodDetector):
+    """Counts SYN packets per source in a count-min sketch.
+
+    The sketch has a fixed width and depth, so its memory does not grow
+    with the number of sources. Counts can only be over-estimated, by at
+    most epsilon times the total SYN count with probability 1 - delta.
+    The width is e / epsilon counters per row, so a smaller epsilon
+    (``--cms-epsilon``) costs memory in every chunk and partial.
+    """
+
+    name = "syn_flood_cms"
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, epsilon=NetworkConfig.DEFAULT_CMS_EPSILON, delta=NetworkConfig.DEFAULT_CMS_DELTA):
+        super().__init__()
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.total = 0
+        self.rows = [array("Q", bytes(8 * self.width)) for _ in range(self.depth)]
+
+        seeds = random.Random(2646)
+        self.hashes = [
+            (seeds.randrange(1, self.PRIME), seeds.randrange(self.PRIME))
+            for _ in range(self.depth)
+        ]
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.cms_epsilon, config.cms_delta)
+
+    def _columns(self, src_ip: int):
+        return [(a * src_ip + b) % self.PRIME % self.width for a, b in self.hashes]
+
+    def add_syn_sources(self, src_ips):
+        for src_ip, count in Counter(src_ips).items():
+            self.total += count
+            for row, column in zip(self.rows, self._columns(src_ip)):
+                row[column] += count
+
+    def merge(self, other):
+        self.total += other.total
+        for index, other_row in enumerate(other.rows):
+            if np is not None:
+                row = np.frombuffer(self.rows[index], dtype=np.uint64)
+                row += np.frombuffer(other_row, dtype=np.uint64)
+            else:
+                self.rows[index] = array("Q", map(add, self.rows[index], other_row))
+
+    def state(self):
+        # Most counters stay 0, so each row is saved as its non-zero
+        # columns and their counts.
+        rows = []
+        for row in self.rows:
+            columns = list(compress(range(self.width), row))
+            rows.append([columns, [row[column] for column in columns]])
+        return {"total": self.total, "rows": rows}
+
+    def load_state(self, state):
+        if len(state["rows"]) != self.depth:
+            raise ValueError(f"Count-min state has {len(state['rows'])} rows, expected {self.depth}")
+
+        self.total = int(state["total"])
+        self.rows = []
+        for columns, counts in state["rows"]:
+            if len(columns) != len(counts) or not all(0 <= column < self.width for column in columns):
+                raise ValueError("Count-min state has a row that does not fit the sketch width")
+
+            row = array("Q", bytes(8 * self.width))
+            for column, count in zip(columns, counts):
+                row[column] = count
+            self.rows.append(row)
+
+    def value(self, src_ip):
+        return min(row[column] for row, column in zip(self.rows, self._columns(src_ip)))
+
+    def values(self, sources):
+        return [self.value(src_ip) for src_ip in sources]
+
+    def numpy_values(self, table, sources, inverse):
+        return None
+
+    def error_report(self):
+        return {
+            "method": "count-min",
+            "width": self.width,
+            "depth": self.depth,
+            "max_overcount": math.ceil(self.epsilon * self.total),
+            "confidence": 1 - self.delta
+        }
+
+
+class RateRing:
+    """Packet counts for the most recent time buckets of one source.
+
+    Bucket ``n`` lives in slot ``n % len(counts)``, so adding a packet is
+    O(1) and memory is fixed. Packets for a bucket that has already been
+    overwritten by a newer one are too late to count and are dropped.
+    ``peak`` is the highest count any bucket reached.
+
+    The ring forgets the oldest buckets, so ``head`` also keeps the exact
+    counts of the buckets within ``slots`` of the first one. With both
+    ends known, two rings for consecutive parts of the same traffic, such
+    as file chunks, merge exactly as long as the parts overlap by fewer
+    than ``slots`` buckets.
+    """
+
+    __slots__ = ("buckets", "counts", "peak", "head", "head_end")
+
+    def __init__(self, slots: int):
+        self.buckets = [-1] * slots
+        self.counts = [0] * slots
+        self.peak = 0
+        self.head = {}
+        self.head_end = None
+
+    def add(self, bucket: int, count=1) -> int:
+        """Add packets to a bucket and return its new count."""
+        slot = bucket % len(self.counts)
+
+        if self.buckets[slot] != bucket:
+            if bucket < self.buckets[slot]:
+                return 0
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+
+        if self.head_end is None:
+            self.head_end = bucket + len(self.counts)
+        if bucket < self.head_end:
+            self.head[bucket] = self.head.get(bucket, 0) + count
+
+        self.counts[slot] += count
+        if self.counts[slot] > self.peak:
+            self.peak = self.counts[slot]
+        return self.counts[slot]
+
+    def count(self, bucket: int) -> int:
+        """Return the count of one bucket, or 0 if it is not in the ring."""
+        slot = bucket % len(self.counts)
+        return self.counts[slot] if self.buckets[slot] == bucket else 0
+
+    def known_counts(self) -> dict:
+        """Return the exact counts the ring still holds: its head and its newest buckets."""
+        counts = dict(self.head)
+        for bucket, count in zip(self.buckets, self.counts):
+            if count:
+                counts[bucket] = count
+        return counts
+
+    def merge(self, other: "RateRing"):
+        """Fold in the ring of the traffic that follows this ring's traffic.
+
+        Buckets both rings know are added up, so a burst split between
+        the two parts is counted whole.
+        """
+        counts = self.known_counts()
+        for bucket, count in other.known_counts().items():
+            counts[bucket] = counts.get(bucket, 0) + count
+
+        peak = max(self.peak, other.peak)
+        self.__init__(len(self.counts))
+        for bucket in sorted(counts):
+            self.add(bucket, counts[bucket])
+        self.peak = max(self.peak, peak)
+
+    def state(self) -> dict:
+        """Return the ring as plain JSON data."""
+        return {
+            "buckets": self.buckets,
+            "counts": self.counts,
+            "peak": self.peak,
+            "head": [[bucket, count] for bucket, count in self.head.items()],
+            "head_end": self.head_end
+        }
+
+    @classmethod
+    def from_state(cls, slots: int, state: dict) -> "RateRing":
+        """Rebuild a ring of ``slots`` slots from data returned by ``state``."""
+        if len(state["buckets"]) != slots or len(state["counts"]) != slots:
+            raise ValueError(f"Rate ring state does not have {slots} slots")
+
+        ring = cls(slots)
+        ring.buckets = list(map(int, state["buckets"]))
+        ring.counts = list(map(int, state["counts"]))
+        ring.peak = int(state["peak"])
+        ring.head = {int(bucket): int(count) for bucket, count in state["head"]}
+        ring.head_end = None if state["head_end"] is None else int(state["head_end"])
+        return ring
+
+
+@register_detector
+class PacketRateDetector(Detector):
+    """Finds the busiest time bucket of each source.
+
+    Needs the optional timestamp column; traffic without timestamps
+    gives every source a rate of 0. Each source keeps a RateRing, so
+    lines may arrive up to ``slots`` buckets out of order; later lines
+    are dropped as too late.
+    """
+
+    name = "packet_rate"
+    fields = ("src_ip", "timestamp")
+    result_key = "packet_rate_floods"
+    threshold_attr = "packet_rate_threshold"
+    alert_message = "Packet rate flood detected from %s"
+
+    def __init__(self, bucket_seconds=NetworkConfig.DEFAULT_RATE_BUCKET_SECONDS, slots=NetworkConfig.DEFAULT_RATE_SLOTS):
+        self.bucket_seconds = bucket_seconds
+        self.slots = slots
+        self.rings = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.rate_bucket_seconds, config.rate_slots)
+
+    def _ring(self, src_ip: int) -> RateRing:
+        ring = self.rings.get(src_ip)
+        if ring is None:
+            ring = self.rings[src_ip] = RateRing(self.slots)
+        return ring
+
+    def update(self, src_ips, timestamps):
+        if timestamps is None:
+            return
+
+        counts = Counter(zip(src_ips, map(floordiv, timestamps, repeat(self.bucket_seconds))))
+
+        # NaN marks rows without a timestamp and is the only value not
+        # equal to itself.
+        rows = [row for row in counts.items() if row[0][1] == row[0][1]]
+        rows.sort(key=lambda row: row[0][1])
+
+        for (src_ip, bucket), count in rows:
+            self._ring(src_ip).add(int(bucket), count)
+
+    def merge(self, other):
+        for src_ip, ring in other.rings.items():
+            self._ring(src_ip).merge(ring)
+
+    def state(self):
+        return {"sources": list(self.rings), "rings": [ring.state() for ring in self.rings.values()]}
+
+    def load_state(self, state):
+        if len(state["sources"]) != len(state["rings"]):
+            raise ValueError("Packet rate state has a different number of sources and rings")
+
+        self.rings = {
+            int(src_ip): RateRing.from_state(self.slots, ring)
+            for src_ip, ring in zip(state["sources"], state["rings"])
+        }
+
+    def value(self, src_ip):
+        ring = self.rings.get(src_ip)
+        return 0 if ring is None else ring.peak
+
+    def numpy_values(self, table, sources, inverse):
+        """Count every bucket exactly; returns None if a line is too late.
+
+        The RateRing drops lines more than ``slots`` buckets behind the
+        newest one from their source. Exact counts only match that when
+        no line is that late, so otherwise the Python engine is used.
+        """
+        peaks = np.zeros(len(sources), dtype=np.int64)
+        if table.timestamps is None:
+            return peaks
+
+        timestamps = np.frombuffer(table.timestamps, dtype=np.float64)
+        valid = ~np.isnan(timestamps)
+        if not valid.any():
+            return peaks
+
+        owners = inverse[valid]
+        buckets = np.floor_divide(timestamps[valid], self.bucket_seconds).astype(np.int64)
+
+        # Newest bucket seen so far from each source, in line order. Each
+        # source gets its own band of values, so one running maximum over
+        # the stably sorted rows never crosses from one source to the next.
+        by_owner = np.argsort(owners, kind="stable")
+        lowest = buckets.min()
+        band = int(buckets.max()) - int(lowest) + 1
+        ranks = owners[by_owner].astype(np.int64) * band + (buckets[by_owner] - lowest)
+        if (ranks <= np.maximum.accumulate(ranks) - self.slots).any():
+            return None
+
+        order = np.lexsort((buckets, owners))
+        owners = owners[order]
+        buckets = buckets[order]
+
+        changes = (owners[1:] != owners[:-1]) | (buckets[1:] != buckets[:-1])
+        starts = np.flatnonzero(np.concatenate(([True], changes)))
+        lengths = np.diff(np.append(starts, len(owners)))
+        np.maximum.at(peaks, owners[starts], lengths)
+        return peaks
+
+
+def create_detectors(config: NetworkConfig) -> list:
+    """Create one fresh detector per name in ``config.detectors``."""
+    detectors = []
+
+    for name in config.detectors:
+        if name not in DETECTORS:
+            raise ValueError(f"Unknown detector: {name}")
+        detectors.append(DETECTORS[name].from_config(config))
+
+    return detectors
+
+
+class TrafficAggregator:
+    """Feeds every detector from one pass over the packets.
+
+    Source IPs are kept as address_key integers and turned back into
+    strings only when they are reported. Time spent in each detector
+    is added up in ``timings``, and packets the tables skipped in
+    ``skipped_packets``.
+    """
+
+    def __init__(self, config=None):
+        self.total_packets = 0
+        self.skipped_packets = 0
+        self.sources = set()
+        self.detectors = create_detectors(config or NetworkConfig())
+        self.timings = {detector.name: 0.0 for detector in self.detectors}
+
+    @classmethod
+    def from_packets(cls, packets, config=None):
+        """Build an aggregator from a packet list or a PacketTable."""
+        aggregator = cls(config)
+        if isinstance(packets, PacketTable):
+            aggregator.add_table(packets)
+        else:
+            aggregator.add_packets(packets)
+        return aggregator
+
+    def add_packets(self, packets):
+        """Count every packet in a list of packet dicts."""
+        self.add_table(PacketTable.from_packets(packets))
+
+    def add_table(self, table: PacketTable):
+        """Count every row of a PacketTable, one block at a time."""
+        for detector in self.detectors:
+            detector.prepare(table)
+
+        fields = {"src_ip"}
+        for detector in self.detectors:
+            fields.update(detector.fields)
+        columns = {field: getattr(table, FIELD_COLUMNS[field]) for field in fields}
+        keys = table.address_keys()
+
+        # Optional columns, like timestamps, reach the detector as None.
+        for start in range(0, len(table), DETECTOR_BLOCK_SIZE):
+            stop = start + DETECTOR_BLOCK_SIZE
+            block = {
+                field: None if column is None else column[start:stop]
+                for field, column in columns.items()
+            }
+
+            # Interned addresses only mean something inside their table,
+            # so they are swapped for keys that match across tables.
+            if keys:
+                for field in ADDRESS_FIELDS & block.keys():
+                    block[field] = list(map(keys.get, block[field], block[field]))
+
+            self.sources.update(block["src_ip"])
+
+            for detector in self.detectors:
+                started = time.perf_counter()
+                detector.update(*[block[field] for field in detector.fields])
+                self.timings[detector.name] += time.perf_counter() - started
+
+        self.total_packets += len(table)
+        self.skipped_packets += table.skipped
+
+    def merge(self, other: "TrafficAggregator"):
+        """Fold another aggregator's counters into this one."""
+        self.total_packets += other.total_packets
+        self.skipped_packets += other.skipped_packets
+        self.sources.update(other.sources)
+
+        for detector, other_detector in zip(self.detectors, other.detectors):
+            started = time.perf_counter()
+            detector.merge(other_detector)
+            self.timings[detector.name] += other.timings[detector.name] + time.perf_counter() - started
+
+    def state(self) -> dict:
+        """Return the counters and every detector's counts as plain JSON data."""
+        return {
+            "total_packets": self.total_packets,
+            "skipped_packets": self.skipped_packets,
+            "sources": list(self.sources),
+            "timings": self.timings,
+            "detectors": {detector.name: detector.state() for detector in self.detectors}
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, config=None) -> "TrafficAggregator":
+        """Rebuild an aggregator from data returned by ``state``.
+
+        Raises ValueError if the data is damaged or was saved with other
+        detectors than ``config`` enables.
+        """
+        aggregator = cls(config)
+
+        try:
+            if sorted(state["detectors"]) != sorted(aggregator.timings):
+                raise ValueError("saved with different detectors")
+
+            aggregator.total_packets = int(state["total_packets"])
+            aggregator.skipped_packets = int(state["skipped_packets"])
+            aggregator.sources = set(map(int, state["sources"]))
+
+            for detector in aggregator.detectors:
+                detector.load_state(state["detectors"][detector.name])
+                aggregator.timings[detector.name] = float(state["timings"][detector.name])
+
+        except (KeyError, IndexError, TypeError, OverflowError) as error:
+            raise ValueError(f"missing or invalid value {error}")
+
+        return aggregator
+
+    def detector(self, name: str) -> Detector:
+        """Return the detector with the given name or result key."""
+        for detector in self.detectors:
+            if name in (detector.name, detector.result_key):
+                return detector
+        raise ValueError(f"Detector not enabled: {name}")
+
+    def source_ips(self) -> list:
+        """Return the source IPs sorted by address."""
+        return [key_to_address(src_ip) for src_ip in sorted(self.sources)]
+
+    def distinct_ports(self, src_ip: str) -> int:
+        """Return how many destination ports a source IP touched, 0 if it sent nothing."""
+        return self.detector("port_scans").value(address_key(src_ip))
+
+    def syn_count(self, src_ip: str) -> int:
+        """Return how many SYN packets a source IP sent, 0 if it sent nothing."""
+        return self.detector("syn_floods").value(address_key(src_ip))
+
+
+def _as_aggregator(traffic, config=None) -> TrafficAggregator:
+    """Accept a packet list, a PacketTable or an existing aggregator."""
+    if isinstance(traffic, TrafficAggregator):
+        return traffic
+    return TrafficAggregator.from_packets(traffic, config)
+
+
+def detect_port_scan(traffic, src_ip: str, threshold: int) -> bool:
+    """Check if one source IP touched too many destination ports."""
+    return _as_aggregator(traffic).distinct_ports(src_ip) > threshold
+
+
+def detect_syn_flood(traffic, src_ip: str, threshold: int) -> bool:
     """Check if one source IP sent too many SYN packets."""
-    count = 0
+    return _as_aggregator(traffic).syn_count(src_ip) > threshold
+
 
-    for packet in packets:
-        if packet["src_ip"] == src_ip and is_syn_packet(packet):
-            count += 1
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd")
+)
+DECOMPRESS_BUFFER_SIZE = 1024 * 1024
 
-    return count > threshold
 
+def detect_compression(filepath: str):
+    """Return "gzip", "xz" or "zstd" from a file's magic bytes, or None."""
+    with open(filepath, "rb") as file:
+        head = file.read(6)
 
-def load_traffic_log(filepath: str) -> list:
-    """Load packet data from a traffic log file."""
+    for magic, name in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_traffic_file(filepath: str):
+    """Open a traffic log as text, decompressing gzip, xz or zstd on the fly.
+
+    Compressed data is pulled through a 1 MiB buffer, so the decompressor
+    works on large blocks and nothing is unpacked to disk. Plain files
+    open exactly as before.
+    """
+    compression = detect_compression(filepath)
+
+    if compression is None:
+        return open(filepath, "r")
+
+    if compression == "gzip":
+        raw = gzip.GzipFile(filepath, "rb")
+    elif compression == "xz":
+        raw = lzma.LZMAFile(filepath, "rb")
+    else:
+        if zstandard is None:
+            raise ValueError("Reading zstd files needs the zstandard package")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(filepath, "rb"), closefd=True, read_across_frames=True)
+
+    return io.TextIOWrapper(io.BufferedReader(raw, DECOMPRESS_BUFFER_SIZE), encoding="utf-8", errors="replace")
+
+
+def load_traffic_log(filepath: str, log_every=LOG_EVERY_LINES) -> PacketTable:
+    """Load packet data from a traffic log file into a PacketTable.
+
+    Progress is logged at DEBUG once every ``log_every`` lines rather
+    than once per packet. Binary captures written by the ``convert``
+    command are memory-mapped instead of parsed, and gzip, xz and zstd
+    logs are decompressed as they are read.
+    """
     logger = logging.getLogger("network_monitor")
-    packets = []
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    packets = PacketTable()
+    line_number = 0
 
     try:
-        with open(filepath, "r") as file:
-            for line_number, line in enumerate(file, start=1):
-                line = line.strip()
+        if is_binary_capture(filepath):
+            return load_binary_capture(filepath)
 
-                if line == "":
-                    continue
+        with open_traffic_file(filepath) as file:
+            for line_number, line in enumerate(file, start=1):
+                values = parse_packet_fast(line)
 
                 try:
-                    packet = parse_packet_line(line)
-                    packets.append(packet)
-                    logger.debug("Parsed packet on line %s", line_number)
+                    if values is not None:
+                        packets.append_values(*values)
+                    else:
+                        line = line.strip()
+
+                        if line == "":
+                            continue
+
+                        packets.append(parse_packet_line(line))
 
                 except ValueError as error:
                     logger.error("Error on line %s: %s", line_number, error)
 
+                if debug_enabled and line_number % log_every == 0:
+                    logger.debug("Read %s lines, %s packets so far", line_number, len(packets))
+
     except FileNotFoundError:
         logger.error("File was not found: %s", filepath)
         raise
@@ -121,53 +1485,1338 @@ def load_traffic_log(filepath: str) -> list:
         logger.error("Permission denied for file: %s", filepath)
         raise
 
+    logger.debug("Read %s lines in total", line_number)
     logger.info("Loaded %s packets", len(packets))
     return packets
 
 
-def analyze_traffic(packets: list, config: NetworkConfig) -> dict:
-    """Analyze traffic and return results."""
+BINARY_MAGIC = b"NMCAP001"
+BINARY_HEADER = struct.Struct("<8sQI4x")
+
+
+def is_binary_capture(filepath: str) -> bool:
+    """Check whether a file starts with the binary capture magic bytes."""
+    with open(filepath, "rb") as file:
+        return file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def write_binary_capture(table: PacketTable, filepath: str):
+    """Write a PacketTable to a fixed-width binary capture file.
+
+    Layout: a header (magic, packet count, names length), a JSON list of
+    protocol and flag names padded to 8 bytes, then each column stored
+    back to back as little-endian arrays. If the table has timestamps
+    they follow as float64, starting on an 8-byte boundary. Only tables
+    with IPv4 addresses alone fit this layout.
+    """
+    if table.addresses:
+        raise ValueError("Binary captures only hold IPv4 addresses; keep this traffic as a text log")
+
+    has_timestamps = table.timestamps is not None
+    names = json.dumps({
+        "protocols": table.protocol_names,
+        "flags": table.flag_names,
+        "timestamps": has_timestamps
+    }).encode("utf-8")
+    names += b" " * (-len(names) % 8)
+
+    columns = list(PacketTable.COLUMNS)
+    if has_timestamps:
+        columns.append("timestamps")
+
+    with open(filepath, "wb") as file:
+        file.write(BINARY_HEADER.pack(BINARY_MAGIC, len(table), len(names)))
+        file.write(names)
+
+        for name in columns:
+            column = array(getattr(table, name).typecode, getattr(table, name))
+            if sys.byteorder == "big":
+                column.byteswap()
+            file.write(b"\0" * (-file.tell() % column.itemsize))
+            column.tofile(file)
+
+
+def load_binary_capture(filepath: str) -> PacketTable:
+    """Open a binary capture with mmap; the columns are views, not copies."""
     logger = logging.getLogger("network_monitor")
 
-    source_ips = set()
-    for packet in packets:
-        source_ips.add(packet["src_ip"])
+    with open(filepath, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    if len(view) < BINARY_HEADER.size:
+        raise ValueError(f"Binary capture is truncated: {filepath}")
+
+    magic, count, names_length = BINARY_HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"Not a binary capture file: {filepath}")
+
+    offset = BINARY_HEADER.size
+    names = json.loads(bytes(view[offset:offset + names_length]))
+    offset += names_length
+
+    template = PacketTable()
+    column_types = [(name, getattr(template, name).typecode) for name in PacketTable.COLUMNS]
+    if names.get("timestamps"):
+        column_types.append(("timestamps", "d"))
+
+    columns = {}
+    for name, typecode in column_types:
+        itemsize = array(typecode).itemsize
+        offset += -offset % itemsize
+        size = count * itemsize
+        if offset + size > len(view):
+            raise ValueError(f"Binary capture is truncated: {filepath}")
+
+        column = view[offset:offset + size].cast(typecode)
+        if sys.byteorder == "big":
+            column = array(typecode, column)
+            column.byteswap()
+
+        columns[name] = column
+        offset += size
+
+    logger.info("Mapped %s packets from binary capture", count)
+    return PacketTable.from_columns(columns, names["protocols"], names["flags"], buffer=mapped)
+
+
+CHUNK_BATCH_SIZE = 65536
+
+
+def next_line_start(file, position: int) -> int:
+    """Return the offset of the first line that starts at or after ``position``."""
+    if position <= 0:
+        return 0
+
+    file.seek(position - 1)
+    file.readline()
+    return file.tell()
+
+
+def split_file_chunks(filepath: str, chunk_count: int, start=0, end=None) -> list:
+    """Split a file, or the byte range ``start:end`` of it, into (start, end)
+    byte ranges that end on newlines. ``start`` must be the start of a line.
+    """
+    if end is None:
+        end = Path(filepath).stat().st_size
+    boundaries = [start]
+
+    with open(filepath, "rb") as file:
+        for index in range(1, chunk_count):
+            position = start + (end - start) * index // chunk_count
+            if position <= boundaries[-1]:
+                continue
+
+            boundary = min(next_line_start(file, position), end)
+
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+
+    if boundaries[-1] < end:
+        boundaries.append(end)
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def aggregate_lines(lines, config=None):
+    """Parse text lines into an aggregate, one packet batch at a time.
+
+    Returns the aggregator, the number of lines read and a list of
+    (line number, error message) so the caller can log errors with
+    file-wide line numbers.
+    """
+    aggregator = TrafficAggregator(config)
+    batch = PacketTable()
+    errors = []
+    line_count = 0
+
+    for line in lines:
+        line_count += 1
+        values = parse_packet_fast(line)
+
+        try:
+            if values is not None:
+                batch.append_values(*values)
+            else:
+                line = line.strip()
 
-    port_scans = []
-    syn_floods = []
+                if line == "":
+                    continue
+
+                batch.append(parse_packet_line(line))
+
+        except ValueError as error:
+            errors.append((line_count, str(error)))
+            continue
+
+        if len(batch) >= CHUNK_BATCH_SIZE:
+            aggregator.add_table(batch)
+            batch = PacketTable()
+
+    aggregator.add_table(batch)
+    return aggregator, line_count, errors
+
+
+def _lines_in_range(file, start: int, end: int):
+    """Yield decoded lines of a binary file from ``start`` up to ``end``."""
+    file.seek(start)
+    position = start
+
+    for raw_line in file:
+        if position >= end:
+            break
+
+        position += len(raw_line)
+        yield raw_line.decode("utf-8", errors="replace")
+
+
+def aggregate_chunk(filepath: str, start: int, end: int, config=None):
+    """Parse one byte range of a traffic log into a partial aggregate.
+
+    Runs inside a worker process. Returns the same values as
+    aggregate_lines, with line numbers counted from the chunk start.
+    """
+    with open(filepath, "rb") as file:
+        return aggregate_lines(_lines_in_range(file, start, end), config)
+
+
+def aggregate_traffic_log(filepath: str, workers: int, config=None) -> TrafficAggregator:
+    """Parse a traffic log in parallel and merge the per-chunk aggregates."""
+    logger = logging.getLogger("network_monitor")
+    chunks = split_file_chunks(filepath, workers)
+
+    aggregator = TrafficAggregator(config)
+    lines_before = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(aggregate_chunk, filepath, start, end, config) for start, end in chunks]
+
+        for future in futures:
+            partial, line_count, errors = future.result()
+
+            for line_number, message in errors:
+                logger.error("Error on line %s: %s", lines_before + line_number, message)
+
+            aggregator.merge(partial)
+            lines_before += line_count
+
+    logger.info("Loaded %s packets using %s workers", aggregator.total_packets, workers)
+    return aggregator
+
+
+CHECKPOINT_FORMAT = "network_monitor_checkpoint"
+CHECKPOINT_VERSION = 4
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+CHECKPOINT_SETTINGS = ("detectors", "sketch_error", "cms_epsilon", "cms_delta", "rate_bucket_seconds", "rate_slots")
+
+
+def _input_fingerprint(filepath: str) -> dict:
+    """Identify an input file by its path and the hash of its first 64 KiB."""
+    with open(filepath, "rb") as file:
+        head = file.read(65536)
+
+    return {
+        "path": str(Path(filepath).resolve()),
+        "head_sha256": hashlib.sha256(head).hexdigest()
+    }
+
+
+def _checkpoint_settings(config: NetworkConfig) -> dict:
+    """Return the config values that shape detector state.
+
+    Thresholds are left out, because they are only applied when the
+    results are built.
+    """
+    settings = {name: getattr(config, name) for name in CHECKPOINT_SETTINGS}
+    settings["detectors"] = list(config.detectors)
+    return settings
+
+
+def save_checkpoint(checkpoint_path: str, state: dict):
+    """Write a checkpoint atomically, so a crash never leaves half a file.
+
+    The aggregator in ``state`` is saved as JSON data, the same way as
+    partial aggregates.
+    """
+    temp_path = f"{checkpoint_path}.tmp"
+    saved = dict(state, aggregator=state["aggregator"].state())
+
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(saved, file, separators=(",", ":"))
+
+    os.replace(temp_path, checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path: str, filepath: str, config: NetworkConfig) -> dict:
+    """Load a checkpoint and make sure it belongs to this input and config."""
+    try:
+        with open(checkpoint_path, encoding="utf-8") as file:
+            state = json.load(file)
+    except ValueError as error:
+        raise ValueError(f"Checkpoint is damaged: {checkpoint_path} ({error})")
+
+    if (not isinstance(state, dict) or state.get("format") != CHECKPOINT_FORMAT
+            or state.get("version") != CHECKPOINT_VERSION):
+        raise ValueError(f"Checkpoint has an unsupported format: {checkpoint_path}")
+
+    if state.get("input") != _input_fingerprint(filepath):
+        raise ValueError(f"Checkpoint was written for a different input file: {checkpoint_path}")
+
+    if state.get("settings") != _checkpoint_settings(config):
+        raise ValueError(f"Checkpoint was written with different detector settings: {checkpoint_path}")
+
+    try:
+        state["aggregator"] = TrafficAggregator.from_state(state["aggregator"], config)
+        state["offset"] = int(state["offset"])
+        state["line_count"] = int(state["line_count"])
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"Checkpoint is damaged: {checkpoint_path} ({error})")
+
+    if state["offset"] > Path(filepath).stat().st_size:
+        raise ValueError(f"Input file is shorter than the checkpoint offset: {filepath}")
+
+    return state
+
+
+def aggregate_with_checkpoints(filepath: str, checkpoint_path: str, config=None, resume=False,
+                               checkpoint_bytes=CHECKPOINT_BYTES, workers=1, on_checkpoint=None) -> TrafficAggregator:
+    """Aggregate a traffic log in segments, saving progress after each one.
+
+    The checkpoint holds the aggregator, the byte offset reached and the
+    number of lines read. With ``resume`` an existing checkpoint is
+    picked up and parsing continues from its offset. Each segment is
+    split across ``workers`` processes. ``on_checkpoint(aggregator,
+    offset, size)`` is called after every save.
+    """
+    logger = logging.getLogger("network_monitor")
+    config = config or NetworkConfig()
+    size = Path(filepath).stat().st_size
+
+    if detect_compression(filepath) is not None:
+        raise ValueError(f"Checkpoints need an uncompressed input file: {filepath}")
+
+    if resume and Path(checkpoint_path).exists():
+        state = load_checkpoint(checkpoint_path, filepath, config)
+        logger.info("Resuming from byte %s (line %s) of %s", state["offset"], state["line_count"], filepath)
+    else:
+        if resume:
+            logger.warning("No checkpoint found at %s, starting from the beginning", checkpoint_path)
+
+        state = {
+            "format": CHECKPOINT_FORMAT,
+            "version": CHECKPOINT_VERSION,
+            "input": _input_fingerprint(filepath),
+            "settings": _checkpoint_settings(config),
+            "offset": 0,
+            "line_count": 0,
+            "aggregator": TrafficAggregator(config)
+        }
+
+    aggregator = state["aggregator"]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        with open(filepath, "rb") as file:
+            while state["offset"] < size:
+                start = state["offset"]
+                end = min(next_line_start(file, start + checkpoint_bytes), size)
 
-    for src_ip in source_ips:
-        logger.debug("Checking source IP: %s", src_ip)
+                if executor is None:
+                    chunk_results = [aggregate_chunk(filepath, start, end, config)]
+                else:
+                    futures = [
+                        executor.submit(aggregate_chunk, filepath, chunk_start, chunk_end, config)
+                        for chunk_start, chunk_end in split_file_chunks(filepath, workers, start, end)
+                    ]
+                    chunk_results = [future.result() for future in futures]
 
-        if detect_port_scan(packets, src_ip, config.port_scan_threshold):
-            logger.warning("Port scan detected from %s", src_ip)
-            port_scans.append(src_ip)
+                for partial, line_count, errors in chunk_results:
+                    for line_number, message in errors:
+                        logger.error("Error on line %s: %s", state["line_count"] + line_number, message)
 
-        if detect_syn_flood(packets, src_ip, config.syn_flood_threshold):
-            logger.warning("SYN flood detected from %s", src_ip)
-            syn_floods.append(src_ip)
+                    aggregator.merge(partial)
+                    state["line_count"] += line_count
+
+                state["offset"] = end
+                save_checkpoint(checkpoint_path, state)
+                logger.debug("Checkpoint saved at byte %s of %s", end, size)
+
+                if on_checkpoint is not None:
+                    on_checkpoint(aggregator, end, size)
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    logger.info("Loaded %s packets", aggregator.total_packets)
+    return aggregator
+
+
+PARTIAL_FORMAT = "network_monitor_partial"
+PARTIAL_SUFFIX = ".nmpart"
+PARTIAL_VERSION = 4
+
+
+def expand_inputs(pattern: str) -> list:
+    """Turn an input argument into a sorted list of file paths.
+
+    Accepts a single file, a directory (every non-hidden file directly
+    inside it) or a glob pattern such as "logs/*/eth0-*.log".
+    """
+    path = Path(pattern)
+
+    if path.is_dir():
+        files = [child for child in path.iterdir() if child.is_file() and not child.name.startswith(".")]
+    elif path.is_file():
+        files = [path]
+    else:
+        files = [Path(match) for match in glob.glob(pattern, recursive=True) if Path(match).is_file()]
+
+    if not files:
+        raise FileNotFoundError(f"Input file not found: {pattern}")
+
+    return sorted(str(file) for file in files)
+
+
+def _file_identity(filepath: str) -> dict:
+    """Identify an input file by its path, size and modification time."""
+    stat = Path(filepath).stat()
+    return {
+        "path": str(Path(filepath).resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+
+def is_partial_file(filepath: str) -> bool:
+    """Check whether an input is a saved partial aggregate.
+
+    Only the ``.nmpart`` extension counts; a file's contents never make
+    it a partial.
+    """
+    return Path(filepath).suffix == PARTIAL_SUFFIX
+
+
+def write_partial(partial_path: str, aggregator: TrafficAggregator, source: str, config: NetworkConfig, line_count: int):
+    """Save the aggregate of one input file so it can be merged later without re-parsing."""
+    state = {
+        "format": PARTIAL_FORMAT,
+        "version": PARTIAL_VERSION,
+        "source": _file_identity(source),
+        "settings": _checkpoint_settings(config),
+        "line_count": line_count,
+        "aggregator": aggregator.state()
+    }
+    temp_path = f"{partial_path}.tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, separators=(",", ":"))
+
+    os.replace(temp_path, partial_path)
+
+
+def read_partial(partial_path: str, config: NetworkConfig) -> dict:
+    """Load a partial aggregate written by write_partial.
+
+    The saved counts are rebuilt into a TrafficAggregator for ``config``.
+    Raises ValueError if the file is damaged or was written with other
+    detector settings.
+    """
+    try:
+        with open(partial_path, encoding="utf-8") as file:
+            state = json.load(file)
+    except ValueError as error:
+        raise ValueError(f"Partial aggregate is damaged: {partial_path} ({error})")
+
+    if not isinstance(state, dict) or state.get("format") != PARTIAL_FORMAT or state.get("version") != PARTIAL_VERSION:
+        raise ValueError(f"Partial aggregate has an unsupported format: {partial_path}")
+
+    if state.get("settings") != _checkpoint_settings(config):
+        raise ValueError(f"Partial aggregate was written with different detector settings: {partial_path}")
+
+    try:
+        state["aggregator"] = TrafficAggregator.from_state(state["aggregator"], config)
+    except (KeyError, ValueError) as error:
+        raise ValueError(f"Partial aggregate is damaged: {partial_path} ({error})")
+
+    return state
+
+
+def partial_path_for(partials_dir, filepath: str) -> Path:
+    """Return where the partial aggregate of an input file is cached.
+
+    The name carries a hash of the full path, so same-named logs from
+    different sensor directories do not collide.
+    """
+    resolved = str(Path(filepath).resolve())
+    digest = hashlib.sha256(resolved.encode("utf-8")).hexdigest()[:12]
+    return Path(partials_dir) / f"{Path(filepath).name}.{digest}{PARTIAL_SUFFIX}"
+
+
+def aggregate_file(filepath: str, config=None):
+    """Aggregate one whole input file, text log or binary capture.
+
+    Runs inside a worker process. Returns the same (aggregator, line
+    count, errors) as aggregate_chunk.
+    """
+    if is_binary_capture(filepath):
+        table = load_binary_capture(filepath)
+        return TrafficAggregator.from_packets(table, config), len(table), []
+
+    if detect_compression(filepath) is not None:
+        with open_traffic_file(filepath) as file:
+            return aggregate_lines(file, config)
+
+    return aggregate_chunk(filepath, 0, Path(filepath).stat().st_size, config)
+
+
+def _cached_partial(partials_dir, filepath: str, config: NetworkConfig):
+    """Return the cached aggregator for a file if it is still current, else None."""
+    logger = logging.getLogger("network_monitor")
+    cached = partial_path_for(partials_dir, filepath)
+
+    if not cached.exists():
+        return None
+
+    try:
+        state = read_partial(str(cached), config)
+    except ValueError as error:
+        logger.warning("Ignoring cached partial: %s", error)
+        return None
+
+    if state.get("source") != _file_identity(filepath):
+        return None
+    return state["aggregator"]
+
+
+def aggregate_files(filepaths: list, config=None, workers=1, partials_dir=None) -> TrafficAggregator:
+    """Aggregate many input files independently and merge the results.
+
+    Files are parsed in parallel, one file per worker. Inputs with the
+    ``.nmpart`` extension are partial aggregates and are merged as they
+    are. With ``partials_dir``, each parsed file's aggregate is saved
+    there, and a later run reuses it instead of parsing the file again
+    as long as the file's size and modification time have not changed.
+    """
+    logger = logging.getLogger("network_monitor")
+    config = config or NetworkConfig()
+    aggregator = TrafficAggregator(config)
+    pending = []
+
+    for filepath in filepaths:
+        if is_partial_file(filepath):
+            aggregator.merge(read_partial(filepath, config)["aggregator"])
+            continue
+
+        cached = None if partials_dir is None else _cached_partial(partials_dir, filepath, config)
+        if cached is not None:
+            aggregator.merge(cached)
+        else:
+            pending.append(filepath)
+
+    if partials_dir is not None:
+        Path(partials_dir).mkdir(parents=True, exist_ok=True)
+
+    executor = None
+    if workers > 1 and len(pending) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(pending)))
+
+    try:
+        if executor is None:
+            results = (aggregate_file(filepath, config) for filepath in pending)
+        else:
+            results = executor.map(aggregate_file, pending, [config] * len(pending))
+
+        for filepath, (partial, line_count, errors) in zip(pending, results):
+            for line_number, message in errors:
+                logger.error("Error in %s on line %s: %s", filepath, line_number, message)
+
+            if partials_dir is not None:
+                write_partial(str(partial_path_for(partials_dir, filepath)), partial, filepath, config, line_count)
+
+            aggregator.merge(partial)
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    logger.info(
+        "Loaded %s packets from %s files (%s parsed, %s reused)",
+        aggregator.total_packets,
+        len(filepaths),
+        len(pending),
+        len(filepaths) - len(pending)
+    )
+    return aggregator
+
+
+class SourceCounts:
+    """Per-source detector values, with sources sorted by address."""
+
+    def __init__(self, total_packets: int, sources: list, detectors: list, values: dict, timings: dict,
+                 skipped_packets=0):
+        self.total_packets = total_packets
+        self.skipped_packets = skipped_packets
+        self.sources = sources
+        self.detectors = detectors
+        self.values = values
+        self.timings = timings
+
+
+def python_source_counts(traffic, config=None) -> SourceCounts:
+    """Run the detectors over the traffic in plain Python."""
+    aggregator = _as_aggregator(traffic, config)
+    sources = sorted(aggregator.sources)
+    values = {
+        detector.name: detector.values(sources)
+        for detector in aggregator.detectors
+    }
+    return SourceCounts(aggregator.total_packets, sources, aggregator.detectors, values, aggregator.timings,
+                        aggregator.skipped_packets)
+
+
+def numpy_source_counts(table: PacketTable, config=None):
+    """Run the detectors over whole columns with NumPy.
+
+    The sources are found once with np.unique and shared by every
+    detector. Returns None if a detector cannot run on NumPy here, or
+    if the table holds addresses that are not IPv4.
+    """
+    if table.addresses:
+        return None
+
+    detectors = create_detectors(config or NetworkConfig())
+    src_ips = np.frombuffer(table.src_ips, dtype=np.uint32)
+    sources, inverse = np.unique(src_ips, return_inverse=True)
+    inverse = inverse.ravel()
+
+    values = {}
+    timings = {}
+    for detector in detectors:
+        started = time.perf_counter()
+        detector_values = detector.numpy_values(table, sources, inverse)
+        timings[detector.name] = time.perf_counter() - started
+
+        if detector_values is None:
+            return None
+        values[detector.name] = detector_values.tolist()
+
+    return SourceCounts(len(src_ips), sources.tolist(), detectors, values, timings, table.skipped)
+
+
+def source_counts(packets, engine="python", config=None) -> SourceCounts:
+    """Return per-source detector values from the chosen engine.
+
+    ``packets`` may be a list of packet dicts, a PacketTable or a
+    TrafficAggregator that was already filled. ``engine`` picks the
+    counting backend; "numpy" falls back to "python" when NumPy is
+    not installed or a detector cannot run on NumPy for this traffic.
+    """
+    logger = logging.getLogger("network_monitor")
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+
+    if engine == "numpy" and np is None:
+        logger.warning("NumPy is not installed, using the Python engine")
+        engine = "python"
+
+    if engine == "numpy" and not isinstance(packets, TrafficAggregator):
+        if not isinstance(packets, PacketTable):
+            packets = PacketTable.from_packets(packets)
+
+        counts = numpy_source_counts(packets, config)
+        if counts is not None:
+            return counts
+        logger.warning("A detector cannot use NumPy for this traffic, using the Python engine")
+
+    return python_source_counts(packets, config)
+
+
+def analyze_traffic(packets, config: NetworkConfig, engine="python", quiet=False, threat_lookup=None) -> dict:
+    """Analyze traffic and return results.
+
+    See source_counts for the accepted inputs and engines. ``quiet``
+    skips the per-source and timing log messages, for interim results.
+    With a ThreatLookup, every source is checked against it and the
+    hits are listed under "threat_matches". Packets that could not be
+    stored are left out and reported under "skipped_packets".
+    """
+    logger = logging.getLogger("network_monitor")
+    counts = source_counts(packets, engine, config)
 
     results = {
-        "total_packets": len(packets),
-        "unique_source_ips": len(source_ips),
-        "port_scans": port_scans,
-        "syn_floods": syn_floods
+        "total_packets": counts.total_packets,
+        "unique_source_ips": len(counts.sources)
     }
 
+    if counts.skipped_packets:
+        results["skipped_packets"] = counts.skipped_packets
+        if not quiet:
+            logger.warning("Skipped %s packets that could not be stored", counts.skipped_packets)
+
+    for detector in counts.detectors:
+        threshold = detector.threshold(config)
+        flagged = []
+
+        for src_ip, value in zip(counts.sources, counts.values[detector.name]):
+            if value > threshold:
+                src_ip = key_to_address(src_ip)
+                if not quiet:
+                    logger.warning(detector.alert_message, src_ip)
+                flagged.append(src_ip)
+
+        results[detector.result_key] = flagged
+
+    if threat_lookup is not None:
+        matches = []
+
+        for src_ip in counts.sources:
+            indicator = threat_lookup.match_key(int(src_ip))
+            if indicator is not None:
+                src_ip = key_to_address(int(src_ip))
+                if not quiet:
+                    logger.warning("Known threat source: %s matches %s", src_ip, indicator["value"])
+                matches.append(threat_match(src_ip, indicator))
+
+        results["threat_matches"] = matches
+
+    errors = {}
+    for detector in counts.detectors:
+        report = detector.error_report()
+        if report is not None:
+            errors[detector.name] = report
+
+    if errors:
+        results["estimation_error"] = errors
+
+    if quiet:
+        return results
+
+    for name, seconds in counts.timings.items():
+        logger.info("Detector %s took %.3f seconds", name, seconds)
+
+    logger.debug("Checked %s source IPs", len(counts.sources))
     logger.info("Analysis complete")
     return results
 
 
+def parse_threshold_range(text: str) -> list:
+    """Turn "START:STOP[:STEP]" into a list of thresholds, STOP included."""
+    parts = text.split(":")
+
+    try:
+        numbers = [int(part) for part in parts]
+    except ValueError:
+        raise ValueError(f"Threshold range must be START:STOP[:STEP]: {text}")
+
+    if len(numbers) == 2:
+        numbers.append(1)
+
+    if len(numbers) != 3:
+        raise ValueError(f"Threshold range must be START:STOP[:STEP]: {text}")
+
+    start, stop, step = numbers
+    if start < 1 or stop < start or step < 1:
+        raise ValueError(f"Threshold range must be positive and increasing: {text}")
+
+    return list(range(start, stop + 1, step))
+
+
+def _sweep_metric(sources: list, values: list, thresholds: list) -> dict:
+    """Report the sources over each threshold for one detector's values.
+
+    Sources are sorted by value once, so the sources flagged at any
+    threshold are a prefix of that ranking and bisect finds its length.
+    The ranking only keeps sources flagged at the lowest threshold.
+    """
+    ranked = sorted(zip(sources, values), key=lambda row: row[1], reverse=True)
+    negated_values = [-value for _, value in ranked]
+
+    counts = [bisect_left(negated_values, -threshold) for threshold in thresholds]
+    ranking = [
+        {"src_ip": key_to_address(src_ip), "count": value}
+        for src_ip, value in ranked[:max(counts, default=0)]
+    ]
+
+    return {
+        "thresholds": [
+            {"threshold": threshold, "flagged": count}
+            for threshold, count in zip(thresholds, counts)
+        ],
+        "ranking": ranking
+    }
+
+
+def sweep_thresholds(packets, port_scan_thresholds: list, syn_flood_thresholds: list, engine="python", config=None) -> dict:
+    """Evaluate many port scan and SYN flood thresholds from one count pass.
+
+    For each threshold the result gives how many sources are flagged; they
+    are the first that many entries of the metric's "ranking" list.
+    """
+    logger = logging.getLogger("network_monitor")
+    counts = source_counts(packets, engine, config)
+    values = {detector.result_key: counts.values[detector.name] for detector in counts.detectors}
+
+    results = {
+        "total_packets": counts.total_packets,
+        "unique_source_ips": len(counts.sources),
+        "port_scan_sweep": _sweep_metric(counts.sources, values["port_scans"], port_scan_thresholds),
+        "syn_flood_sweep": _sweep_metric(counts.sources, values["syn_floods"], syn_flood_thresholds)
+    }
+
+    logger.info(
+        "Swept %s port scan and %s SYN flood thresholds",
+        len(port_scan_thresholds),
+        len(syn_flood_thresholds)
+    )
+    return results
+
+
+def print_sweep_table(results: dict):
+    """Print how many sources each threshold flags."""
+    print("\nThreshold sweep")
+
+    for title, key in (("Port scan", "port_scan_sweep"), ("SYN flood", "syn_flood_sweep")):
+        print(f"\n{title:<12}{'Flagged':>10}")
+        print("-" * 22)
+        for entry in results[key]["thresholds"]:
+            print(f"{entry['threshold']:<12}{entry['flagged']:>10}")
+
+
+class SourceWindow:
+    """Sliding window of recent packets for one source IP."""
+
+    __slots__ = ("packets", "max_packets", "port_counts", "syn_count", "rate", "last_seen",
+                 "port_scan_alerted", "syn_flood_alerted", "rate_alerted_bucket", "threat")
+
+    def __init__(self, max_packets: int, rate_slots=NetworkConfig.DEFAULT_RATE_SLOTS):
+        self.packets = deque()
+        self.max_packets = max_packets
+        self.port_counts = {}
+        self.syn_count = 0
+        self.rate = RateRing(rate_slots)
+        self.last_seen = 0.0
+        self.port_scan_alerted = False
+        self.syn_flood_alerted = False
+        self.rate_alerted_bucket = None
+        self.threat = None
+
+    def add(self, timestamp: float, dst_port: int, is_syn: bool):
+        """Add one packet and drop the oldest one if the window is full."""
+        self.packets.append((timestamp, dst_port, is_syn))
+        self.port_counts[dst_port] = self.port_counts.get(dst_port, 0) + 1
+        self.syn_count += is_syn
+        self.last_seen = timestamp
+
+        if len(self.packets) > self.max_packets:
+            self._drop_oldest()
+
+    def expire(self, oldest_allowed: float):
+        """Drop packets that are older than the time window."""
+        while self.packets and self.packets[0][0] < oldest_allowed:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        _, dst_port, is_syn = self.packets.popleft()
+        self.syn_count -= is_syn
+
+        count = self.port_counts[dst_port] - 1
+        if count:
+            self.port_counts[dst_port] = count
+        else:
+            del self.port_counts[dst_port]
+
+    def distinct_ports(self) -> int:
+        """Return how many destination ports are in the window."""
+        return len(self.port_counts)
+
+
+STREAM_HISTORY_SIZE = 10000
+
+
+class StreamingMonitor:
+    """Incremental port scan, SYN flood and packet rate detection.
+
+    Port scans and SYN floods are counted over sliding windows; packet
+    rates are counted per time bucket in each source's RateRing.
+
+    Per-source state is dropped with idle sources. The alerts, flagged
+    sources and threat matches reported by ``results`` are each capped
+    at the ``history_size`` most recent, so memory stays bounded however
+    long the monitor runs.
+    """
+
+    def __init__(self, config: NetworkConfig, window_size=1000, window_seconds=60.0, clock=time.time,
+                 threat_lookup=None, history_size=STREAM_HISTORY_SIZE):
+        self.config = config
+        self.threat_lookup = threat_lookup
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self.history_size = history_size
+        self.windows = {}
+        self.total_packets = 0
+        self.port_scans = OrderedDict()
+        self.syn_floods = OrderedDict()
+        self.packet_rate_floods = OrderedDict()
+        self.threat_matches = OrderedDict()
+        self.alerts = deque(maxlen=history_size)
+        self._next_sweep = 0.0
+
+    def process_packet(self, packet: dict, timestamp=None) -> list:
+        """Add one packet and return any new alerts it triggers.
+
+        The packet's own timestamp is used when no ``timestamp`` is
+        given, and the clock when the packet has none either.
+        """
+        if timestamp is None:
+            timestamp = packet.get("timestamp")
+        if timestamp is None:
+            timestamp = self.clock()
+
+        return self.add(packet["src_ip"], packet["dst_port"], is_syn_packet(packet), timestamp)
+
+    def add(self, src_ip: str, dst_port: int, is_syn: bool, timestamp: float) -> list:
+        """Add one packet given as plain values; see process_packet."""
+        window = self.windows.get(src_ip)
+        if window is None:
+            window = self.windows[src_ip] = SourceWindow(self.window_size, self.config.rate_slots)
+            if self.threat_lookup is not None:
+                indicator = self.threat_lookup.match_address(src_ip)
+                if indicator is not None:
+                    window.threat = threat_match(src_ip, indicator)
+                    self._remember(self.threat_matches, src_ip, window.threat)
+
+        self.total_packets += 1
+        window.add(timestamp, dst_port, is_syn)
+        window.expire(timestamp - self.window_seconds)
+
+        bucket = int(timestamp // self.config.rate_bucket_seconds)
+        rate = window.rate.add(bucket)
+
+        if timestamp >= self._next_sweep:
+            self._evict_idle_sources(timestamp)
+
+        new_alerts = self._check_window(src_ip, window, timestamp)
+
+        if rate > self.config.packet_rate_threshold and window.rate_alerted_bucket != bucket:
+            window.rate_alerted_bucket = bucket
+            new_alerts.append(self._alert("packet_rate", src_ip, rate, timestamp))
+            self._remember(self.packet_rate_floods, src_ip)
+
+        return new_alerts
+
+    def _remember(self, history: OrderedDict, src_ip: str, value=None):
+        """Record a source, dropping the oldest one past ``history_size``."""
+        if src_ip in history:
+            history.move_to_end(src_ip)
+        elif len(history) >= self.history_size:
+            history.popitem(last=False)
+        history[src_ip] = value
+
+    def _evict_idle_sources(self, now: float):
+        """Forget sources that have not sent anything within the time window."""
+        oldest_allowed = now - self.window_seconds
+        idle = [src_ip for src_ip, window in self.windows.items() if window.last_seen < oldest_allowed]
+
+        for src_ip in idle:
+            del self.windows[src_ip]
+
+        self._next_sweep = now + self.window_seconds
+
+    def _check_window(self, src_ip: str, window: SourceWindow, timestamp: float) -> list:
+        new_alerts = []
+
+        distinct_ports = window.distinct_ports()
+        if distinct_ports > self.config.port_scan_threshold:
+            if not window.port_scan_alerted:
+                window.port_scan_alerted = True
+                new_alerts.append(self._alert("port_scan", src_ip, distinct_ports, timestamp))
+                self._remember(self.port_scans, src_ip)
+        else:
+            window.port_scan_alerted = False
+
+        if window.syn_count > self.config.syn_flood_threshold:
+            if not window.syn_flood_alerted:
+                window.syn_flood_alerted = True
+                new_alerts.append(self._alert("syn_flood", src_ip, window.syn_count, timestamp))
+                self._remember(self.syn_floods, src_ip)
+        else:
+            window.syn_flood_alerted = False
+
+        return new_alerts
+
+    def _alert(self, kind: str, src_ip: str, value: int, timestamp: float) -> dict:
+        alert = {
+            "type": kind,
+            "src_ip": src_ip,
+            "value": value,
+            "timestamp": timestamp
+        }
+        window = self.windows.get(src_ip)
+        if window is not None and window.threat is not None:
+            alert["threat"] = window.threat["indicator"]
+        self.alerts.append(alert)
+        return alert
+
+    def results(self) -> dict:
+        """Return a results dictionary for everything seen so far."""
+        results = {
+            "total_packets": self.total_packets,
+            "active_source_ips": len(self.windows),
+            "port_scans": list(self.port_scans),
+            "syn_floods": list(self.syn_floods),
+            "packet_rate_floods": list(self.packet_rate_floods),
+            "alerts": list(self.alerts)
+        }
+
+        if self.threat_lookup is not None:
+            results["threat_matches"] = list(self.threat_matches.values())
+
+        return results
+
+
+def follow_lines(file, poll_interval=0.5):
+    """Yield lines from a file and keep waiting for new ones at the end."""
+    pending = ""
+
+    while True:
+        line = file.readline()
+
+        if line == "":
+            time.sleep(poll_interval)
+            continue
+
+        pending += line
+        if pending.endswith("\n"):
+            yield pending
+            pending = ""
+
+
+def iter_traffic_lines(filepath: str, follow=False, poll_interval=0.5):
+    """Yield raw lines from a traffic log, stdin ("-") or a growing file."""
+    if filepath == "-":
+        yield from sys.stdin
+        return
+
+    if not follow:
+        with open_traffic_file(filepath) as file:
+            yield from file
+        return
+
+    with open(filepath, "r") as file:
+        yield from follow_lines(file, poll_interval)
+
+
+STREAM_ALERT_MESSAGES = {
+    "port_scan": "Port scan detected from %s (%s ports)",
+    "syn_flood": "SYN flood detected from %s (%s SYNs)",
+    "packet_rate": "Packet rate flood detected from %s (%s packets in one bucket)"
+}
+
+
+def monitor_stream(lines, monitor: StreamingMonitor) -> dict:
+    """Feed lines into a streaming monitor and log alerts as they happen."""
+    logger = logging.getLogger("network_monitor")
+
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+
+            if line == "":
+                continue
+
+            try:
+                packet = parse_packet_line(line)
+            except ValueError as error:
+                logger.error("Error on line %s: %s", line_number, error)
+                continue
+
+            for alert in monitor.process_packet(packet):
+                logger.warning(STREAM_ALERT_MESSAGES[alert["type"]], alert["src_ip"], alert["value"])
+
+    except KeyboardInterrupt:
+        logger.info("Streaming stopped by user")
+
+    return monitor.results()
+
+
+SERVE_READ_SIZE = 65536
+SERVE_QUEUE_BATCHES = 64
+SERVE_MAX_LINE = 4096
+SERVE_STOP_TIMEOUT = 10.0
+
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    """Hands each UDP datagram to a MonitorServer as one batch of lines."""
+
+    def __init__(self, server: "MonitorServer"):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.offer_batch(data)
+
+
+class MonitorServer:
+    """Asyncio server that feeds packet lines from sensors into a StreamingMonitor.
+
+    Sensors send newline-separated packet lines over TCP or UDP. Each read
+    is cut at its last newline and the complete lines are put, as one
+    bytes batch, on a bounded queue that a single consumer task drains.
+    When the queue is full, TCP readers wait, which pushes back on the
+    sender; UDP has no way to push back, so those batches are dropped
+    and counted. A TCP sensor that sends more than ``SERVE_MAX_LINE``
+    bytes without a newline is disconnected. Current detections are
+    served as JSON over HTTP on ``http_port``.
+    """
+
+    def __init__(self, monitor: StreamingMonitor, host="127.0.0.1", port=0, protocol="tcp", http_port=0,
+                 queue_batches=SERVE_QUEUE_BATCHES):
+        if protocol not in ("tcp", "udp"):
+            raise ValueError(f"Unknown protocol: {protocol}")
+
+        self.monitor = monitor
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.http_port = http_port
+        self.queue_batches = queue_batches
+        self.lines_received = 0
+        self.parse_errors = 0
+        self.dropped_lines = 0
+        self.oversized_lines = 0
+        self.queue = None
+        self._servers = []
+        self._transport = None
+        self._consumer = None
+
+    async def start(self):
+        """Open the sensor and HTTP sockets and start the consumer task.
+
+        Port 0 picks a free port; the bound ports are stored back on
+        ``port`` and ``http_port``.
+        """
+        logger = logging.getLogger("network_monitor")
+        self.queue = asyncio.Queue(self.queue_batches)
+
+        if self.protocol == "tcp":
+            server = await asyncio.start_server(self._handle_sensor, self.host, self.port)
+            self._servers.append(server)
+            self.port = server.sockets[0].getsockname()[1]
+        else:
+            loop = asyncio.get_running_loop()
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramReceiver(self),
+                local_addr=(self.host, self.port)
+            )
+            self.port = self._transport.get_extra_info("sockname")[1]
+
+        http_server = await asyncio.start_server(self._handle_http, self.host, self.http_port)
+        self._servers.append(http_server)
+        self.http_port = http_server.sockets[0].getsockname()[1]
+
+        self._consumer = asyncio.create_task(self._consume())
+        logger.info("Listening for %s packet lines on %s:%s", self.protocol.upper(), self.host, self.port)
+        logger.info("Serving detections on http://%s:%s/detections", self.host, self.http_port)
+
+    async def drain(self):
+        """Wait until every queued batch has been processed."""
+        await self.queue.join()
+
+    async def stop(self, timeout=SERVE_STOP_TIMEOUT):
+        """Stop accepting data, finish the queued batches and close the sockets.
+
+        Gives up on the queued batches after ``timeout`` seconds, or at
+        once if the consumer task has died.
+        """
+        logger = logging.getLogger("network_monitor")
+
+        if self._transport is not None:
+            self._transport.close()
+
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+
+        drained = asyncio.ensure_future(self.drain())
+        await asyncio.wait((drained, self._consumer), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+        if not drained.done():
+            drained.cancel()
+            logger.error("Stopped with %s batches still queued", self.queue.qsize())
+
+        if self._consumer.done() and not self._consumer.cancelled() and self._consumer.exception():
+            logger.error("Packet consumer failed: %s", self._consumer.exception())
+        self._consumer.cancel()
+
+    def offer_batch(self, batch: bytes):
+        """Queue a batch without waiting, dropping it if the queue is full."""
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            self.dropped_lines += sum(1 for line in batch.splitlines() if line.strip())
+
+    async def _handle_sensor(self, reader, writer):
+        pending = b""
+
+        try:
+            while True:
+                data = await reader.read(SERVE_READ_SIZE)
+                if not data:
+                    break
+
+                batch, newline, pending = (pending + data).rpartition(b"\n")
+                if len(pending) > SERVE_MAX_LINE:
+                    self.oversized_lines += 1
+                    logging.getLogger("network_monitor").error(
+                        "Sensor sent more than %s bytes without a newline, disconnecting", SERVE_MAX_LINE)
+                    pending = b""
+                    if newline:
+                        await self.queue.put(batch)
+                    break
+                if newline:
+                    await self.queue.put(batch)
+
+            if pending:
+                await self.queue.put(pending)
+
+        finally:
+            writer.close()
+
+    async def _consume(self):
+        while True:
+            batch = await self.queue.get()
+            try:
+                self.process_lines(batch.decode("utf-8", errors="replace").split("\n"))
+            except Exception:
+                logging.getLogger("network_monitor").exception("Could not process a batch of sensor lines")
+            finally:
+                self.queue.task_done()
+
+    def process_lines(self, lines):
+        """Parse packet lines and feed them to the monitor."""
+        logger = logging.getLogger("network_monitor")
+        add = self.monitor.add
+        clock = self.monitor.clock
+
+        for line in lines:
+            line = line.strip()
+
+            if line == "":
+                continue
+
+            self.lines_received += 1
+
+            try:
+                src_ip, _, _, dst_port, protocol, flags, timestamp = parse_packet_fields(line)
+            except ValueError as error:
+                self.parse_errors += 1
+                logger.error("Bad packet line from sensor: %s", error)
+                continue
+
+            if timestamp is None:
+                timestamp = clock()
+
+            for alert in add(src_ip, dst_port, protocol == "TCP" and flags == "SYN", timestamp):
+                logger.warning(STREAM_ALERT_MESSAGES[alert["type"]], alert["src_ip"], alert["value"])
+
+    def snapshot(self) -> dict:
+        """Return the monitor results plus server counters."""
+        results = self.monitor.results()
+        results["server"] = {
+            "protocol": self.protocol,
+            "lines_received": self.lines_received,
+            "parse_errors": self.parse_errors,
+            "dropped_lines": self.dropped_lines,
+            "oversized_lines": self.oversized_lines,
+            "queued_batches": self.queue.qsize()
+        }
+        return results
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1] in ("/", "/detections"):
+                status = "200 OK"
+                body = json.dumps(self.snapshot())
+            else:
+                status = "404 Not Found"
+                body = json.dumps({"error": "Use GET /detections"})
+
+            body = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+
+        finally:
+            writer.close()
+
+
+def write_progress_results(output, config: NetworkConfig, aggregator: TrafficAggregator, offset: int, size: int):
+    """Write interim results for the input read so far.
+
+    The file is replaced atomically, and "progress" shows how far the
+    analysis got. The final results overwrite it without that key.
+    """
+    results = analyze_traffic(aggregator, config, quiet=True)
+    results["progress"] = {"bytes_read": offset, "total_bytes": size}
+
+    temp_path = f"{output}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(results, file, indent=4)
+    os.replace(temp_path, output)
+
+
 def create_parser():
     """Create the command line parser."""
     parser = argparse.ArgumentParser(
-        description="Network Traffic Monitor - Detect suspicious network traffic"
+        description="Network Traffic Monitor - Detect suspicious network traffic",
+        epilog="Use 'network_monitor.py convert INPUT OUTPUT' to build a binary capture, "
+               "or 'network_monitor.py serve' to receive packet lines from sensors."
     )
 
-    parser.add_argument("input_file", type=Path, help="Traffic log file")
+    parser.add_argument("input_file", type=Path,
+                        help="Traffic log, binary capture, .nmpart partial aggregate, directory or glob pattern "
+                             "(use - for stdin with --follow)")
+    parser.add_argument("--partials-dir", type=Path,
+                        help="Save per-file partial aggregates here and reuse them on later runs")
     parser.add_argument("-o", "--output", type=Path, default=Path("results.json"))
     parser.add_argument("-p", "--port-scan-threshold", type=int, default=25)
     parser.add_argument("-s", "--syn-flood-threshold", type=int, default=100)
+    parser.add_argument("-r", "--packet-rate-threshold", type=int, default=NetworkConfig.DEFAULT_PACKET_RATE_THRESHOLD,
+                        help="Packets per time bucket before a source is flagged (needs the timestamp column)")
+    parser.add_argument("--rate-bucket-seconds", type=float, default=NetworkConfig.DEFAULT_RATE_BUCKET_SECONDS,
+                        help="Length of a packet rate time bucket")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Processes used to parse the input file")
+    parser.add_argument("--engine", choices=ENGINES, default="python", help="Counting backend for batch analysis")
+    parser.add_argument("--sketch", action="store_true", help="Use fixed-memory sketches instead of exact per-source counts")
+    parser.add_argument("--sketch-error", type=float, default=NetworkConfig.DEFAULT_SKETCH_ERROR,
+                        help="Target relative error of the distinct-port sketch")
+    parser.add_argument("--cms-epsilon", type=float, default=NetworkConfig.DEFAULT_CMS_EPSILON,
+                        help="SYN count sketch error, as a fraction of all SYNs; smaller uses more memory")
+    parser.add_argument("--threat-lookup", type=Path,
+                        help="threat_lookup.json from threat_aggregator.py; tags sources on the blocklist")
+    parser.add_argument("--sweep", action="store_true", help="Report flagged sources for a range of thresholds")
+    parser.add_argument("--port-scan-range", default="5:100:5", help="Port scan thresholds to sweep, START:STOP[:STEP]")
+    parser.add_argument("--syn-flood-range", default="10:500:10", help="SYN flood thresholds to sweep, START:STOP[:STEP]")
+    parser.add_argument("--checkpoint", type=Path, help="Save progress here while reading a text log "
+                        "(default with --resume: OUTPUT.checkpoint)")
+    parser.add_argument("--checkpoint-mb", type=int, default=CHECKPOINT_BYTES // (1024 * 1024),
+                        help="Megabytes of input between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    parser.add_argument("-f", "--follow", action="store_true", help="Keep reading new lines and alert as they arrive")
+    parser.add_argument("--window-size", type=int, default=1000, help="Packets kept per source in follow mode")
+    parser.add_argument("--window-seconds", type=float, default=60.0, help="Seconds kept per source in follow mode")
+    parser.add_argument("--log-every", type=int, default=LOG_EVERY_LINES, help="Lines between DEBUG progress messages")
     parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO")
     parser.add_argument("-v", "--verbose", action="store_true")
     parser.add_argument("--version", action="version", version="network_monitor.py 1.0.0")
@@ -177,11 +2826,22 @@ def create_parser():
 
 def validate_args(args):
     """Validate command line arguments."""
-    if not args.input_file.exists():
-        raise FileNotFoundError(f"Input file not found: {args.input_file}")
+    follow = getattr(args, "follow", False)
 
-    if not args.input_file.is_file():
-        raise ValueError("Input path must be a file")
+    if str(args.input_file) == "-":
+        if not follow:
+            raise ValueError("Reading from stdin requires --follow")
+
+        args.input_files = ["-"]
+
+    else:
+        args.input_files = expand_inputs(str(args.input_file))
+
+    if len(args.input_files) > 1 and follow:
+        raise ValueError("--follow needs a single input file")
+
+    if follow and args.input_files != ["-"] and detect_compression(args.input_files[0]):
+        raise ValueError("--follow cannot read compressed files")
 
     if args.port_scan_threshold < 1:
         raise ValueError("Port scan threshold must be positive")
@@ -189,14 +2849,199 @@ def validate_args(args):
     if args.syn_flood_threshold < 1:
         raise ValueError("SYN flood threshold must be positive")
 
+    if getattr(args, "packet_rate_threshold", 1) < 1:
+        raise ValueError("Packet rate threshold must be positive")
+
+    if getattr(args, "rate_bucket_seconds", 1.0) <= 0:
+        raise ValueError("Rate bucket seconds must be positive")
+
+    if getattr(args, "sweep", False):
+        if follow:
+            raise ValueError("--sweep cannot be used with --follow")
+
+        args.port_scan_thresholds = parse_threshold_range(args.port_scan_range)
+        args.syn_flood_thresholds = parse_threshold_range(args.syn_flood_range)
+
+    if getattr(args, "resume", False) and getattr(args, "checkpoint", None) is None:
+        args.checkpoint = Path(f"{args.output}.checkpoint")
+
+    if getattr(args, "checkpoint", None) is not None:
+        if follow:
+            raise ValueError("--checkpoint and --resume cannot be used with --follow")
+
+        if len(args.input_files) > 1:
+            raise ValueError("--checkpoint and --resume need a single input file; use --partials-dir for many")
+
+        if args.checkpoint_mb < 1:
+            raise ValueError("Checkpoint interval must be positive")
+
+    if getattr(args, "log_every", 1) < 1:
+        raise ValueError("Log interval must be positive")
+
+    if not 0 < getattr(args, "sketch_error", NetworkConfig.DEFAULT_SKETCH_ERROR) < 1:
+        raise ValueError("Sketch error must be between 0 and 1")
+
+    if not 0 < getattr(args, "cms_epsilon", NetworkConfig.DEFAULT_CMS_EPSILON) < 1:
+        raise ValueError("Count-min epsilon must be between 0 and 1")
+
+    if getattr(args, "workers", 1) < 1:
+        raise ValueError("Workers must be positive")
+
+    if follow and args.window_size < 1:
+        raise ValueError("Window size must be positive")
+
+    if follow and args.window_seconds <= 0:
+        raise ValueError("Window seconds must be positive")
+
     if args.verbose:
         args.log_level = "DEBUG"
 
 
-def main():
+def create_convert_parser():
+    """Create the command line parser for the convert command."""
+    parser = argparse.ArgumentParser(
+        prog="network_monitor.py convert",
+        description="Convert a text traffic log into a binary capture for fast re-analysis"
+    )
+
+    parser.add_argument("input_file", type=Path, help="Traffic log file")
+    parser.add_argument("output_file", type=Path, help="Binary capture file to write")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO")
+
+    return parser
+
+
+def convert_main(argv):
+    """Run the convert command."""
+    args = create_convert_parser().parse_args(argv)
+
+    try:
+        if not args.input_file.is_file():
+            raise FileNotFoundError(f"Input file not found: {args.input_file}")
+
+        logger = setup_logging(log_level=args.log_level)
+        logger.info("Converting %s to binary capture", args.input_file)
+
+        packets = load_traffic_log(str(args.input_file))
+        write_binary_capture(packets, str(args.output_file))
+
+        print(f"Converted {len(packets)} packets to {args.output_file}")
+        return 0
+
+    except (FileNotFoundError, ValueError) as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 1
+
+    finally:
+        stop_logging()
+
+
+def create_serve_parser():
+    """Create the command line parser for the serve command."""
+    parser = argparse.ArgumentParser(
+        prog="network_monitor.py serve",
+        description="Receive live packet lines over TCP or UDP and serve detections as JSON"
+    )
+
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=9999, help="Port sensors send packet lines to")
+    parser.add_argument("--udp", action="store_true", help="Receive datagrams instead of TCP streams")
+    parser.add_argument("--http-port", type=int, default=8080, help="Port of the JSON detections endpoint")
+    parser.add_argument("-o", "--output", type=Path, help="Write the final detections here on shutdown")
+    parser.add_argument("-p", "--port-scan-threshold", type=int, default=25)
+    parser.add_argument("-s", "--syn-flood-threshold", type=int, default=100)
+    parser.add_argument("-r", "--packet-rate-threshold", type=int, default=NetworkConfig.DEFAULT_PACKET_RATE_THRESHOLD)
+    parser.add_argument("--rate-bucket-seconds", type=float, default=NetworkConfig.DEFAULT_RATE_BUCKET_SECONDS)
+    parser.add_argument("--window-size", type=int, default=1000, help="Packets kept per source")
+    parser.add_argument("--window-seconds", type=float, default=60.0, help="Seconds kept per source")
+    parser.add_argument("--threat-lookup", type=Path, help="threat_lookup.json from threat_aggregator.py")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO")
+
+    return parser
+
+
+async def run_server(server: MonitorServer, stop_event=None):
+    """Run a MonitorServer until ``stop_event`` is set or the task is cancelled."""
+    await server.start()
+
+    try:
+        await (stop_event or asyncio.Event()).wait()
+    finally:
+        await server.stop()
+
+
+def serve_main(argv):
+    """Run the serve command."""
+    args = create_serve_parser().parse_args(argv)
+
+    try:
+        for name in ("port_scan_threshold", "syn_flood_threshold", "packet_rate_threshold", "window_size"):
+            if getattr(args, name) < 1:
+                raise ValueError(f"{name.replace('_', ' ').capitalize()} must be positive")
+
+        if args.window_seconds <= 0 or args.rate_bucket_seconds <= 0:
+            raise ValueError("Window and bucket seconds must be positive")
+
+        logger = setup_logging(log_level=args.log_level)
+        logger.info("Network Monitor server starting")
+
+        config = NetworkConfig(
+            port_scan_threshold=args.port_scan_threshold,
+            syn_flood_threshold=args.syn_flood_threshold,
+            packet_rate_threshold=args.packet_rate_threshold,
+            rate_bucket_seconds=args.rate_bucket_seconds
+        )
+        threat_lookup = ThreatLookup.load(args.threat_lookup) if args.threat_lookup else None
+        monitor = StreamingMonitor(
+            config,
+            window_size=args.window_size,
+            window_seconds=args.window_seconds,
+            threat_lookup=threat_lookup
+        )
+        server = MonitorServer(
+            monitor,
+            host=args.host,
+            port=args.port,
+            protocol="udp" if args.udp else "tcp",
+            http_port=args.http_port
+        )
+
+        try:
+            asyncio.run(run_server(server))
+        except KeyboardInterrupt:
+            logger.info("Server stopped by user")
+
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(server.snapshot(), file, indent=4)
+
+        return 0
+
+    except OSError as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 1
+
+    except ValueError as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 1
+
+    finally:
+        stop_logging()
+
+
+def main(argv=None):
     """Main program function."""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv and argv[0] == "convert":
+        return convert_main(argv[1:])
+
+    if argv and argv[0] == "serve":
+        return serve_main(argv[1:])
+
     parser = create_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     try:
         validate_args(args)
@@ -206,19 +3051,79 @@ def main():
 
         config = NetworkConfig(
             port_scan_threshold=args.port_scan_threshold,
-            syn_flood_threshold=args.syn_flood_threshold
+            syn_flood_threshold=args.syn_flood_threshold,
+            sketch=args.sketch,
+            sketch_error=args.sketch_error,
+            packet_rate_threshold=args.packet_rate_threshold,
+            rate_bucket_seconds=args.rate_bucket_seconds,
+            cms_epsilon=args.cms_epsilon
         )
 
-        packets = load_traffic_log(str(args.input_file))
-        results = analyze_traffic(packets, config)
+        input_file = args.input_files[0]
+        threat_lookup = None
+
+        if args.threat_lookup is not None:
+            threat_lookup = ThreatLookup.load(args.threat_lookup)
+            logger.info("Loaded %s threat indicators from %s", len(threat_lookup), args.threat_lookup)
+
+        if args.follow:
+            monitor = StreamingMonitor(
+                config,
+                window_size=args.window_size,
+                window_seconds=args.window_seconds,
+                threat_lookup=threat_lookup
+            )
+            lines = iter_traffic_lines(input_file, follow=True)
+            results = monitor_stream(lines, monitor)
+        else:
+            binary = is_binary_capture(input_file)
+
+            if len(args.input_files) > 1 or args.partials_dir is not None or is_partial_file(input_file):
+                traffic = aggregate_files(args.input_files, config, args.workers, args.partials_dir)
+            elif args.checkpoint is not None and not binary:
+                traffic = aggregate_with_checkpoints(
+                    input_file,
+                    str(args.checkpoint),
+                    config,
+                    resume=args.resume,
+                    checkpoint_bytes=args.checkpoint_mb * 1024 * 1024,
+                    workers=args.workers,
+                    on_checkpoint=None if args.sweep else partial(write_progress_results, args.output, config)
+                )
+            elif args.workers > 1 and not binary and detect_compression(input_file) is None:
+                traffic = aggregate_traffic_log(input_file, args.workers, config)
+            else:
+                traffic = load_traffic_log(input_file, log_every=args.log_every)
+
+            if args.sweep:
+                results = sweep_thresholds(
+                    traffic,
+                    args.port_scan_thresholds,
+                    args.syn_flood_thresholds,
+                    engine=args.engine,
+                    config=config
+                )
+            else:
+                results = analyze_traffic(traffic, config, engine=args.engine, threat_lookup=threat_lookup)
 
         with open(args.output, "w") as file:
             json.dump(results, file, indent=4)
 
+        if getattr(args, "checkpoint", None) is not None:
+            args.checkpoint.unlink(missing_ok=True)
+
+        if args.sweep:
+            print_sweep_table(results)
+            print(f"\nSweep saved to: {args.output}")
+            return 0
+
         print("\nAnalysis complete")
         print(f"Total packets: {results['total_packets']}")
         print(f"Port scans found: {len(results['port_scans'])}")
         print(f"SYN floods found: {len(results['syn_floods'])}")
+        print(f"Packet rate floods found: {len(results['packet_rate_floods'])}")
+        if "threat_matches" in results:
+            print(f"Known threat sources found: {len(results['threat_matches'])}")
         print(f"Results saved to: {args.output}")
 
         return 0
@@ -235,6 +3140,9 @@ def main():
         print(f"FATAL ERROR: {error}", file=sys.stderr)
         return 2
 
+    finally:
+        stop_logging()
+
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -1,6 +1,15 @@
+import asyncio
+import gzip
+import json
+import lzma
+import logging
+import pickle
+import random
+
 import pytest
 from pathlib import Path
 
+import network_monitor
 from network_monitor import (
     NetworkConfig,
     parse_packet_line,
@@ -8,8 +17,40 @@ from network_monitor import (
     detect_port_scan,
     detect_syn_flood,
     analyze_traffic,
-    validate_args
+    validate_args,
+    create_parser,
+    TrafficAggregator,
+    StreamingMonitor,
+    monitor_stream,
+    PacketTable,
+    load_traffic_log,
+    ip_to_int,
+    int_to_ip,
+    split_file_chunks,
+    aggregate_traffic_log,
+    aggregate_chunk,
+    aggregate_lines,
+    parse_packet_fast,
+    setup_logging,
+    stop_logging,
+    write_binary_capture,
+    load_binary_capture,
+    is_binary_capture,
+    parse_threshold_range,
+    sweep_thresholds,
+    Detector,
+    DETECTORS,
+    RateRing,
+    MonitorServer,
+    SERVE_MAX_LINE,
+    aggregate_with_checkpoints,
+    load_checkpoint,
+    expand_inputs,
+    aggregate_files,
+    detect_compression,
+    ThreatLookup
 )
+from traffic_generator import flooder_ips, generate_traffic, scanner_ips
 
 
 @pytest.fixture
@@ -83,6 +124,46 @@ def test_parse_extra_whitespace():
     assert packet["flags"] == "SYN"
 
 
+def test_parse_timestamp_column(valid_packet_line):
+    packet = parse_packet_line(valid_packet_line + ",1700000000.25")
+
+    assert packet["timestamp"] == 1700000000.25
+    assert "timestamp" not in parse_packet_line(valid_packet_line)
+    assert parse_packet_fast(valid_packet_line + ",1700000000.25\n")[6] == 1700000000.25
+
+
+def test_parse_bad_timestamp(valid_packet_line):
+    with pytest.raises(ValueError):
+        parse_packet_line(valid_packet_line + ",soon")
+
+
+def test_parse_fast_matches_strict(valid_packet_line):
+    values = parse_packet_fast(valid_packet_line + "\n")
+    packet = parse_packet_line(valid_packet_line)
+
+    assert values == (
+        ip_to_int(packet["src_ip"]),
+        ip_to_int(packet["dst_ip"]),
+        packet["src_port"],
+        packet["dst_port"],
+        packet["protocol"],
+        packet["flags"]
+    )
+
+
+@pytest.mark.parametrize("line", [
+    " 192.168.1.5 , 10.0.0.1 , 54321 , 443 , tcp , syn ",
+    "192.168.1.5,10.0.0.1,54321,443,tcp,SYN",
+    "192.168.1.5,10.1,54321,443,TCP,SYN",
+    "192.168.01.5,10.0.0.1,54321,443,TCP,SYN",
+    "192.168.1.5,10.0.0.1,bad,443,TCP,SYN",
+    "192.168.1.5,10.0.0.1,443",
+    ""
+])
+def test_parse_fast_leaves_unusual_lines_to_strict_parser(line):
+    assert parse_packet_fast(line) is None
+
+
 def test_is_syn_packet_true():
     packet = {
         "protocol": "TCP",
@@ -165,6 +246,34 @@ def test_port_scan_empty_list(sample_config):
     assert result is False
 
 
+def test_detectors_accept_any_source_address(sample_packets, sample_config):
+    packets = sample_packets + [
+        parse_packet_line(f"2001:db8::1,10.0.0.1,40000,{port},TCP,SYN") for port in range(1, 31)
+    ]
+
+    assert detect_port_scan(packets, "2001:db8::1", sample_config.port_scan_threshold) is True
+    assert detect_port_scan(packets, "2001:db8::9", sample_config.port_scan_threshold) is False
+    assert detect_syn_flood(packets, "host-a", sample_config.syn_flood_threshold) is False
+    assert detect_port_scan([], "not an address", sample_config.port_scan_threshold) is False
+
+
+def test_analyze_traffic_skips_packets_it_cannot_store(sample_packets, sample_config):
+    host = dict(sample_packets[0], src_ip="host-a")
+    too_big = dict(sample_packets[0], dst_port=70000)
+
+    table = PacketTable.from_packets([too_big] + sample_packets + [host])
+    assert len(table) == 3
+    assert table.skipped == 1
+
+    for engine in ("python", "numpy"):
+        results = analyze_traffic([too_big] + sample_packets + [host], sample_config, engine=engine, quiet=True)
+        assert results["total_packets"] == 3
+        assert results["unique_source_ips"] == 2
+        assert results["skipped_packets"] == 1
+
+    assert "skipped_packets" not in analyze_traffic(sample_packets, sample_config, quiet=True)
+
+
 def test_syn_flood_below_threshold(sample_packets, sample_config):
     result = detect_syn_flood(
         sample_packets,
@@ -273,6 +382,1064 @@ def test_analyze_empty_traffic(sample_config):
     assert len(results["syn_floods"]) == 0
 
 
+def test_aggregator_counts_per_source(sample_packets):
+    aggregator = TrafficAggregator.from_packets(sample_packets)
+
+    assert aggregator.total_packets == 2
+    assert aggregator.source_ips() == ["192.168.1.5"]
+    assert aggregator.distinct_ports("192.168.1.5") == 2
+    assert aggregator.syn_count("192.168.1.5") == 2
+    assert aggregator.syn_count("10.9.9.9") == 0
+
+
+def test_custom_detector_shares_one_pass(monkeypatch, sample_packets):
+    class DestinationCountDetector(Detector):
+        name = "dst_count"
+        fields = ("src_ip", "dst_ip")
+        result_key = "many_destinations"
+        threshold_attr = "port_scan_threshold"
+
+        def __init__(self):
+            self.destinations = {}
+            self.blocks = 0
+
+        def update(self, src_ips, dst_ips):
+            self.blocks += 1
+            for src_ip, dst_ip in zip(src_ips, dst_ips):
+                self.destinations.setdefault(src_ip, set()).add(dst_ip)
+
+        def value(self, src_ip):
+            return len(self.destinations.get(src_ip, ()))
+
+    monkeypatch.setitem(DETECTORS, "dst_count", DestinationCountDetector)
+    config = NetworkConfig(port_scan_threshold=1)
+    config.detectors = ("port_scan", "dst_count")
+    aggregator = TrafficAggregator.from_packets(sample_packets, config)
+
+    assert aggregator.detector("dst_count").value(ip_to_int("192.168.1.5")) == 1
+    assert aggregator.detector("dst_count").blocks == 1
+    assert set(aggregator.timings) == {"port_scan", "dst_count"}
+
+    results = analyze_traffic(aggregator, config)
+    assert results["port_scans"] == ["192.168.1.5"]
+    assert results["many_destinations"] == []
+
+
+def test_unknown_detector(sample_packets, sample_config):
+    sample_config.detectors = ("port_scan", "nope")
+
+    with pytest.raises(ValueError):
+        TrafficAggregator.from_packets(sample_packets, sample_config)
+
+
+def test_analyze_traffic_flags_scanner(sample_config):
+    packets = []
+
+    for port in range(1, 31):
+        packets.append({
+            "src_ip": "192.168.1.66",
+            "dst_ip": "10.0.0.1",
+            "src_port": 50000 + port,
+            "dst_port": port,
+            "protocol": "TCP",
+            "flags": "ACK"
+        })
+
+    packets.append({
+        "src_ip": "192.168.1.5",
+        "dst_ip": "10.0.0.1",
+        "src_port": 54321,
+        "dst_port": 443,
+        "protocol": "TCP",
+        "flags": "SYN"
+    })
+
+    results = analyze_traffic(packets, sample_config)
+
+    assert results["total_packets"] == 31
+    assert results["unique_source_ips"] == 2
+    assert results["port_scans"] == ["192.168.1.66"]
+    assert results["syn_floods"] == []
+
+
+def test_ip_round_trip():
+    assert ip_to_int("192.168.1.5") == 0xC0A80105
+    assert int_to_ip(0xC0A80105) == "192.168.1.5"
+
+
+def test_ip_to_int_rejects_bad_address():
+    with pytest.raises(ValueError):
+        ip_to_int("999.1.1.1")
+
+
+def test_packet_table_round_trip(sample_packets):
+    table = PacketTable.from_packets(sample_packets)
+
+    assert len(table) == 2
+    assert table.src_ips.itemsize == 4
+    assert table.dst_ports.itemsize == 2
+    assert table.protocol_names == ["TCP"]
+    assert list(table) == sample_packets
+
+
+def test_packet_table_rejects_large_port():
+    packet = parse_packet_line("192.168.1.5,10.0.0.1,54321,70000,TCP,SYN")
+
+    with pytest.raises(ValueError):
+        PacketTable().append(packet)
+
+
+def test_load_traffic_log_builds_table(tmp_path, sample_config):
+    log_file = tmp_path / "traffic.log"
+    log_file.write_text(
+        "192.168.1.5,10.0.0.1,54321,443,TCP,SYN\n"
+        "bad line\n"
+        "\n"
+        "192.168.1.9,10.0.0.2,53000,53,udp,ack\n"
+        "host.example,10.0.0.2,53000,53,UDP,ACK\n"
+    )
+
+    table = load_traffic_log(str(log_file))
+    results = analyze_traffic(table, sample_config)
+
+    assert isinstance(table, PacketTable)
+    assert len(table) == 3
+    assert table.packet(1)["protocol"] == "UDP"
+    assert table.packet(2)["src_ip"] == "host.example"
+    assert results["total_packets"] == 3
+    assert results["unique_source_ips"] == 3
+
+
+def mixed_address_lines():
+    """40 SYNs each from an IPv6 address and a host name to 40 ports, plus one IPv4 packet."""
+    lines = ["192.168.1.5,10.0.0.1,54321,443,TCP,SYN\n"]
+    for port in range(1, 41):
+        lines.append(f"2001:db8::1,2001:db8::2,40000,{port},TCP,SYN\n")
+        lines.append(f"host-a,10.0.0.1,40000,{port},TCP,SYN\n")
+    return lines
+
+
+def test_non_ipv4_addresses_are_kept(tmp_path):
+    config = NetworkConfig(port_scan_threshold=25, syn_flood_threshold=30)
+    log_file = tmp_path / "traffic.log"
+    log_file.write_text("".join(mixed_address_lines()))
+
+    table = load_traffic_log(str(log_file))
+    assert len(table) == 81
+    assert table.addresses == ["2001:db8::1", "2001:db8::2", "host-a"]
+    assert table.packet(1)["dst_ip"] == "2001:db8::2"
+    assert table.src_ips.itemsize == 8
+
+    for engine in ("python", "numpy"):
+        results = analyze_traffic(table, config, engine=engine)
+        assert results["total_packets"] == 81
+        assert results["unique_source_ips"] == 3
+        assert sorted(results["port_scans"]) == ["2001:db8::1", "host-a"]
+        assert sorted(results["syn_floods"]) == ["2001:db8::1", "host-a"]
+
+    # Each table interns addresses in its own order; the second half
+    # sees host-a first, and the merge must still line the sources up.
+    lines = mixed_address_lines()
+    first, _, errors = aggregate_lines(lines[:41], config)
+    second, _, _ = aggregate_lines(lines[:40:-1], config)
+    first.merge(second)
+    merged = analyze_traffic(first, config)
+    assert errors == []
+    assert merged["total_packets"] == 81
+    assert merged["unique_source_ips"] == 3
+    assert sorted(merged["port_scans"]) == ["2001:db8::1", "host-a"]
+
+    with pytest.raises(ValueError):
+        write_binary_capture(table, str(tmp_path / "traffic.bin"))
+
+
+def make_random_table(seed=7, count=5000):
+    rng = random.Random(seed)
+    table = PacketTable()
+
+    for _ in range(count):
+        table.append({
+            "src_ip": f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 20)}",
+            "dst_ip": "10.1.1.1",
+            "src_port": rng.randint(1024, 65535),
+            "dst_port": rng.randint(1, 60),
+            "protocol": rng.choice(["TCP", "UDP"]),
+            "flags": rng.choice(["SYN", "ACK"])
+        })
+
+    return table
+
+
+def test_numpy_engine_matches_python():
+    pytest.importorskip("numpy")
+    table = make_random_table()
+    config = NetworkConfig(port_scan_threshold=40, syn_flood_threshold=18)
+
+    python_results = analyze_traffic(table, config, engine="python")
+    numpy_results = analyze_traffic(table, config, engine="numpy")
+
+    assert numpy_results == python_results
+    assert python_results["port_scans"]
+    assert python_results["syn_floods"]
+
+
+def test_numpy_engine_empty_traffic(sample_config):
+    pytest.importorskip("numpy")
+    results = analyze_traffic([], sample_config, engine="numpy")
+
+    assert results["total_packets"] == 0
+    assert results["port_scans"] == []
+
+
+def test_numpy_engine_falls_back_without_numpy(monkeypatch, sample_packets, sample_config):
+    monkeypatch.setattr(network_monitor, "np", None)
+    results = analyze_traffic(sample_packets, sample_config, engine="numpy")
+
+    assert results["total_packets"] == 2
+
+
+def test_unknown_engine(sample_packets, sample_config):
+    with pytest.raises(ValueError):
+        analyze_traffic(sample_packets, sample_config, engine="gpu")
+
+
+def write_traffic_log(path, count=3000, seed=3, bad_lines=(10, 2500)):
+    rng = random.Random(seed)
+    lines = []
+
+    for _ in range(count):
+        lines.append(
+            f"10.0.0.{rng.randint(1, 9)},10.1.1.1,{rng.randint(1024, 65535)},"
+            f"{rng.randint(1, 40)},TCP,{rng.choice(['SYN', 'ACK'])}"
+        )
+
+    for index in bad_lines:
+        lines[index] = "10.0.0.1,10.1.1.1,bad,80,TCP,SYN"
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_load_logs_progress_in_batches(tmp_path, caplog):
+    log_file = tmp_path / "traffic.log"
+    write_traffic_log(log_file, count=250, bad_lines=(10,))
+
+    with caplog.at_level("DEBUG", logger="network_monitor"):
+        load_traffic_log(str(log_file), log_every=100)
+
+    debug_messages = [record.getMessage() for record in caplog.records if record.levelname == "DEBUG"]
+    assert debug_messages == [
+        "Read 100 lines, 99 packets so far",
+        "Read 200 lines, 199 packets so far",
+        "Read 250 lines in total"
+    ]
+
+
+def test_setup_logging_writes_file_through_queue(tmp_path):
+    log_file = tmp_path / "monitor.log"
+    logger = setup_logging(log_file=str(log_file), log_level="ERROR")
+
+    try:
+        logger.debug("debug message")
+        logger.info("info message")
+    finally:
+        stop_logging()
+        logger.handlers.clear()
+
+    text = log_file.read_text()
+    assert "DEBUG - debug message" in text
+    assert "INFO - info message" in text
+
+
+def test_stop_logging_detaches_queue_handler(tmp_path):
+    logger = logging.getLogger("network_monitor")
+
+    try:
+        for _ in range(3):
+            setup_logging(log_file=str(tmp_path / "monitor.log"), log_level="ERROR")
+            stop_logging()
+
+        assert not any(isinstance(handler, network_monitor.QueueHandler) for handler in logger.handlers)
+        assert len(logger.handlers) == 1
+    finally:
+        logger.handlers.clear()
+
+
+def test_split_file_chunks_align_to_newlines(tmp_path):
+    log_file = tmp_path / "traffic.log"
+    write_traffic_log(log_file)
+    data = log_file.read_bytes()
+
+    chunks = split_file_chunks(str(log_file), 4)
+
+    assert chunks[0][0] == 0
+    assert chunks[-1][1] == len(data)
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+        assert data[end - 1:end] == b"\n"
+
+
+def test_parallel_matches_serial(tmp_path, caplog):
+    log_file = tmp_path / "traffic.log"
+    write_traffic_log(log_file)
+    config = NetworkConfig(port_scan_threshold=30, syn_flood_threshold=160)
+
+    serial = analyze_traffic(load_traffic_log(str(log_file)), config)
+    caplog.clear()
+    parallel = analyze_traffic(aggregate_traffic_log(str(log_file), 3), config)
+
+    assert parallel == serial
+    assert parallel["total_packets"] == 2998
+    errors = [record.getMessage() for record in caplog.records if record.levelname == "ERROR"]
+    assert errors[0].startswith("Error on line 11:")
+    assert errors[1].startswith("Error on line 2501:")
+
+
+def test_checkpoint_resume_matches_full_run(tmp_path, caplog):
+    log_file = tmp_path / "traffic.log"
+    checkpoint = tmp_path / "traffic.checkpoint"
+    write_traffic_log(log_file)
+    config = NetworkConfig(port_scan_threshold=30, syn_flood_threshold=160)
+    expected = analyze_traffic(load_traffic_log(str(log_file)), config)
+
+    def crash_after_first(aggregator, offset, size):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        aggregate_with_checkpoints(str(log_file), str(checkpoint), config, checkpoint_bytes=20000,
+                                   on_checkpoint=crash_after_first)
+
+    saved = load_checkpoint(str(checkpoint), str(log_file), config)
+    assert 20000 <= saved["offset"] < log_file.stat().st_size
+    assert saved["aggregator"].total_packets == saved["line_count"] - 1
+
+    caplog.clear()
+    resumed = aggregate_with_checkpoints(str(log_file), str(checkpoint), config, resume=True,
+                                         checkpoint_bytes=20000, workers=2)
+
+    assert analyze_traffic(resumed, config) == expected
+    errors = [record.getMessage() for record in caplog.records if record.levelname == "ERROR"]
+    assert [error.split(":")[0] for error in errors] == ["Error on line 2501"]
+
+
+def test_checkpoint_rejects_other_settings(tmp_path):
+    log_file = tmp_path / "traffic.log"
+    checkpoint = tmp_path / "traffic.checkpoint"
+    write_traffic_log(log_file, count=200, bad_lines=())
+
+    aggregate_with_checkpoints(str(log_file), str(checkpoint), NetworkConfig())
+
+    with pytest.raises(ValueError):
+        load_checkpoint(str(checkpoint), str(log_file), NetworkConfig(sketch=True))
+
+    log_file.write_text("10.9.9.9,10.1.1.1,1,80,TCP,SYN\n")
+    with pytest.raises(ValueError):
+        load_checkpoint(str(checkpoint), str(log_file), NetworkConfig())
+
+
+UNPICKLED = []
+
+
+def record_unpickling():
+    UNPICKLED.append(True)
+
+
+class Tripwire:
+    """Calls record_unpickling when it is unpickled."""
+
+    def __reduce__(self):
+        return record_unpickling, ()
+
+
+def test_checkpoint_is_json_and_pickles_are_rejected(tmp_path):
+    log_file = tmp_path / "traffic.log"
+    checkpoint = tmp_path / "traffic.checkpoint"
+    write_traffic_log(log_file, count=200, bad_lines=())
+    config = NetworkConfig(sketch=True)
+
+    expected = aggregate_with_checkpoints(str(log_file), str(checkpoint), config)
+    saved = json.loads(checkpoint.read_text())
+    assert (saved["format"], saved["version"]) == ("network_monitor_checkpoint", network_monitor.CHECKPOINT_VERSION)
+
+    resumed = load_checkpoint(str(checkpoint), str(log_file), config)["aggregator"]
+    assert analyze_traffic(resumed, config) == analyze_traffic(expected, config)
+
+    checkpoint.write_bytes(pickle.dumps(Tripwire()))
+    with pytest.raises(ValueError):
+        aggregate_with_checkpoints(str(log_file), str(checkpoint), config, resume=True)
+    assert UNPICKLED == []
+
+
+def test_resume_flag_writes_results_and_removes_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_file = tmp_path / "traffic.log"
+    output = tmp_path / "results.json"
+    write_traffic_log(log_file, count=500, bad_lines=())
+
+    assert network_monitor.main([str(log_file), "-o", str(output), "--resume", "--checkpoint-mb", "1"]) == 0
+
+    results = json.loads(output.read_text())
+    assert results["total_packets"] == 500
+    assert "progress" not in results
+    assert not (tmp_path / "results.json.checkpoint").exists()
+
+
+def write_sharded_logs(directory, shards=3):
+    directory.mkdir()
+    paths = []
+
+    for index in range(shards):
+        path = directory / f"eth0-{index:02d}.log"
+        write_traffic_log(path, count=1000, seed=index, bad_lines=(5,))
+        paths.append(str(path))
+
+    return paths
+
+
+def test_expand_inputs_accepts_files_directories_and_globs(tmp_path):
+    paths = write_sharded_logs(tmp_path / "logs")
+    (tmp_path / "logs" / ".hidden").write_text("")
+
+    assert expand_inputs(paths[1]) == [paths[1]]
+    assert expand_inputs(str(tmp_path / "logs")) == paths
+    assert expand_inputs(str(tmp_path / "*" / "eth0-0[12].log")) == paths[1:]
+
+    with pytest.raises(FileNotFoundError):
+        expand_inputs(str(tmp_path / "missing-*.log"))
+
+
+def test_aggregate_files_matches_one_combined_log(tmp_path, caplog):
+    paths = write_sharded_logs(tmp_path / "logs")
+    combined = tmp_path / "combined.log"
+    combined.write_text("".join(Path(path).read_text() for path in paths))
+    config = NetworkConfig(port_scan_threshold=30, syn_flood_threshold=60)
+
+    expected = analyze_traffic(load_traffic_log(str(combined)), config)
+    caplog.clear()
+    merged = analyze_traffic(aggregate_files(paths, config, workers=2), config)
+
+    assert merged == expected
+    errors = [record.getMessage() for record in caplog.records if record.levelname == "ERROR"]
+    assert errors[0].startswith(f"Error in {paths[0]} on line 6:")
+
+
+def test_aggregate_files_reuses_partials(tmp_path, monkeypatch):
+    paths = write_sharded_logs(tmp_path / "logs")
+    partials = tmp_path / "partials"
+    config = NetworkConfig(port_scan_threshold=30, syn_flood_threshold=60)
+
+    first = analyze_traffic(aggregate_files(paths, config, partials_dir=partials), config)
+    assert len(list(partials.iterdir())) == 3
+
+    parsed = []
+    original = network_monitor.aggregate_file
+    monkeypatch.setattr(network_monitor, "aggregate_file", lambda path, config: parsed.append(path) or original(path, config))
+
+    Path(paths[2]).write_text(Path(paths[2]).read_text() + "10.0.0.1,10.1.1.1,1,9999,TCP,SYN\n")
+    second = analyze_traffic(aggregate_files(paths, config, partials_dir=partials), config)
+    assert parsed == [paths[2]]
+    assert second["total_packets"] == first["total_packets"] + 1
+
+    from_partials = aggregate_files(expand_inputs(str(partials)), config)
+    assert analyze_traffic(from_partials, config) == second
+
+    with pytest.raises(ValueError):
+        aggregate_files(expand_inputs(str(partials)), NetworkConfig(sketch=True))
+
+    saved = json.loads(next(partials.iterdir()).read_text())
+    assert (saved["format"], saved["version"]) == ("network_monitor_partial", network_monitor.PARTIAL_VERSION)
+
+
+@pytest.mark.parametrize("sketch", [False, True])
+def test_aggregator_state_survives_json(sketch):
+    config = NetworkConfig(port_scan_threshold=30, syn_flood_threshold=60, sketch=sketch)
+    lines = list(generate_traffic(20000, scan_ratio=0.05, flood_ratio=0.05, attackers=2, timestamps=True))
+    aggregator, _, _ = aggregate_lines(lines + mixed_address_lines(), config)
+
+    restored = TrafficAggregator.from_state(json.loads(json.dumps(aggregator.state())), config)
+
+    assert analyze_traffic(restored, config) == analyze_traffic(aggregator, config)
+    assert restored.timings == aggregator.timings
+
+    damaged = aggregator.state()
+    del damaged["detectors"][config.detectors[0]]
+    with pytest.raises(ValueError):
+        TrafficAggregator.from_state(damaged, config)
+    with pytest.raises(ValueError):
+        TrafficAggregator.from_state(aggregator.state(), NetworkConfig(sketch=not sketch))
+
+
+def test_partial_inputs_are_never_unpickled(tmp_path, caplog):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    payload = b"NMPART01" + pickle.dumps(Tripwire())
+    (logs / "planted.log").write_bytes(payload)
+    (logs / "planted.nmpart").write_bytes(payload)
+    config = NetworkConfig()
+
+    # Without the extension it is just a log with a bad line in it.
+    aggregator = aggregate_files([str(logs / "planted.log")], config)
+    assert aggregator.total_packets == 0
+    assert any(record.levelname == "ERROR" for record in caplog.records)
+
+    with pytest.raises(ValueError):
+        aggregate_files(expand_inputs(str(logs)), config)
+
+    assert UNPICKLED == []
+
+
+@pytest.mark.parametrize("suffix, compression, compress", [
+    (".gz", "gzip", gzip.compress),
+    (".xz", "xz", lzma.compress),
+    (".zst", "zstd", lambda data: pytest.importorskip("zstandard").ZstdCompressor().compress(data))
+])
+def test_compressed_logs_match_plain(tmp_path, sample_config, suffix, compression, compress):
+    plain = tmp_path / "traffic.log"
+    write_traffic_log(plain, count=500, bad_lines=(7,))
+    packed = tmp_path / f"archive{suffix}"
+    packed.write_bytes(compress(plain.read_bytes()))
+
+    assert detect_compression(str(plain)) is None
+    assert detect_compression(str(packed)) == compression
+    assert list(load_traffic_log(str(packed))) == list(load_traffic_log(str(plain)))
+
+    expected = analyze_traffic(load_traffic_log(str(plain)), sample_config)
+    assert analyze_traffic(aggregate_files([str(packed), str(plain)], sample_config), sample_config)["total_packets"] == 998
+    assert analyze_traffic(aggregate_files([str(packed)], sample_config), sample_config) == expected
+
+    with pytest.raises(ValueError):
+        aggregate_with_checkpoints(str(packed), str(tmp_path / "checkpoint"), sample_config)
+
+
+def test_multi_frame_zstd_log_is_read_to_the_end(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    plain = tmp_path / "traffic.log"
+    write_traffic_log(plain, count=500, bad_lines=(7,))
+    data = plain.read_bytes()
+    middle = data.index(b"\n", len(data) // 2) + 1
+
+    packed = tmp_path / "archive.zst"
+    compressor = zstandard.ZstdCompressor()
+    packed.write_bytes(compressor.compress(data[:middle]) + compressor.compress(data[middle:]))
+
+    assert list(load_traffic_log(str(packed))) == list(load_traffic_log(str(plain)))
+
+
+def test_follow_rejects_compressed_input(tmp_path):
+    packed = tmp_path / "traffic.log.gz"
+    packed.write_bytes(gzip.compress(b"192.168.1.5,10.0.0.1,54321,443,TCP,SYN\n"))
+
+    with pytest.raises(ValueError, match="compressed"):
+        validate_args(create_parser().parse_args([str(packed), "--follow"]))
+
+
+def test_hll_estimate_within_error():
+    detector = DETECTORS["port_scan_hll"]()
+    scanner = ip_to_int("10.0.0.1")
+    quiet = ip_to_int("10.0.0.2")
+
+    detector.update([scanner] * 20000, list(range(20000)))
+    detector.update([quiet] * 5, [80, 80, 443, 22, 22])
+
+    assert abs(detector.value(scanner) - 20000) / 20000 < 3 * detector.error_report()["relative_standard_error"]
+    assert detector.value(quiet) == 3
+    assert detector.value(ip_to_int("10.0.0.3")) == 0
+
+
+def test_hll_merge_matches_single_pass():
+    src_ip = ip_to_int("10.0.0.1")
+    ports = list(range(0, 40000, 3))
+
+    whole = DETECTORS["port_scan_hll"]()
+    whole.update([src_ip] * len(ports), ports)
+
+    first = DETECTORS["port_scan_hll"]()
+    second = DETECTORS["port_scan_hll"]()
+    first.update([src_ip] * 50, ports[:50])
+    second.update([src_ip] * (len(ports) - 50), ports[50:])
+    first.merge(second)
+
+    assert first.value(src_ip) == whole.value(src_ip)
+
+
+def test_count_min_never_undercounts():
+    table = make_random_table(seed=11, count=5000)
+    exact = TrafficAggregator()
+    exact.add_table(table)
+
+    config = NetworkConfig(sketch=True, cms_epsilon=0.01)
+    sketch = TrafficAggregator(config)
+    sketch.add_table(table)
+
+    detector = sketch.detector("syn_floods")
+    bound = detector.error_report()["max_overcount"]
+
+    for src_ip in exact.sources:
+        assert 0 <= detector.value(src_ip) - exact.detector("syn_floods").value(src_ip) <= bound
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_count_min_merge_matches_single_pass(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(network_monitor, "np", None)
+
+    packets = list(make_random_table(seed=5, count=4000))
+    config = NetworkConfig(sketch=True, cms_epsilon=0.001)
+    whole = TrafficAggregator.from_packets(packets, config)
+    merged = TrafficAggregator.from_packets(packets[:1500], config)
+    merged.merge(TrafficAggregator.from_packets(packets[1500:], config))
+
+    detector = merged.detector("syn_floods")
+    assert detector.width == 2719
+    assert detector.total == whole.detector("syn_floods").total
+    assert detector.rows == whole.detector("syn_floods").rows
+
+
+def test_cms_epsilon_comes_from_the_command_line(tmp_path):
+    sample_file = tmp_path / "traffic.log"
+    sample_file.write_text("192.168.1.5,10.0.0.1,54321,443,TCP,SYN\n")
+
+    args = create_parser().parse_args([str(sample_file), "--sketch", "--cms-epsilon", "0.001"])
+    validate_args(args)
+    assert args.cms_epsilon == 0.001
+
+    for epsilon in ("0", "1.5"):
+        with pytest.raises(ValueError):
+            validate_args(create_parser().parse_args([str(sample_file), "--cms-epsilon", epsilon]))
+
+
+def test_analyze_with_sketches_reports_error(tmp_path, sample_config):
+    path = tmp_path / "traffic.log"
+    write_traffic_log(path)
+    exact = analyze_traffic(load_traffic_log(str(path)), sample_config)
+
+    config = NetworkConfig(port_scan_threshold=25, syn_flood_threshold=100, sketch=True)
+    traffic = aggregate_traffic_log(str(path), 2, config)
+    results = analyze_traffic(traffic, config)
+
+    assert results["port_scans"] == exact["port_scans"]
+    assert results["syn_floods"] == exact["syn_floods"]
+    assert results["estimation_error"]["port_scan_hll"]["method"] == "hyperloglog"
+    assert results["estimation_error"]["syn_flood_cms"]["method"] == "count-min"
+    assert "estimation_error" not in exact
+
+
+def test_binary_capture_round_trip(tmp_path, sample_config):
+    table = make_random_table(count=500)
+    capture = tmp_path / "traffic.nmcap"
+
+    write_binary_capture(table, str(capture))
+    loaded = load_traffic_log(str(capture))
+
+    assert is_binary_capture(str(capture))
+    assert isinstance(loaded.src_ips, memoryview)
+    assert list(loaded) == list(table)
+    assert analyze_traffic(loaded, sample_config) == analyze_traffic(table, sample_config)
+
+
+def make_timed_packets(src_ip, count, start, spacing):
+    return [
+        {
+            "src_ip": src_ip,
+            "dst_ip": "10.1.1.1",
+            "src_port": 40000,
+            "dst_port": 80,
+            "protocol": "TCP",
+            "flags": "ACK",
+            "timestamp": start + index * spacing
+        }
+        for index in range(count)
+    ]
+
+
+def test_rate_ring_counts_buckets_and_drops_late_packets():
+    ring = RateRing(4)
+
+    assert ring.add(10) == 1
+    assert ring.add(10, 4) == 5
+    assert ring.add(14) == 1
+    assert ring.add(10) == 0
+    assert ring.count(14) == 1
+    assert ring.peak == 5
+
+
+def test_packet_rate_flags_busy_source():
+    config = NetworkConfig(packet_rate_threshold=50)
+    packets = make_timed_packets("10.0.0.1", 120, 1000.0, 0.005)
+    packets += make_timed_packets("10.0.0.2", 120, 1000.0, 0.5)
+    packets.sort(key=lambda packet: packet["timestamp"])
+
+    results = analyze_traffic(packets, config)
+
+    assert results["packet_rate_floods"] == ["10.0.0.1"]
+    assert TrafficAggregator.from_packets(packets, config).detector("packet_rate").value(ip_to_int("10.0.0.2")) == 2
+
+
+def test_packet_rate_without_timestamps(sample_packets, sample_config):
+    results = analyze_traffic(sample_packets, sample_config)
+
+    assert results["packet_rate_floods"] == []
+
+
+def test_packet_rate_engines_and_chunks_agree(tmp_path):
+    pytest.importorskip("numpy")
+    config = NetworkConfig(packet_rate_threshold=20)
+    rng = random.Random(4)
+    lines = []
+
+    for index in range(4000):
+        lines.append(f"10.0.0.{rng.randint(1, 6)},10.1.1.1,40000,80,TCP,ACK,{1000 + index * 0.01:.2f}")
+    lines[100] = "10.0.0.1,10.1.1.1,40000,80,TCP,ACK"
+
+    path = tmp_path / "timed.log"
+    path.write_text("\n".join(lines) + "\n")
+    table = load_traffic_log(str(path))
+
+    python_results = analyze_traffic(table, config)
+    assert python_results["packet_rate_floods"]
+    assert analyze_traffic(table, config, engine="numpy") == python_results
+    assert analyze_traffic(aggregate_traffic_log(str(path), 3, config), config) == python_results
+
+    capture = tmp_path / "timed.nmcap"
+    write_binary_capture(table, str(capture))
+    assert list(load_traffic_log(str(capture))) == list(table)
+
+
+def test_packet_rate_burst_split_across_chunks_and_segments(tmp_path):
+    config = NetworkConfig(packet_rate_threshold=20)
+    burst = [f"10.0.0.1,10.1.1.1,40000,80,TCP,ACK,{1000 + index * 0.01:.2f}\n" for index in range(30)]
+    later = [f"10.0.0.1,10.1.1.1,40000,80,TCP,ACK,{1001 + index}.00\n" for index in range(20)]
+    path = tmp_path / "burst.log"
+    path.write_text("".join(burst + later))
+    middle = len("".join(burst[:15]))
+
+    serial = analyze_traffic(load_traffic_log(str(path)), config)
+    assert serial["packet_rate_floods"] == ["10.0.0.1"]
+
+    first, _, _ = aggregate_chunk(str(path), 0, middle, config)
+    second, _, _ = aggregate_chunk(str(path), middle, path.stat().st_size, config)
+    first.merge(second)
+    assert first.detector("packet_rate").value(ip_to_int("10.0.0.1")) == 30
+    assert analyze_traffic(first, config) == serial
+
+    checkpointed = aggregate_with_checkpoints(str(path), str(tmp_path / "burst.checkpoint"), config,
+                                              checkpoint_bytes=middle)
+    assert analyze_traffic(checkpointed, config) == serial
+
+
+def test_packet_rate_engines_agree_on_late_lines(monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(network_monitor, "DETECTOR_BLOCK_SIZE", 6)
+    config = NetworkConfig(packet_rate_threshold=6)
+    stamps = [1000.1] * 5 + [1008.1] + [1000.2] * 3
+    packets = [dict(packet, timestamp=stamp) for packet, stamp in zip(make_timed_packets("10.0.0.1", 9, 0, 0), stamps)]
+
+    python_results = analyze_traffic(packets, config)
+    assert analyze_traffic(packets, config, engine="numpy") == python_results
+
+
+def test_binary_capture_empty_table(tmp_path):
+    capture = tmp_path / "empty.nmcap"
+    write_binary_capture(PacketTable(), str(capture))
+
+    assert len(load_binary_capture(str(capture))) == 0
+
+
+def test_binary_capture_truncated(tmp_path):
+    capture = tmp_path / "traffic.nmcap"
+    write_binary_capture(make_random_table(count=50), str(capture))
+    capture.write_bytes(capture.read_bytes()[:-10])
+
+    with pytest.raises(ValueError):
+        load_binary_capture(str(capture))
+
+
+def test_convert_command(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_file = tmp_path / "traffic.log"
+    capture = tmp_path / "traffic.nmcap"
+    write_traffic_log(log_file, count=100, bad_lines=())
+
+    try:
+        assert network_monitor.main(["convert", str(log_file), str(capture)]) == 0
+    finally:
+        logging.getLogger("network_monitor").handlers.clear()
+
+    assert list(load_binary_capture(str(capture))) == list(load_traffic_log(str(log_file)))
+
+
+def test_parse_threshold_range():
+    assert parse_threshold_range("5:20:5") == [5, 10, 15, 20]
+    assert parse_threshold_range("3:5") == [3, 4, 5]
+
+
+@pytest.mark.parametrize("text", ["5", "0:10", "10:5", "1:10:0", "a:b", "1:2:3:4"])
+def test_parse_threshold_range_rejects_bad_ranges(text):
+    with pytest.raises(ValueError):
+        parse_threshold_range(text)
+
+
+def test_sweep_matches_single_runs():
+    table = make_random_table()
+    port_thresholds = [30, 40, 50, 60]
+    syn_thresholds = [10, 15, 20, 100]
+
+    sweep = sweep_thresholds(table, port_thresholds, syn_thresholds)
+
+    for index, threshold in enumerate(port_thresholds):
+        single = analyze_traffic(table, NetworkConfig(port_scan_threshold=threshold))
+        flagged = sweep["port_scan_sweep"]["thresholds"][index]["flagged"]
+        ranking = sweep["port_scan_sweep"]["ranking"][:flagged]
+        assert sorted(entry["src_ip"] for entry in ranking) == sorted(single["port_scans"])
+
+    for index, threshold in enumerate(syn_thresholds):
+        single = analyze_traffic(table, NetworkConfig(syn_flood_threshold=threshold))
+        flagged = sweep["syn_flood_sweep"]["thresholds"][index]["flagged"]
+        ranking = sweep["syn_flood_sweep"]["ranking"][:flagged]
+        assert sorted(entry["src_ip"] for entry in ranking) == sorted(single["syn_floods"])
+
+    assert sweep["syn_flood_sweep"]["thresholds"][-1]["flagged"] == 0
+
+
+def test_streaming_alerts_once_when_threshold_crossed(sample_config):
+    monitor = StreamingMonitor(sample_config, window_size=100, window_seconds=60)
+    alerts = []
+
+    for port in range(1, 31):
+        packet = parse_packet_line(f"192.168.1.66,10.0.0.1,50000,{port},TCP,ACK")
+        alerts.extend(monitor.process_packet(packet, timestamp=float(port)))
+
+    assert len(alerts) == 1
+    assert alerts[0]["type"] == "port_scan"
+    assert alerts[0]["src_ip"] == "192.168.1.66"
+    assert alerts[0]["value"] == 26
+    assert monitor.results()["port_scans"] == ["192.168.1.66"]
+
+
+def test_streaming_packet_rate_uses_packet_timestamps():
+    config = NetworkConfig(packet_rate_threshold=50)
+    monitor = StreamingMonitor(config, window_size=1000, window_seconds=60)
+    alerts = []
+
+    for packet in make_timed_packets("10.0.0.1", 200, 1000.0, 0.01):
+        alerts.extend(monitor.process_packet(packet))
+
+    assert [alert["type"] for alert in alerts] == ["packet_rate", "packet_rate"]
+    assert alerts[0]["value"] == 51
+    assert monitor.results()["packet_rate_floods"] == ["10.0.0.1"]
+
+
+def test_streaming_count_window_forgets_old_ports(sample_config):
+    monitor = StreamingMonitor(sample_config, window_size=10, window_seconds=60)
+
+    for port in range(1, 101):
+        packet = parse_packet_line(f"192.168.1.66,10.0.0.1,50000,{port},TCP,ACK")
+        monitor.process_packet(packet, timestamp=1.0)
+
+    assert monitor.windows["192.168.1.66"].distinct_ports() == 10
+    assert monitor.results()["port_scans"] == []
+
+
+def test_streaming_evicts_idle_sources(sample_config):
+    monitor = StreamingMonitor(sample_config, window_size=10, window_seconds=5)
+
+    monitor.process_packet(parse_packet_line("192.168.1.5,10.0.0.1,1,80,TCP,SYN"), timestamp=0.0)
+    monitor.process_packet(parse_packet_line("192.168.1.9,10.0.0.1,1,80,TCP,SYN"), timestamp=100.0)
+
+    assert list(monitor.windows) == ["192.168.1.9"]
+
+
+def test_streaming_history_is_bounded(threat_lookup_data):
+    config = NetworkConfig(syn_flood_threshold=1)
+    monitor = StreamingMonitor(config, window_seconds=5, threat_lookup=ThreatLookup(threat_lookup_data), history_size=3)
+
+    for index in range(10):
+        packet = parse_packet_line(f"10.1.2.{index},10.0.0.1,1,80,TCP,SYN")
+        for _ in range(2):
+            monitor.process_packet(packet, timestamp=index * 10.0)
+
+    results = monitor.results()
+    assert results["syn_floods"] == ["10.1.2.7", "10.1.2.8", "10.1.2.9"]
+    assert [alert["src_ip"] for alert in results["alerts"]] == ["10.1.2.7", "10.1.2.8", "10.1.2.9"]
+    assert results["alerts"][-1]["threat"] == "10.1.2.0/24"
+    assert [match["ip"] for match in results["threat_matches"]] == ["10.1.2.7", "10.1.2.8", "10.1.2.9"]
+    assert list(monitor.windows) == ["10.1.2.9"]
+
+
+def test_monitor_stream_skips_bad_lines(sample_config):
+    lines = [f"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n" for _ in range(101)]
+    lines.insert(3, "not,a,packet\n")
+    lines.insert(5, "\n")
+
+    monitor = StreamingMonitor(sample_config, window_size=1000, window_seconds=60)
+    results = monitor_stream(iter(lines), monitor)
+
+    assert results["total_packets"] == 101
+    assert results["syn_floods"] == ["192.168.1.7"]
+    assert len(results["alerts"]) == 1
+
+
+async def fetch_detections(server, path="/detections"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.http_port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, body = response.split(b"\r\n\r\n", 1)
+    return head.split(b"\r\n")[0].decode(), json.loads(body)
+
+
+def test_server_tcp_sensor_and_json_endpoint(sample_config):
+    async def scenario():
+        server = MonitorServer(StreamingMonitor(sample_config), queue_batches=2)
+        await server.start()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        for port in range(1, 31):
+            writer.write(f"192.168.1.66,10.0.0.1,50000,{port},TCP,ACK\n".encode())
+        writer.write(b"not,a,packet\n192.168.1.7,10.0.0.1,40000,")
+        await writer.drain()
+        writer.write(b"443,TCP,SYN")
+        writer.close()
+        await writer.wait_closed()
+
+        for _ in range(100):
+            if server.lines_received == 32:
+                break
+            await asyncio.sleep(0.01)
+        await server.drain()
+
+        status, detections = await fetch_detections(server)
+        missing, _ = await fetch_detections(server, "/nope")
+        await server.stop()
+        return status, detections, missing
+
+    status, detections, missing = asyncio.run(scenario())
+
+    assert status == "HTTP/1.1 200 OK"
+    assert missing == "HTTP/1.1 404 Not Found"
+    assert detections["total_packets"] == 31
+    assert detections["port_scans"] == ["192.168.1.66"]
+    assert detections["server"]["lines_received"] == 32
+    assert detections["server"]["parse_errors"] == 1
+
+
+def test_server_udp_sensor(sample_config):
+    async def scenario():
+        server = MonitorServer(StreamingMonitor(sample_config), protocol="udp")
+        await server.start()
+
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol,
+            remote_addr=("127.0.0.1", server.port)
+        )
+        for _ in range(3):
+            transport.sendto(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n" * 40)
+        transport.close()
+
+        for _ in range(100):
+            if server.lines_received == 120:
+                break
+            await asyncio.sleep(0.01)
+
+        await server.stop()
+        return server.snapshot()
+
+    detections = asyncio.run(scenario())
+
+    assert detections["total_packets"] == 120
+    assert detections["syn_floods"] == ["192.168.1.7"]
+    assert detections["server"]["dropped_lines"] == 0
+
+
+def test_server_drops_udp_batches_when_queue_is_full(sample_config):
+    server = MonitorServer(StreamingMonitor(sample_config), protocol="udp", queue_batches=1)
+    server.queue = asyncio.Queue(1)
+
+    server.offer_batch(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n")
+    server.offer_batch(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n" * 5)
+
+    assert server.queue.qsize() == 1
+    assert server.dropped_lines == 5
+
+
+def test_server_disconnects_sensor_without_newlines(sample_config):
+    async def scenario():
+        server = MonitorServer(StreamingMonitor(sample_config))
+        await server.start()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n" + b"x" * (SERVE_MAX_LINE + 1))
+        await writer.drain()
+        closed = await asyncio.wait_for(reader.read(), timeout=5)
+        writer.close()
+
+        await server.stop()
+        return closed, server.snapshot()
+
+    closed, detections = asyncio.run(scenario())
+
+    assert closed == b""
+    assert detections["total_packets"] == 1
+    assert detections["server"]["oversized_lines"] == 1
+
+
+def test_server_stop_does_not_wait_on_a_dead_consumer(sample_config):
+    async def scenario():
+        server = MonitorServer(StreamingMonitor(sample_config))
+        await server.start()
+
+        server._consumer.cancel()
+        await asyncio.sleep(0)
+        server.queue.put_nowait(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n")
+        await asyncio.wait_for(server.stop(), timeout=5)
+
+    asyncio.run(scenario())
+
+
+def test_server_consumer_survives_a_failing_batch(sample_config, monkeypatch):
+    async def scenario():
+        server = MonitorServer(StreamingMonitor(sample_config))
+        process_lines = server.process_lines
+        calls = []
+
+        def flaky(lines):
+            calls.append(lines)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            process_lines(lines)
+
+        monkeypatch.setattr(server, "process_lines", flaky)
+        await server.start()
+
+        server.queue.put_nowait(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n")
+        server.queue.put_nowait(b"192.168.1.7,10.0.0.1,40000,443,TCP,SYN\n")
+        await asyncio.wait_for(server.stop(), timeout=5)
+        return server.snapshot()
+
+    assert asyncio.run(scenario())["total_packets"] == 1
+
+
+def test_generator_is_seeded():
+    first = list(generate_traffic(500, seed=9, timestamps=True))
+
+    assert first == list(generate_traffic(500, seed=9, timestamps=True))
+    assert first != list(generate_traffic(500, seed=10, timestamps=True))
+    assert len(first) == 500
+
+
+def test_generated_attackers_are_detected(tmp_path):
+    path = tmp_path / "generated.log"
+    path.write_text("".join(generate_traffic(20000, scan_ratio=0.05, flood_ratio=0.05, malformed_rate=0.01, attackers=2)))
+
+    table = load_traffic_log(str(path))
+    results = analyze_traffic(table, NetworkConfig())
+
+    assert 19600 < len(table) < 20000
+    assert results["port_scans"] == scanner_ips(2)
+    assert set(results["syn_floods"]) == set(flooder_ips(2)) | set(scanner_ips(2))
+
+
 def test_validate_args_negative_threshold(tmp_path):
     sample_file = tmp_path / "traffic.log"
     sample_file.write_text("192.168.1.5,10.0.0.1,54321,443,TCP,SYN")
@@ -286,4 +1453,116 @@ def test_validate_args_negative_threshold(tmp_path):
         verbose = False
 
     with pytest.raises(ValueError):
-        validate_args(Args())
\ No newline at end of file
+        validate_args(Args())
+
+
+@pytest.fixture
+def threat_lookup_data():
+    """A lookup as threat_aggregator.py writes it: 10.0.0.0/8, 10.1.2.0/24 and 192.168.1.9."""
+    indicator = {"type": "ip", "threat_level": "high", "confidence": 90, "sources": ["Vendor_A"]}
+    return {
+        "format": "threat_lookup",
+        "version": 1,
+        "indicators": [
+            dict(indicator, value="10.0.0.0/8"),
+            dict(indicator, value="10.1.2.0/24", threat_level="critical"),
+            dict(indicator, value="192.168.1.9")
+        ],
+        "ipv4": {
+            "8": {str(10): 0},
+            "24": {str(ip_to_int("10.1.2.0") >> 8): 1},
+            "32": {str(ip_to_int("192.168.1.9")): 2}
+        },
+        "ipv6": {},
+        "domains": {}
+    }
+
+
+def test_threat_lookup_longest_prefix_wins(threat_lookup_data):
+    lookup = ThreatLookup(threat_lookup_data)
+
+    assert lookup.match_ip("10.1.2.3")["value"] == "10.1.2.0/24"
+    assert lookup.match_ip("10.200.0.1")["value"] == "10.0.0.0/8"
+    assert lookup.match_ip("192.168.1.9")["value"] == "192.168.1.9"
+    assert lookup.match_ip("192.168.1.10") is None
+    assert lookup.match_ip("not an ip") is None
+    assert len(lookup) == 3
+
+
+def test_analyze_and_stream_tag_threat_sources(threat_lookup_data, sample_packets, sample_config):
+    lookup = ThreatLookup(threat_lookup_data)
+    packets = sample_packets + [parse_packet_line("192.168.1.9,10.0.0.1,1,80,TCP,SYN")]
+
+    for engine in ("python", "numpy"):
+        results = analyze_traffic(packets, sample_config, engine=engine, quiet=True, threat_lookup=lookup)
+        assert [match["ip"] for match in results["threat_matches"]] == ["192.168.1.9"]
+        assert results["threat_matches"][0]["sources"] == ["Vendor_A"]
+
+    assert "threat_matches" not in analyze_traffic(packets, sample_config, quiet=True)
+
+    monitor = StreamingMonitor(NetworkConfig(syn_flood_threshold=1), threat_lookup=lookup)
+    alerts = []
+    for timestamp in range(3):
+        alerts.extend(monitor.process_packet(packets[-1], timestamp=float(timestamp)))
+
+    assert alerts[0]["threat"] == "192.168.1.9"
+    assert monitor.results()["threat_matches"][0]["indicator"] == "192.168.1.9"
+
+
+def test_analyze_tags_ipv6_threat_sources(threat_lookup_data, sample_packets, sample_config):
+    indicators = threat_lookup_data["indicators"] + [
+        {"type": "ip", "value": "2001:db8::/32", "threat_level": "high", "confidence": 90, "sources": ["Vendor_B"]}
+    ]
+    lookup = ThreatLookup(dict(threat_lookup_data, indicators=indicators, ipv6={"32": {str(0x20010DB8): 3}}))
+    packets = sample_packets + [parse_packet_line("2001:db8::1,10.0.0.1,1,80,TCP,SYN")]
+
+    results = analyze_traffic(packets, sample_config, quiet=True, threat_lookup=lookup)
+
+    assert [(match["ip"], match["indicator"]) for match in results["threat_matches"]] == [
+        ("2001:db8::1", "2001:db8::/32")
+    ]
+
+
+def test_threat_lookup_matches_domains_and_subdomains(threat_lookup_data, sample_config):
+    indicators = threat_lookup_data["indicators"] + [
+        {"type": "domain", "value": "evil.example", "threat_level": "high", "confidence": 90, "sources": ["Vendor_C"]},
+        {"type": "domain", "value": "*.cdn.evil.example", "threat_level": "critical", "confidence": 95, "sources": ["Vendor_D"]}
+    ]
+    domains = {"example": {"evil": {"": 3, "cdn": {"": 4}}}}
+    lookup = ThreatLookup(dict(threat_lookup_data, indicators=indicators, domains=domains))
+
+    assert lookup.match_domain("evil.example")["value"] == "evil.example"
+    assert lookup.match_domain("Mail.Evil.Example.")["value"] == "evil.example"
+    assert lookup.match_domain("a.cdn.evil.example")["value"] == "*.cdn.evil.example"
+    assert lookup.match_domain("example") is None
+    assert lookup.match_domain("notevil.example") is None
+    assert lookup.match_domain("bad..example") is None
+    assert lookup.match_address("10.1.2.3")["value"] == "10.1.2.0/24"
+
+    packets = [parse_packet_line(f"{source},10.0.0.1,1,80,TCP,SYN") for source in ("www.evil.example", "good.example")]
+    results = analyze_traffic(packets, sample_config, quiet=True, threat_lookup=lookup)
+    assert [(match["ip"], match["indicator"]) for match in results["threat_matches"]] == [
+        ("www.evil.example", "evil.example")
+    ]
+
+    monitor = StreamingMonitor(sample_config, threat_lookup=lookup)
+    for packet in packets:
+        monitor.process_packet(packet, timestamp=0.0)
+    assert [match["ip"] for match in monitor.results()["threat_matches"]] == ["www.evil.example"]
+
+    # Lookup files written before the domain index still load.
+    del threat_lookup_data["domains"]
+    assert ThreatLookup(threat_lookup_data).match_domain("evil.example") is None
+
+
+def test_threat_lookup_rejects_other_files(tmp_path, threat_lookup_data):
+    with pytest.raises(ValueError):
+        ThreatLookup({"format": "something_else"})
+
+    with pytest.raises(ValueError):
+        ThreatLookup(dict(threat_lookup_data, version=99))
+
+    bad_file = tmp_path / "lookup.json"
+    bad_file.write_text("{not json")
+    with pytest.raises(ValueError):
+        ThreatLookup.load(str(bad_file))
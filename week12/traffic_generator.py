@@ -0,0 +1,167 @@
+"""Seeded synthetic traffic log generator for network_monitor.
+
+Writes packet lines in the format network_monitor reads. Background
+sources talk to a few common service ports; a handful of scanner
+sources probe sequential ports and flooder sources send TCP SYNs to a
+single port. The same seed always gives the same file.
+
+Usage: python traffic_generator.py OUTPUT --packets 1000000 [options]
+"""
+
+import argparse
+import random
+import sys
+from pathlib import Path
+
+from network_monitor import int_to_ip
+
+SERVICE_PORTS = (80, 443, 53, 22, 25, 123, 3306, 8080)
+NORMAL_FLAGS = ("ACK", "ACK", "ACK", "PSH", "FIN", "SYN")
+SCANNER_BASE = 0xAC100000    # 172.16.0.0
+FLOODER_BASE = 0xAC110000    # 172.17.0.0
+SOURCE_BASE = 0x0A000000     # 10.0.0.0
+
+MALFORMED_LINES = (
+    "{src},192.168.1.1,notaport,80,TCP,SYN",
+    "{src},192.168.1.1,40000",
+    "999.1.1.1,192.168.1.1,40000,80,TCP,SYN",
+    "{src},192.168.1.1,40000,70000,TCP,ACK",
+    "garbage"
+)
+
+
+def scanner_ips(count: int) -> list:
+    """Return the source IPs the generator uses for port scanners."""
+    return [int_to_ip(SCANNER_BASE + index + 1) for index in range(count)]
+
+
+def flooder_ips(count: int) -> list:
+    """Return the source IPs the generator uses for SYN flooders."""
+    return [int_to_ip(FLOODER_BASE + index + 1) for index in range(count)]
+
+
+def generate_traffic(packet_count: int, source_count=None, scan_ratio=0.01, flood_ratio=0.01,
+                     malformed_rate=0.001, attackers=5, seed=42, timestamps=False,
+                     start_time=1700000000.0, packets_per_second=10000.0):
+    """Yield synthetic traffic lines, newline included.
+
+    ``scan_ratio`` and ``flood_ratio`` are the share of packets sent by
+    the scanners and flooders; ``attackers`` is how many sources of each
+    kind there are. ``source_count`` background sources share the rest,
+    and defaults to one source per 50 packets so their counts stay low.
+    ``malformed_rate`` is the share of lines that do not parse.
+    """
+    if packet_count < 0:
+        raise ValueError("Packet count cannot be negative")
+
+    for name, ratio in (("Scan", scan_ratio), ("Flood", flood_ratio), ("Malformed", malformed_rate)):
+        if not 0 <= ratio <= 1:
+            raise ValueError(f"{name} ratio must be between 0 and 1")
+
+    if scan_ratio + flood_ratio > 1:
+        raise ValueError("Scan and flood ratios cannot add up to more than 1")
+
+    if source_count is None:
+        source_count = max(10, packet_count // 50)
+
+    rng = random.Random(seed)
+    sources = [int_to_ip(SOURCE_BASE + index + 1) for index in range(source_count)]
+    destinations = [f"192.168.{index // 250}.{index % 250 + 1}" for index in range(1000)]
+    scanners = scanner_ips(attackers)
+    flooders = flooder_ips(attackers)
+    next_scan_port = [1] * attackers
+
+    scan_limit = scan_ratio
+    flood_limit = scan_ratio + flood_ratio
+    seconds_per_packet = 1.0 / packets_per_second
+    now = start_time
+
+    for _ in range(packet_count):
+        kind = rng.random()
+        src_port = rng.randint(1024, 65535)
+
+        if kind < scan_limit:
+            attacker = rng.randrange(attackers)
+            src_ip = scanners[attacker]
+            dst_port = next_scan_port[attacker]
+            next_scan_port[attacker] = dst_port % 65535 + 1
+            line = f"{src_ip},{destinations[attacker]},{src_port},{dst_port},TCP,SYN"
+        elif kind < flood_limit:
+            src_ip = flooders[rng.randrange(attackers)]
+            line = f"{src_ip},{destinations[0]},{src_port},80,TCP,SYN"
+        else:
+            src_ip = rng.choice(sources)
+            protocol = "UDP" if rng.random() < 0.1 else "TCP"
+            flags = "NONE" if protocol == "UDP" else rng.choice(NORMAL_FLAGS)
+            line = (
+                f"{src_ip},{rng.choice(destinations)},{src_port},"
+                f"{rng.choice(SERVICE_PORTS)},{protocol},{flags}"
+            )
+
+        if malformed_rate and rng.random() < malformed_rate:
+            line = rng.choice(MALFORMED_LINES).format(src=src_ip)
+        elif timestamps:
+            line += f",{now:.6f}"
+
+        now += seconds_per_packet
+        yield line + "\n"
+
+
+def write_traffic_log(path, packet_count: int, **options) -> int:
+    """Write a generated traffic log and return the number of lines."""
+    lines = 0
+
+    with open(path, "w") as file:
+        for line in generate_traffic(packet_count, **options):
+            file.write(line)
+            lines += 1
+
+    return lines
+
+
+def create_parser():
+    """Create the command line parser."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic traffic log for network_monitor")
+
+    parser.add_argument("output", type=Path, help="Traffic log file to write")
+    parser.add_argument("-n", "--packets", type=int, default=100000, help="Number of lines to write")
+    parser.add_argument("--sources", type=int, help="Background source IPs (default: one per 50 packets)")
+    parser.add_argument("--scan-ratio", type=float, default=0.01, help="Share of packets from port scanners")
+    parser.add_argument("--flood-ratio", type=float, default=0.01, help="Share of packets from SYN flooders")
+    parser.add_argument("--malformed-rate", type=float, default=0.001, help="Share of lines that do not parse")
+    parser.add_argument("--attackers", type=int, default=5, help="Scanner and flooder sources of each kind")
+    parser.add_argument("--timestamps", action="store_true", help="Add the optional timestamp column")
+    parser.add_argument("--seed", type=int, default=42)
+
+    return parser
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+
+    if args.attackers < 1 or (args.sources is not None and args.sources < 1):
+        print("ERROR: Source and attacker counts must be positive", file=sys.stderr)
+        return 1
+
+    try:
+        lines = write_traffic_log(
+            args.output,
+            args.packets,
+            source_count=args.sources,
+            scan_ratio=args.scan_ratio,
+            flood_ratio=args.flood_ratio,
+            malformed_rate=args.malformed_rate,
+            attackers=args.attackers,
+            seed=args.seed,
+            timestamps=args.timestamps
+        )
+    except ValueError as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 1
+
+    print(f"Wrote {lines} lines to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # log_analyzer.py
 
+import ipaddress
 import json
+import sys
 from collections import Counter
 from pathlib import Path
 
@@ -32,7 +34,47 @@ def parse_log_file(filename):
     return log_entries
 
 
-def analyze_logs(log_entries):
+def load_threat_lookup(filename):
+
+    # threat_lookup.json from the week 8 threat aggregator:
+    # one table per prefix length, keyed by the network bits
+    with open(filename, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or data.get("format") != "threat_lookup" or data.get("version") != 1:
+        raise ValueError(f"{filename} is not a threat lookup file")
+
+    indicators = data["indicators"]
+    lookup = {}
+
+    for version, bits in ((4, 32), (6, 128)):
+        tables = data["ipv" + str(version)]
+        # longest prefix first, so the first match is the most specific
+        lookup[version] = [
+            (bits - int(length), {int(key): indicators[index] for key, index in tables[length].items()})
+            for length in sorted(tables, key=int, reverse=True)
+        ]
+
+    return lookup
+
+
+def match_threat_ip(lookup, ip):
+
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+
+    value = int(address)
+    for shift, table in lookup[address.version]:
+        indicator = table.get(value >> shift)
+        if indicator is not None:
+            return indicator
+
+    return None
+
+
+def analyze_logs(log_entries, threat_lookup=None):
 
     allow_count = 0
     deny_count = 0
@@ -64,7 +106,7 @@ def analyze_logs(log_entries):
     first_timestamp = timestamps[0] if timestamps else "N/A"
     last_timestamp = timestamps[-1] if timestamps else "N/A"
 
-    return {
+    analysis = {
         "total_entries": len(log_entries),
         "allow_count": allow_count,
         "deny_count": deny_count,
@@ -77,6 +119,24 @@ def analyze_logs(log_entries):
         }
     }
 
+    if threat_lookup is not None:
+        threat_matches = []
+
+        # each source IP is looked up once, however many entries it has
+        for ip in sorted({entry["source_ip"] for entry in log_entries}):
+            indicator = match_threat_ip(threat_lookup, ip)
+            if indicator is not None:
+                threat_matches.append({
+                    "source_ip": ip,
+                    "indicator": indicator["value"],
+                    "threat_level": indicator["threat_level"],
+                    "sources": indicator["sources"]
+                })
+
+        analysis["threat_matches"] = threat_matches
+
+    return analysis
+
 
 def save_json_report(analysis, filename):
 
@@ -130,6 +190,12 @@ def display_summary(analysis):
         print(f"   Attacked {count} times")
         print()
 
+    if "threat_matches" in analysis:
+        print(f"☠️  Known threat source IPs: {len(analysis['threat_matches'])}")
+        for match in analysis["threat_matches"]:
+            print(f"     - {match['source_ip']} ({match['threat_level']}, {match['indicator']})")
+        print()
+
     print("⏰ Time range:")
     print(f"   First entry: {analysis['time_range']['first']}")
     print(f"   Last entry:  {analysis['time_range']['last']}")
@@ -150,6 +216,16 @@ if __name__ == "__main__":
     log_path = script_dir / "firewall.log"
     output_path = script_dir / "log_analysis.json"
 
+    # Optional: python log_analyzer.py path/to/threat_lookup.json
+    threat_lookup = None
+    if len(sys.argv) > 1:
+        print(f"📖 Loading threat lookup {sys.argv[1]}...")
+        try:
+            threat_lookup = load_threat_lookup(sys.argv[1])
+        except (OSError, ValueError, KeyError) as error:
+            print(f"❌ Could not load threat lookup: {error}")
+            raise SystemExit(1)
+
     print("📖 Reading firewall.log...")
 
     if not log_path.exists():
@@ -181,7 +257,7 @@ if __name__ == "__main__":
     print()
 
     print("🔍 Analyzing firewall traffic patterns...")
-    analysis = analyze_logs(log_entries)
+    analysis = analyze_logs(log_entries, threat_lookup)
     print("✓ Analysis complete")
     print()
 
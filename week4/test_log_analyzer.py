@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from log_analyzer import analyze_logs, load_threat_lookup, match_threat_ip, parse_log_file
+
+# The same layout threat_aggregator.py (week 8) writes: one table per
+# prefix length, keyed by the network bits of each indicator.
+LOOKUP = {
+    "format": "threat_lookup",
+    "version": 1,
+    "indicators": [
+        {"value": "203.0.113.0/24", "type": "ip", "threat_level": "high", "confidence": 80, "sources": ["A"]},
+        {"value": "203.0.113.77", "type": "ip", "threat_level": "critical", "confidence": 95, "sources": ["B"]},
+        {"value": "2001:db8::/32", "type": "ip", "threat_level": "medium", "confidence": 60, "sources": ["C"]}
+    ],
+    "ipv4": {
+        "24": {str(0xCB007100 >> 8): 0},
+        "32": {str(0xCB00714D): 1}
+    },
+    "ipv6": {
+        "32": {str(0x20010DB8): 2}
+    }
+}
+
+LOG = """\
+2024-01-15 08:00:01 ALLOW 10.0.0.5 192.168.1.10 443
+2024-01-15 08:00:02 DENY 203.0.113.77 192.168.1.10 22
+2024-01-15 08:00:03 DENY 203.0.113.9 192.168.1.10 22
+
+2024-01-15 08:00:04 DENY 203.0.113.77 192.168.1.10 3389
+"""
+
+
+@pytest.fixture
+def lookup_path(tmp_path):
+    path = tmp_path / "threat_lookup.json"
+    path.write_text(json.dumps(LOOKUP))
+    return path
+
+
+def test_match_threat_ip_picks_longest_prefix(lookup_path):
+    lookup = load_threat_lookup(lookup_path)
+
+    assert match_threat_ip(lookup, "203.0.113.77")["value"] == "203.0.113.77"
+    assert match_threat_ip(lookup, "203.0.113.9")["value"] == "203.0.113.0/24"
+    assert match_threat_ip(lookup, "2001:db8::1")["value"] == "2001:db8::/32"
+    assert match_threat_ip(lookup, "203.0.114.1") is None
+    assert match_threat_ip(lookup, "not-an-ip") is None
+
+
+def test_load_threat_lookup_rejects_other_files(tmp_path):
+    path = tmp_path / "other.json"
+
+    for data in ([], {"format": "threat_lookup", "version": 2}, {"format": "other", "version": 1}):
+        path.write_text(json.dumps(data))
+        with pytest.raises(ValueError):
+            load_threat_lookup(path)
+
+
+def test_analyze_logs_tags_known_threat_sources(tmp_path, lookup_path):
+    log_path = tmp_path / "firewall.log"
+    log_path.write_text(LOG)
+    entries = parse_log_file(log_path)
+
+    analysis = analyze_logs(entries, load_threat_lookup(lookup_path))
+
+    assert analysis["deny_count"] == 3
+    assert analysis["threat_matches"] == [
+        {"source_ip": "203.0.113.77", "indicator": "203.0.113.77", "threat_level": "critical", "sources": ["B"]},
+        {"source_ip": "203.0.113.9", "indicator": "203.0.113.0/24", "threat_level": "high", "sources": ["A"]}
+    ]
+
+    # without a lookup the report is unchanged
+    assert "threat_matches" not in analyze_logs(entries)
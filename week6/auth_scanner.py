@@ -3,13 +3,35 @@
 # Parses authentication logs in key=value format (timestamp is first 2 tokens).
 # Detects brute force patterns by counting FAIL events per user and per IP.
 # Generates incident_report.json and incident_report.txt for SOC analysts.
+# Optionally tags source IPs found in the Week 8 threat_lookup.json blocklist.
 
+import gzip
+import io
+import ipaddress
 import json
+import lzma
 import sys
 from datetime import datetime
 from pathlib import Path
 from collections import Counter
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Archived logs may be compressed; they are recognised by their first bytes,
+# not by their file name.
+COMPRESSION_MAGIC = [
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+]
+
+# Decompressed data is read in 1 MB blocks instead of line by line.
+READ_BUFFER_SIZE = 1024 * 1024
+
 
 def parse_auth_line(line):
     # Returns (record_dict, error_string_or_None)
@@ -47,7 +69,80 @@ def parse_auth_line(line):
     return record, None
 
 
-def scan_log_file(log_path):
+def detect_compression(log_path):
+    # Returns "gzip", "xz", "zstd" or None for a plain text file
+    with open(log_path, "rb") as f:
+        head = f.read(6)
+
+    for magic, name in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return name
+
+    return None
+
+
+def open_log(log_path):
+    # Opens a plain or compressed log as text, decompressing while reading
+    # so no uncompressed copy is ever written to disk.
+    compression = detect_compression(log_path)
+
+    if compression is None:
+        return open(log_path, "r", encoding="utf-8")
+
+    if compression == "gzip":
+        raw = gzip.GzipFile(log_path, "rb")
+    elif compression == "xz":
+        raw = lzma.LZMAFile(log_path, "rb")
+    else:
+        if zstandard is None:
+            raise ValueError("Reading .zst logs needs the zstandard package (pip install zstandard)")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(log_path, "rb"), closefd=True, read_across_frames=True)
+
+    buffered = io.BufferedReader(raw, buffer_size=READ_BUFFER_SIZE)
+    return io.TextIOWrapper(buffered, encoding="utf-8")
+
+
+def load_threat_lookup(lookup_path):
+    # Reads threat_lookup.json from the Week 8 threat aggregator.
+    # Returns {4: [...], 6: [...]}, each a list of (shift, {network bits: indicator})
+    # with the longest prefix first, so the first hit is the most specific network.
+    with open(lookup_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or data.get("format") != "threat_lookup" or data.get("version") != 1:
+        raise ValueError(f"{lookup_path} is not a threat lookup file")
+
+    indicators = data["indicators"]
+    lookup = {}
+
+    for version, bits in ((4, 32), (6, 128)):
+        tables = data["ipv" + str(version)]
+        lookup[version] = [
+            (bits - int(length), {int(key): indicators[index] for key, index in tables[length].items()})
+            for length in sorted(tables, key=int, reverse=True)
+        ]
+
+    return lookup
+
+
+def match_threat_ip(lookup, ip_addr):
+    # Returns the blocklist indicator covering ip_addr, or None.
+    # One dict lookup per prefix length instead of checking every indicator.
+    try:
+        address = ipaddress.ip_address(ip_addr)
+    except ValueError:
+        return None
+
+    value = int(address)
+    for shift, table in lookup[address.version]:
+        indicator = table.get(value >> shift)
+        if indicator is not None:
+            return indicator
+
+    return None
+
+
+def scan_log_file(log_path, threat_lookup=None):
     failures_per_user = Counter()
     failures_per_ip = Counter()
 
@@ -56,7 +151,10 @@ def scan_log_file(log_path):
     total_fail = 0
     parse_errors = 0
 
-    with open(log_path, "r", encoding="utf-8") as f:
+    # ip -> indicator (or None), so each IP is looked up only once
+    threat_checked = {}
+
+    with open_log(log_path) as f:
         for line in f:
             record, error = parse_auth_line(line)
 
@@ -72,6 +170,9 @@ def scan_log_file(log_path):
             user = record.get("user", "UNKNOWN")
             ip_addr = record.get("ip", "UNKNOWN")
 
+            if threat_lookup is not None and ip_addr not in threat_checked:
+                threat_checked[ip_addr] = match_threat_ip(threat_lookup, ip_addr)
+
             if status == "SUCCESS":
                 total_success += 1
             elif status == "FAIL":
@@ -84,6 +185,11 @@ def scan_log_file(log_path):
 
     failure_rate = (total_fail / total_events * 100) if total_events > 0 else 0
 
+    # None means no lookup was given, so the reports leave the section out
+    threat_matches = None
+    if threat_lookup is not None:
+        threat_matches = {ip: ind for ip, ind in threat_checked.items() if ind is not None}
+
     return {
         "total_events": total_events,
         "total_success": total_success,
@@ -92,6 +198,7 @@ def scan_log_file(log_path):
         "parse_errors": parse_errors,
         "failures_per_user": failures_per_user,
         "failures_per_ip": failures_per_ip,
+        "threat_matches": threat_matches,
     }
 
 
@@ -108,7 +215,7 @@ def build_json_report(results, analyst):
         for ip, count in results["failures_per_ip"].most_common(5)
     ]
 
-    return {
+    report = {
         "metadata": {
             "generated_at": now_iso,
             "analyst": analyst,
@@ -125,6 +232,20 @@ def build_json_report(results, analyst):
         "top_attacking_ips": top_ips
     }
 
+    if results["threat_matches"] is not None:
+        report["known_threat_ips"] = [
+            {
+                "ip_address": ip,
+                "indicator": ind["value"],
+                "threat_level": ind["threat_level"],
+                "sources": ind["sources"],
+                "failed_attempts": results["failures_per_ip"][ip]
+            }
+            for ip, ind in results["threat_matches"].items()
+        ]
+
+    return report
+
 
 def build_text_report(results, analyst):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -182,6 +303,19 @@ def build_text_report(results, analyst):
         lines.append("No attacking IPs detected.")
     lines.append("")
 
+    if results["threat_matches"] is not None:
+        lines.append("-" * 70)
+        lines.append("KNOWN THREAT SOURCES (threat_lookup.json)")
+        lines.append("-" * 70)
+
+        if results["threat_matches"]:
+            for ip, ind in results["threat_matches"].items():
+                lines.append(f"{ip:<18} {ind['threat_level']:<9} {ind['value']} "
+                             f"({results['failures_per_ip'][ip]} failed attempts)")
+        else:
+            lines.append("No source IPs found on the blocklist.")
+        lines.append("")
+
     lines.append("=" * 70)
     lines.append(f"Report generated by: {analyst}")
     lines.append("=" * 70)
@@ -202,7 +336,7 @@ def write_reports(out_dir, json_report, text_report):
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python auth_scanner.py <logfile>")
+        print("Usage: python auth_scanner.py <logfile> [threat_lookup.json]")
         return 1
 
     log_file = Path(sys.argv[1]).expanduser()
@@ -213,7 +347,20 @@ def main():
 
     analyst = "Bryan Gonzalez"
 
-    results = scan_log_file(log_file)
+    threat_lookup = None
+    if len(sys.argv) > 2:
+        try:
+            threat_lookup = load_threat_lookup(Path(sys.argv[2]).expanduser())
+        except (ValueError, KeyError, OSError) as error:
+            print(f"ERROR: Could not load threat lookup {sys.argv[2]}: {error}")
+            return 1
+
+    try:
+        results = scan_log_file(log_file, threat_lookup)
+    except (ValueError, OSError, EOFError) as error:
+        print(f"ERROR: Could not read {log_file}: {error}")
+        return 1
+
     json_report = build_json_report(results, analyst)
     text_report = build_text_report(results, analyst)
 
@@ -236,6 +383,10 @@ def main():
     print("Top Attacking IPs:")
     for ip, count in results["failures_per_ip"].most_common(5):
         print(f"  {ip}: {count}")
+    if results["threat_matches"] is not None:
+        print(f"Known Threat IPs: {len(results['threat_matches'])}")
+        for ip, ind in results["threat_matches"].items():
+            print(f"  {ip}: {ind['threat_level']} ({ind['value']})")
     print("-" * 70)
     print("✓ incident_report.json created")
     print("✓ incident_report.txt created")
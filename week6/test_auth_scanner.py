@@ -0,0 +1,128 @@
+import gzip
+import json
+import lzma
+
+import pytest
+
+from auth_scanner import (
+    build_json_report,
+    build_text_report,
+    detect_compression,
+    load_threat_lookup,
+    match_threat_ip,
+    open_log,
+    scan_log_file
+)
+
+# The same layout threat_aggregator.py (week 8) writes: one table per
+# prefix length, keyed by the network bits of each indicator.
+LOOKUP = {
+    "format": "threat_lookup",
+    "version": 1,
+    "indicators": [
+        {"value": "198.51.100.0/24", "type": "ip", "threat_level": "high", "confidence": 80, "sources": ["A"]},
+        {"value": "198.51.100.45", "type": "ip", "threat_level": "critical", "confidence": 95, "sources": ["B"]},
+        {"value": "2001:db8::/32", "type": "ip", "threat_level": "medium", "confidence": 60, "sources": ["C"]}
+    ],
+    "ipv4": {
+        "24": {str(0xC6336400 >> 8): 0},
+        "32": {str(0xC633642D): 1}
+    },
+    "ipv6": {
+        "32": {str(0x20010DB8): 2}
+    }
+}
+
+LOG = """\
+2024-11-25 03:45:12 event=LOGIN status=FAIL user=admin ip=198.51.100.45 method=SSH
+2024-11-25 03:45:15 event=LOGIN status=FAIL user=admin ip=198.51.100.45 method=SSH
+2024-11-25 03:45:18 event=LOGIN status=FAIL user=root ip=198.51.100.9 method=SSH
+2024-11-25 03:45:20 event=LOGIN status=SUCCESS user=alice ip=10.0.0.5 method=SSH
+2024-11-25 03:45:21 event=LOGIN status=FAIL user=bob ip=2001:db8::7 method=SSH
+2024-11-25
+"""
+
+
+@pytest.fixture
+def lookup_path(tmp_path):
+    path = tmp_path / "threat_lookup.json"
+    path.write_text(json.dumps(LOOKUP))
+    return path
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "auth.log"
+    path.write_text(LOG)
+    return path
+
+
+def test_match_threat_ip_picks_longest_prefix(lookup_path):
+    lookup = load_threat_lookup(lookup_path)
+
+    assert match_threat_ip(lookup, "198.51.100.45")["value"] == "198.51.100.45"
+    assert match_threat_ip(lookup, "198.51.100.9")["value"] == "198.51.100.0/24"
+    assert match_threat_ip(lookup, "2001:db8::7")["value"] == "2001:db8::/32"
+    assert match_threat_ip(lookup, "10.0.0.5") is None
+    assert match_threat_ip(lookup, "UNKNOWN") is None
+
+
+def test_load_threat_lookup_rejects_other_files(tmp_path):
+    path = tmp_path / "other.json"
+
+    for data in ([], {"format": "threat_lookup", "version": 2}, {"format": "other", "version": 1}):
+        path.write_text(json.dumps(data))
+        with pytest.raises(ValueError):
+            load_threat_lookup(path)
+
+
+def test_scan_tags_known_threat_sources(log_path, lookup_path):
+    results = scan_log_file(log_path, load_threat_lookup(lookup_path))
+
+    assert results["total_events"] == 5
+    assert results["parse_errors"] == 1
+    assert {ip: ind["value"] for ip, ind in results["threat_matches"].items()} == {
+        "198.51.100.45": "198.51.100.45",
+        "198.51.100.9": "198.51.100.0/24",
+        "2001:db8::7": "2001:db8::/32"
+    }
+
+    report = build_json_report(results, "tester")
+    assert {match["ip_address"]: match["failed_attempts"] for match in report["known_threat_ips"]} == {
+        "198.51.100.45": 2,
+        "198.51.100.9": 1,
+        "2001:db8::7": 1
+    }
+    assert "KNOWN THREAT SOURCES" in build_text_report(results, "tester")
+
+
+def test_scan_without_lookup_leaves_reports_unchanged(log_path):
+    results = scan_log_file(log_path)
+
+    assert results["threat_matches"] is None
+    assert "known_threat_ips" not in build_json_report(results, "tester")
+    assert "KNOWN THREAT SOURCES" not in build_text_report(results, "tester")
+
+
+def zstd_frames(data):
+    # two frames back to back, as appending to a .zst archive produces
+    compressor = pytest.importorskip("zstandard").ZstdCompressor()
+    middle = data.index(b"\n", len(data) // 2) + 1
+    return compressor.compress(data[:middle]) + compressor.compress(data[middle:])
+
+
+@pytest.mark.parametrize("compression, compress", [
+    ("gzip", gzip.compress),
+    ("xz", lzma.compress),
+    ("zstd", zstd_frames)
+])
+def test_compressed_logs_match_plain(tmp_path, log_path, compression, compress):
+    packed = tmp_path / "auth.log.archive"
+    packed.write_bytes(compress(log_path.read_bytes()))
+
+    assert detect_compression(log_path) is None
+    assert detect_compression(packed) == compression
+
+    with open_log(packed) as f:
+        assert f.read() == LOG
+    assert scan_log_file(packed) == scan_log_file(log_path)
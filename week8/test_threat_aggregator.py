@@ -0,0 +1,270 @@
+import io
+import json
+import os
+import random
+
+import pytest
+
+from threat_aggregator import (
+    FEED_SCHEMAS,
+    FIELD_ALIASES,
+    VALID_LEVELS,
+    VALID_TYPES,
+    FeedCache,
+    IndicatorIndex,
+    IndicatorStore,
+    JSONStreamReader,
+    _iter_feed_object,
+    aggregate_feeds,
+    build_text_summary,
+    build_threat_lookup,
+    compile_schema,
+    count_sources,
+    filter_indicators,
+    generate_statistics,
+    load_exports,
+    normalize_indicator,
+    update_store
+)
+
+VENDOR_A_KEYS = ("id", "type", "value", "confidence", "threat", "first_seen")
+
+
+def make_record(index, kind="ip", confidence=90, threat="high"):
+    value = f"203.0.113.{index}" if kind == "ip" else f"host{index}.example"
+    return dict(zip(VENDOR_A_KEYS, (f"VA-{index}", kind, value, confidence, threat, "2024-11-15")))
+
+
+def write_feed(path, records):
+    path.write_text(json.dumps({"vendor": "Test", "indicators": records}, indent=2))
+    # make sure a rewrite within the same mtime tick is still seen as changed
+    os.utime(path, ns=(random.randrange(10 ** 18), random.randrange(10 ** 18)))
+
+
+@pytest.fixture
+def feeds(tmp_path):
+    """Three overlapping vendor_a-style feeds."""
+    paths = [tmp_path / name for name in ("a.json", "b.json", "c.json")]
+    write_feed(paths[0], [make_record(i) for i in range(0, 6)] + [make_record(1, "domain")])
+    write_feed(paths[1], [make_record(i, confidence=95) for i in range(4, 10)] + [{"id": "bad"}])
+    write_feed(paths[2], [make_record(i, confidence=95, threat="critical") for i in range(8, 12)])
+    return [(str(path), f"Vendor{name}") for path, name in zip(paths, "ABC")]
+
+
+def snapshot(indicators):
+    """Order-independent view of merged indicators."""
+    return sorted(
+        (ind["type"], ind["value"], ind["confidence"], ind["threat_level"], ind["first_seen"], sorted(ind["sources"]))
+        for ind in indicators
+    )
+
+
+def in_memory(feeds):
+    return snapshot(aggregate_feeds(feeds)["unique"].values())
+
+
+def test_stream_reader_matches_json_load_at_small_chunk_sizes():
+    records = [make_record(i) for i in range(5)] + [{"id": "x\"y\\u00e9", "confidence": -12.5e-3, "n": None}]
+    text = json.dumps({
+        "vendor": "Test",
+        "meta": {"numbers": [1, 2.5e3, -0.125, 10 ** 20], "nested": [[], {}, [True, False]]},
+        "indicators": records,
+        "items": [{"ignored": True}]
+    })
+
+    for chunk_size in range(1, 9):
+        reader = JSONStreamReader(io.StringIO(text), chunk_size=chunk_size)
+        assert list(_iter_feed_object(reader)) == json.loads(text)["indicators"]
+
+        with pytest.raises(ValueError):
+            list(_iter_feed_object(JSONStreamReader(io.StringIO(text[:-40]), chunk_size=chunk_size)))
+
+
+def test_stream_reader_does_not_cut_numbers_at_chunk_edges():
+    text = '{"indicators": [-1.25, 1e10, 123456789]}'
+
+    for chunk_size in range(1, len(text)):
+        reader = JSONStreamReader(io.StringIO(text), chunk_size=chunk_size)
+        assert list(_iter_feed_object(reader)) == [-1.25, 1e10, 123456789]
+
+
+def test_compiled_schema_matches_normalize_indicator():
+    rng = random.Random(3)
+    aliases = sorted({key for keys in FIELD_ALIASES.values() for key in keys})
+    values = [None, "", 0, 55, "ip", "high"]
+
+    for mapping in FEED_SCHEMAS.values():
+        normalize = compile_schema(mapping)
+        for _ in range(2000):
+            keys = {key for key in mapping.values() if rng.random() < 0.9}
+            keys |= {key for key in aliases if rng.random() < 0.1}
+            raw = {key: rng.choice(values) for key in keys}
+            assert normalize(raw, "S") == normalize_indicator(raw, "S")
+
+
+def test_truncated_feed_is_dropped(feeds):
+    path = feeds[0][0]
+    text = open(path).read()
+    with open(path, "w") as f:
+        f.write(text[:text.index("}") + 1])
+
+    result = aggregate_feeds(feeds)
+
+    assert ("ip", "203.0.113.0") not in result["unique"]
+    assert result["total_loaded"] == 11
+    assert [timing["loaded"] for timing in result["feed_timings"]] == [0, 7, 4]
+
+
+@pytest.mark.parametrize("use_threads", [False, True])
+def test_pooled_feeds_match_serial_run(tmp_path, feeds, use_threads):
+    write_feed(tmp_path / "c.json", [make_record(i, confidence=95, threat="critical") for i in range(8, 12)] + [{"id": "bad"}])
+
+    serial = aggregate_feeds(feeds)
+    pooled = aggregate_feeds(feeds, workers=3, use_threads=use_threads)
+
+    assert list(pooled["unique"].items()) == list(serial["unique"].items())
+    for key in ("total_loaded", "valid_count", "duplicates", "error_count", "error_samples"):
+        assert pooled[key] == serial[key]
+    assert [sample.split(":")[0] for sample in pooled["error_samples"]] == ["Indicator 13", "Indicator 18"]
+
+    def timings(result):
+        return [(t["source"], t["path"], t["loaded"], t["cached"]) for t in result["feed_timings"]]
+    assert timings(pooled) == timings(serial)
+    assert [t["source"] for t in pooled["feed_timings"]] == ["VendorA", "VendorB", "VendorC"]
+
+    unique = list(pooled["unique"].values())
+    stats = generate_statistics(pooled["total_loaded"], pooled["valid_count"], len(unique), unique,
+                                count_sources(unique), pooled["feed_timings"])
+    section = build_text_summary(stats).split("FEED TIMINGS\n")[1].splitlines()[1:4]
+    assert [line.split(" in ")[0] for line in section] == [
+        "VendorA: 7 indicators", "VendorB: 7 indicators", "VendorC: 5 indicators"
+    ]
+
+
+def test_store_matches_in_memory_after_edits_removals_and_reorders(tmp_path, feeds):
+    with IndicatorStore(str(tmp_path / "store.db")) as store:
+        update_store(store, feeds)
+        assert snapshot(store.query()) == in_memory(feeds)
+
+        # edit one record, remove another and add a new one
+        write_feed(tmp_path / "a.json", [make_record(i, confidence=99) for i in range(0, 3)] + [make_record(1, "domain")])
+        write_feed(tmp_path / "c.json", [make_record(i, confidence=95, threat="critical") for i in range(8, 14)])
+        update_store(store, feeds)
+        assert snapshot(store.query()) == in_memory(feeds)
+
+        # a different feed order changes which record wins confidence ties
+        reordered = [feeds[2], feeds[0], feeds[1]]
+        assert in_memory(reordered) != in_memory(feeds)
+        update_store(store, reordered)
+        assert snapshot(store.query()) == in_memory(reordered)
+
+        # dropping a feed removes what only it contributed
+        update_store(store, feeds[:2])
+        assert snapshot(store.query()) == in_memory(feeds[:2])
+
+
+def test_store_with_cache_skips_unchanged_feeds(tmp_path, feeds):
+    cache_dir = str(tmp_path / "cache")
+
+    with IndicatorStore(str(tmp_path / "store.db")) as store:
+        update_store(store, feeds, FeedCache(cache_dir))
+        result = update_store(store, feeds, FeedCache(cache_dir))
+        assert [timing["cached"] for timing in result["feed_timings"]] == [True, True, True]
+        assert result["changed"] == 0
+
+        write_feed(tmp_path / "b.json", [make_record(i, confidence=80) for i in range(4, 7)])
+        result = update_store(store, feeds, FeedCache(cache_dir))
+        assert [timing["cached"] for timing in result["feed_timings"]] == [True, False, True]
+        assert snapshot(store.query()) == in_memory(feeds)
+
+
+def test_feed_cache_hits_and_invalidation(tmp_path, feeds):
+    cache_dir = tmp_path / "cache"
+    expected = in_memory(feeds)
+
+    first = aggregate_feeds(feeds, cache=FeedCache(str(cache_dir)))
+    assert not any(timing["cached"] for timing in first["feed_timings"])
+
+    second = aggregate_feeds(feeds, cache=FeedCache(str(cache_dir)))
+    assert all(timing["cached"] for timing in second["feed_timings"])
+    assert snapshot(second["unique"].values()) == expected
+    assert second["error_samples"] == first["error_samples"]
+
+    # a changed feed is parsed again
+    write_feed(tmp_path / "c.json", [make_record(20)])
+    third = aggregate_feeds(feeds, cache=FeedCache(str(cache_dir)))
+    assert [timing["cached"] for timing in third["feed_timings"]] == [True, True, False]
+    assert snapshot(third["unique"].values()) == in_memory(feeds)
+
+    # an unreadable cache file is a miss, not a crash
+    for name in os.listdir(cache_dir):
+        if name != "manifest.json":
+            (cache_dir / name).write_text("not json")
+    fourth = aggregate_feeds(feeds, cache=FeedCache(str(cache_dir)))
+    assert not any(timing["cached"] for timing in fourth["feed_timings"])
+    assert snapshot(fourth["unique"].values()) == in_memory(feeds)
+
+
+def test_index_query_matches_filter_indicators():
+    rng = random.Random(5)
+    levels = sorted(VALID_LEVELS)
+    types = sorted(VALID_TYPES)
+    confidences = [0, 40, 84.5, 85, 85.0, 90, 99.9, 100]
+    indicators = [
+        {"type": rng.choice(types), "value": str(i), "threat_level": rng.choice(levels),
+         "confidence": rng.choice(confidences)}
+        for i in range(500)
+    ]
+    index = IndicatorIndex(indicators)
+
+    for _ in range(500):
+        min_conf = rng.choice(confidences + [-1, 84.9, 101])
+        some_levels = rng.sample(levels, rng.randint(0, len(levels)))
+        some_types = rng.sample(types, rng.randint(0, len(types)))
+
+        expected = filter_indicators(indicators, min_conf, some_levels, some_types)
+        assert index.query(min_conf, some_levels, some_types) == expected
+        assert index.count(min_conf, some_levels, some_types) == len(expected)
+
+        # None selects every level or type
+        assert index.query(min_conf, None, some_types) == filter_indicators(indicators, min_conf, levels, some_types)
+        assert index.query(min_conf, some_levels, None) == filter_indicators(indicators, min_conf, some_levels, types)
+
+
+def test_load_exports_skips_invalid_and_duplicate_variants(tmp_path):
+    path = tmp_path / "exports.json"
+    path.write_text(json.dumps([
+        {"name": "soc", "levels": None},
+        {"name": "a"},
+        {"name": "a", "min_conf": 0},
+        {"name": "b", "types": ["ip", 3]},
+        {"name": "c", "levels": ["critical"], "types": ["ip"]}
+    ]))
+
+    assert [export["name"] for export in load_exports(str(path))] == ["a", "c"]
+
+
+def test_threat_lookup_indexes_ips_by_prefix_and_domains_by_label():
+    def indicator(kind, value):
+        return {"type": kind, "value": value, "threat_level": "high", "confidence": 90, "sources": ["A"]}
+
+    lookup = build_threat_lookup([
+        indicator("ip", "203.0.113.0/24"),
+        indicator("ip", "203.0.113.77"),
+        indicator("ip", "203.0.113.5/24"),
+        indicator("ip", "2001:db8::/32"),
+        indicator("ip", "not-an-ip"),
+        indicator("domain", "Evil.Example."),
+        indicator("domain", "*.cdn.evil.example"),
+        indicator("domain", "evil.example"),
+        indicator("domain", "bad..example"),
+        indicator("hash", "d41d8cd98f00b204e9800998ecf8427e")
+    ])
+
+    assert [ind["value"] for ind in lookup["indicators"]] == [
+        "203.0.113.0/24", "203.0.113.77", "2001:db8::/32", "Evil.Example.", "*.cdn.evil.example"
+    ]
+    assert lookup["ipv4"] == {"24": {str(0xCB007100 >> 8): 0}, "32": {str(0xCB00714D): 1}}
+    assert lookup["ipv6"] == {"32": {str(0x20010DB8): 2}}
+    assert lookup["domains"] == {"example": {"evil": {"": 3, "cdn": {"": 4}}}}
+    assert lookup["skipped"] == 2
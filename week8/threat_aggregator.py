@@ -2,14 +2,29 @@
 """
 CVNP2646 - Threat Intelligence Aggregator
 Loads 3 JSON feeds with different schemas, normalizes indicators,
-validates, deduplicates, filters, and outputs 3 formats:
+validates, deduplicates, filters, and outputs 4 formats:
 - firewall_blocklist.json
 - siem_feed.json
 - summary_report.txt
+- threat_lookup.json (IP/CIDR and domain lookup for the other tools)
 """
 
+import argparse
+import gc
+import hashlib
+import ipaddress
 import json
+import os
+import re
+import sqlite3
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import chain, groupby, islice
+from operator import itemgetter
 from datetime import datetime
+from functools import partial
 from collections import Counter
 
 
@@ -52,6 +67,202 @@ def extract_raw_indicators(feed_data):
     return []
 
 
+# -------------------------
+# Streaming Feed Reader
+# -------------------------
+FEED_ARRAY_KEYS = ("indicators", "feed", "items")
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+READ_CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class JSONStreamReader:
+    """
+    Reads a JSON document from a text file through a small buffer, one
+    value at a time, so large arrays never have to be held in memory.
+    """
+
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def _read_more(self):
+        """Append the next chunk to the buffer. Returns False at end of file."""
+        if self.eof:
+            return False
+
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        # drop everything already consumed
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def error(self, msg, pos=None):
+        """Build a ValueError pointing at a position in the file."""
+        if pos is None:
+            pos = self.pos
+        return ValueError(f"{msg}: char {self.offset + pos}")
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error(f"Expecting {' or '.join(repr(c) for c in chars)}")
+
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Decode and return the next complete JSON value."""
+        self.peek()
+
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # the value may just continue in the next chunk
+                truncated = e.msg.startswith("Unterminated string") or e.pos >= len(self.buffer) - 16
+                if truncated and self._read_more():
+                    continue
+                raise self.error(e.msg, e.pos)
+
+            # a number cut off by the end of the buffer continues in the next chunk
+            if self._may_continue(value, end) and self._read_more():
+                continue
+
+            self.pos = end
+            return value
+
+    def _may_continue(self, value, end):
+        if end == len(self.buffer):
+            return True
+        return isinstance(value, (int, float)) and self.buffer[end] in _NUMBER_CHARS
+
+    def iter_object_keys(self):
+        """
+        Yield the keys of the object at the current position.
+        The caller must consume each value before asking for the next key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+
+        while True:
+            key = self.decode()
+            if not isinstance(key, str):
+                raise self.error("Expecting property name")
+
+            self.expect(":")
+            yield key
+
+            if self.expect(",}") == "}":
+                return
+
+    def iter_array(self, skip=False):
+        """Yield the elements of the array at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+
+        while True:
+            if skip:
+                self.skip()
+                yield None
+            else:
+                yield self.decode()
+
+            if self.expect(",]") == "]":
+                return
+
+    def skip(self):
+        """Consume the next value without building large arrays or objects."""
+        char = self.peek()
+        if char == "{":
+            for _ in self.iter_object_keys():
+                self.skip()
+        elif char == "[":
+            for _ in self.iter_array(skip=True):
+                pass
+        else:
+            self.decode()
+
+
+def _iter_feed_object(reader):
+    """Yield the elements of the first indicator array in a feed document."""
+    if reader.peek() == "{":
+        streamed = False
+        for key in reader.iter_object_keys():
+            if not streamed and key in FEED_ARRAY_KEYS and reader.peek() == "[":
+                streamed = True
+                yield from reader.iter_array()
+            else:
+                reader.skip()
+    else:
+        # not a feed object, so there are no indicators (same as extract_raw_indicators)
+        reader.skip()
+
+    if reader.peek():
+        raise reader.error("Extra data")
+
+
+def _iter_ndjson(f, filepath):
+    """Yield one indicator per non-empty line, skipping malformed lines."""
+    for line_no, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"ERROR: Malformed JSON in {filepath} line {line_no}: {e}")
+
+
+def read_feed_indicators(filepath):
+    """
+    Stream raw indicator dicts from a feed file one at a time.
+    NDJSON files (.ndjson / .jsonl) hold one indicator per line.
+    Other files are read as one JSON object and the first "indicators",
+    "feed" or "items" array in it is streamed; everything else is skipped.
+    Raises OSError or ValueError if the file cannot be read.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        if str(filepath).lower().endswith(NDJSON_SUFFIXES):
+            yield from _iter_ndjson(f, filepath)
+        else:
+            yield from _iter_feed_object(JSONStreamReader(f))
+
+
+def feed_error_message(filepath, error):
+    """Console message for a feed that read_feed_indicators could not read."""
+    if isinstance(error, FileNotFoundError):
+        return f"ERROR: Missing file: {filepath}"
+    return f"ERROR: Malformed JSON in {filepath}: {error}"
+
+
 # -------------------------
 # Normalize
 # -------------------------
@@ -86,6 +297,123 @@ def normalize_indicator(raw, source_name):
     }
 
 
+# -------------------------
+# Schema Mapping
+# -------------------------
+NORMALIZED_FIELDS = ("id", "type", "value", "confidence", "threat_level", "first_seen")
+
+# Vendor keys normalize_indicator tries for each field, in order
+FIELD_ALIASES = {
+    "id": ("id", "ioc_id", "ref"),
+    "type": ("type", "indicator_type", "category"),
+    "value": ("value", "indicator_value", "ioc"),
+    "confidence": ("confidence", "score", "reliability"),
+    "threat_level": ("threat", "severity", "risk"),
+    "first_seen": ("first_seen", "seen", "date"),
+}
+
+# Known feed schemas: normalized field -> vendor key.
+# Support a new vendor by adding its mapping here.
+FEED_SCHEMAS = {
+    "vendor_a": {
+        "id": "id", "type": "type", "value": "value",
+        "confidence": "confidence", "threat_level": "threat", "first_seen": "first_seen"
+    },
+    "vendor_b": {
+        "id": "ioc_id", "type": "indicator_type", "value": "indicator_value",
+        "confidence": "score", "threat_level": "severity", "first_seen": "seen"
+    },
+    "vendor_c": {
+        "id": "ref", "type": "category", "value": "ioc",
+        "confidence": "reliability", "threat_level": "risk", "first_seen": "date"
+    },
+}
+
+SCHEMA_SAMPLE_SIZE = 5
+
+
+def detect_schema(records):
+    """
+    Name of the FEED_SCHEMAS entry whose keys best match the sample
+    records, or None if no schema has both a type and a value key there.
+    """
+    best = None
+    best_hits = 0
+    records = [record for record in records if isinstance(record, dict)]
+
+    for name, mapping in FEED_SCHEMAS.items():
+        if not any(mapping["type"] in r and mapping["value"] in r for r in records):
+            continue
+
+        keys = set(mapping.values())
+        hits = sum(len(keys & record.keys()) for record in records)
+        if hits > best_hits:
+            best = name
+            best_hits = hits
+
+    return best
+
+
+def compile_schema(mapping):
+    """
+    Build a normalizer for records that follow one schema: a single
+    itemgetter call replaces the per-field .get() fallbacks. Records
+    missing a mapped key, or carrying another schema's keys, go through
+    normalize_indicator, so the result is always the same as its.
+    """
+    keys = tuple(mapping[field] for field in NORMALIZED_FIELDS)
+    getter = itemgetter(*keys)
+    other_aliases = frozenset(chain.from_iterable(FIELD_ALIASES.values())) - set(keys)
+
+    # Matches the `or` chains in normalize_indicator: a falsy value becomes
+    # None, except for confidence and for the last key of a chain.
+    id_or_none, type_or_none, value_or_none, _, threat_or_none, seen_or_none = (
+        field != "confidence" and key != FIELD_ALIASES[field][-1]
+        for field, key in zip(NORMALIZED_FIELDS, keys)
+    )
+
+    def normalize(raw, source_name):
+        if not other_aliases.isdisjoint(raw):
+            return normalize_indicator(raw, source_name)
+        try:
+            _id, _type, _value, _confidence, _threat, _seen = getter(raw)
+        except KeyError:
+            return normalize_indicator(raw, source_name)
+
+        return {
+            "id": (_id or None) if id_or_none else _id,
+            "type": (_type or None) if type_or_none else _type,
+            "value": (_value or None) if value_or_none else _value,
+            "confidence": _confidence,
+            "threat_level": (_threat or None) if threat_or_none else _threat,
+            "first_seen": (_seen or None) if seen_or_none else _seen,
+            "sources": [source_name]
+        }
+
+    return normalize
+
+
+def normalize_feed(raws, source_name, schema=None):
+    """
+    Normalize a stream of raw indicators from one feed. The schema (a
+    FEED_SCHEMAS name or a mapping) is detected from the first records
+    unless given; feeds that match no schema use normalize_indicator.
+    """
+    raws = iter(raws)
+    if schema is None:
+        sample = list(islice(raws, SCHEMA_SAMPLE_SIZE))
+        schema = detect_schema(sample)
+        raws = chain(sample, raws)
+
+    if schema is None:
+        normalize = normalize_indicator
+    else:
+        normalize = compile_schema(FEED_SCHEMAS[schema] if isinstance(schema, str) else schema)
+
+    for raw in raws:
+        yield normalize(raw, source_name)
+
+
 # -------------------------
 # Validate
 # -------------------------
@@ -93,6 +421,55 @@ VALID_TYPES = {"ip", "domain", "hash", "url"}
 VALID_LEVELS = {"low", "medium", "high", "critical"}
 
 
+REQUIRED_FIELDS = ("id", "type", "value", "confidence", "threat_level")
+
+
+def check_indicator(ind):
+    """
+    Check one normalized indicator (strips its value in place).
+    Returns what is wrong with it, or None if the indicator is valid.
+    """
+    # Required fields must exist and be usable
+    for field in REQUIRED_FIELDS:
+        if ind.get(field) is None:
+            return f"missing required field '{field}'"
+
+    # Type checks + value checks
+    if not isinstance(ind["value"], str) or ind["value"].strip() == "":
+        return "'value' must be a non-empty string"
+
+    ind["value"] = ind["value"].strip()
+
+    if ind["type"] not in VALID_TYPES:
+        return f"invalid type '{ind['type']}'"
+
+    if not isinstance(ind["confidence"], (int, float)):
+        return "confidence must be numeric"
+
+    if not (0 <= ind["confidence"] <= 100):
+        return "confidence out of range (0-100)"
+
+    if ind["threat_level"] not in VALID_LEVELS:
+        return f"invalid threat_level '{ind['threat_level']}'"
+
+    # sources must be list
+    if not isinstance(ind.get("sources"), list):
+        return "sources must be a list"
+
+    return None
+
+
+def validate_indicator(ind, idx):
+    """
+    Validate one normalized indicator (strips its value in place).
+    Returns an error message, or None if the indicator is valid.
+    """
+    problem = check_indicator(ind)
+    if problem:
+        return f"Indicator {idx}: {problem}"
+    return None
+
+
 def validate_indicators(indicators):
     """
     Validate normalized indicators.
@@ -102,48 +479,44 @@ def validate_indicators(indicators):
     errors = []
 
     for idx, ind in enumerate(indicators):
-        # Required fields must exist and be usable
-        for field in ["id", "type", "value", "confidence", "threat_level"]:
-            if field not in ind or ind[field] is None:
-                errors.append(f"Indicator {idx}: missing required field '{field}'")
-                break
+        error = validate_indicator(ind, idx)
+        if error:
+            errors.append(error)
         else:
-            # Type checks + value checks
-            if not isinstance(ind["value"], str) or ind["value"].strip() == "":
-                errors.append(f"Indicator {idx}: 'value' must be a non-empty string")
-                continue
+            valid.append(ind)
 
-            ind["value"] = ind["value"].strip()
+    return valid, len(errors), errors
 
-            if ind["type"] not in VALID_TYPES:
-                errors.append(f"Indicator {idx}: invalid type '{ind['type']}'")
-                continue
 
-            if not isinstance(ind["confidence"], (int, float)):
-                errors.append(f"Indicator {idx}: confidence must be numeric")
-                continue
+# -------------------------
+# Deduplicate
+# -------------------------
+def merge_indicator(unique, ind):
+    """
+    Add one valid indicator to a dedup store keyed by (type, value).
+    Keeps the highest confidence record and merges sources lists.
+    Returns True if the indicator was a duplicate.
+    """
+    key = (ind["type"], ind["value"])
+    existing = unique.get(key)
 
-            if not (0 <= ind["confidence"] <= 100):
-                errors.append(f"Indicator {idx}: confidence out of range (0-100)")
-                continue
+    if existing is None:
+        unique[key] = ind
+        return False
 
-            if ind["threat_level"] not in VALID_LEVELS:
-                errors.append(f"Indicator {idx}: invalid threat_level '{ind['threat_level']}'")
-                continue
+    # merge sources (avoid duplicates)
+    merged_sources = list(set(existing["sources"] + ind["sources"]))
 
-            # sources must be list
-            if not isinstance(ind.get("sources"), list):
-                errors.append(f"Indicator {idx}: sources must be a list")
-                continue
+    # keep highest confidence indicator
+    if ind["confidence"] > existing["confidence"]:
+        ind["sources"] = merged_sources
+        unique[key] = ind
+    else:
+        existing["sources"] = merged_sources
 
-            valid.append(ind)
-
-    return valid, len(errors), errors
+    return True
 
 
-# -------------------------
-# Deduplicate
-# -------------------------
 def deduplicate_indicators(indicators):
     """
     Dedupe using key (type, value).
@@ -155,25 +528,8 @@ def deduplicate_indicators(indicators):
     dup_count = 0
 
     for ind in indicators:
-        key = (ind["type"], ind["value"])
-
-        if key not in unique:
-            unique[key] = ind
-            continue
-
-        dup_count += 1
-        existing = unique[key]
-
-        # merge sources (avoid duplicates)
-        merged_sources = list(set(existing["sources"] + ind["sources"]))
-
-        # keep highest confidence indicator
-        if ind["confidence"] > existing["confidence"]:
-            ind["sources"] = merged_sources
-            unique[key] = ind
-        else:
-            existing["sources"] = merged_sources
-            unique[key] = existing
+        if merge_indicator(unique, ind):
+            dup_count += 1
 
     return list(unique.values()), dup_count
 
@@ -187,6 +543,9 @@ def filter_indicators(indicators, min_conf=85, levels=None, types=None):
     if types is None:
         types = ["ip", "domain"]
 
+    levels = set(levels)
+    types = set(types)
+
     return [
         ind for ind in indicators
         if ind["confidence"] >= min_conf
@@ -195,6 +554,859 @@ def filter_indicators(indicators, min_conf=85, levels=None, types=None):
     ]
 
 
+# -------------------------
+# Indexed Query
+# -------------------------
+class IndicatorIndex:
+    """
+    In-memory index over deduplicated indicators. Each (type, threat_level)
+    bucket keeps its indicators sorted by confidence, so a query only
+    touches the buckets it selects and bisects the confidence cut-off
+    instead of rescanning every indicator.
+    """
+
+    def __init__(self, indicators):
+        self.indicators = list(indicators)
+        confidences = [ind["confidence"] for ind in self.indicators]
+
+        positions = {}
+        for pos, ind in enumerate(self.indicators):
+            positions.setdefault((ind["type"], ind["threat_level"]), []).append(pos)
+
+        # stable sort, so equal confidences keep store order
+        self.buckets = {}
+        for key, bucket in positions.items():
+            bucket.sort(key=confidences.__getitem__)
+            self.buckets[key] = ([confidences[pos] for pos in bucket], bucket)
+
+    def __len__(self):
+        return len(self.indicators)
+
+    def _positions(self, min_conf, levels, types):
+        for (_type, level), (confidences, bucket) in self.buckets.items():
+            if types is not None and _type not in types:
+                continue
+            if levels is not None and level not in levels:
+                continue
+            yield bucket[bisect_left(confidences, min_conf):]
+
+    def count(self, min_conf=0, levels=None, types=None):
+        """Number of indicators a query would return."""
+        return sum(len(part) for part in self._positions(min_conf, levels, types))
+
+    def query(self, min_conf=0, levels=None, types=None):
+        """
+        Indicators with confidence >= min_conf whose threat_level and type
+        are in levels and types (None means any), in store order, the
+        same as filter_indicators.
+        """
+        levels = None if levels is None else set(levels)
+        types = None if types is None else set(types)
+        positions = sorted(chain.from_iterable(self._positions(min_conf, levels, types)))
+        return [self.indicators[pos] for pos in positions]
+
+
+# -------------------------
+# Export Variants
+# -------------------------
+DEFAULT_EXPORT = {"name": "", "min_conf": 85, "levels": ["high", "critical"], "types": ["ip", "domain"]}
+EXPORT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def load_exports(filepath):
+    """
+    Read export variants from a JSON list such as
+      [{"name": "soc", "min_conf": 90, "levels": ["critical"], "types": ["ip"]}]
+    Missing filters default to DEFAULT_EXPORT's. Invalid variants are
+    reported and skipped.
+    """
+    data = load_json(filepath)
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        print(f"ERROR: {filepath} must hold a list of export variants")
+        return []
+
+    exports = []
+    names = set()
+    for idx, variant in enumerate(data):
+        if not isinstance(variant, dict) or not EXPORT_NAME.match(str(variant.get("name", ""))):
+            print(f"ERROR: Export {idx}: needs a name made of letters, digits, '_' or '-'")
+            continue
+
+        export = dict(DEFAULT_EXPORT, **variant)
+        export["name"] = str(export["name"])
+        if export["name"] in names:
+            print(f"ERROR: Export {idx}: name '{export['name']}' is already used")
+            continue
+        if not isinstance(export["min_conf"], (int, float)):
+            print(f"ERROR: Export {idx}: min_conf must be numeric")
+            continue
+        if not all(isinstance(export[key], list) and all(isinstance(item, str) for item in export[key])
+                   for key in ("levels", "types")):
+            print(f"ERROR: Export {idx}: levels and types must be lists of strings")
+            continue
+        if not set(export["levels"]) <= VALID_LEVELS or not set(export["types"]) <= VALID_TYPES:
+            print(f"ERROR: Export {idx}: unknown threat level or type")
+            continue
+
+        names.add(export["name"])
+        exports.append(export)
+
+    return exports
+
+
+def export_paths(export):
+    """Firewall and SIEM output files of one export variant."""
+    if not export["name"]:
+        return "firewall_blocklist.json", "siem_feed.json"
+    return f"firewall_blocklist_{export['name']}.json", f"siem_feed_{export['name']}.json"
+
+
+def write_export(query, export):
+    """
+    Run one export variant through query (IndicatorIndex.query,
+    IndicatorStore.query or filter_indicators over a list) and write its
+    firewall and SIEM files.
+    """
+    indicators = list(query(min_conf=export["min_conf"], levels=export["levels"], types=export["types"]))
+    firewall_path, siem_path = export_paths(export)
+
+    write_json(firewall_path, transform_to_firewall(indicators))
+    write_json(siem_path, transform_to_siem(indicators))
+    return indicators
+
+
+# -------------------------
+# Threat Lookup
+# -------------------------
+THREAT_LOOKUP_PATH = "threat_lookup.json"
+THREAT_LOOKUP_FORMAT = "threat_lookup"
+THREAT_LOOKUP_VERSION = 1
+
+
+def domain_labels(domain):
+    """Lower-case labels of a domain ("*." prefix dropped), or None if malformed."""
+    domain = domain.strip().lower().rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+
+    labels = domain.split(".")
+    if not domain or "" in labels:
+        return None
+    return labels
+
+
+def build_threat_lookup(indicators):
+    """
+    Build the lookup file other tools use to tag traffic with blocklist hits.
+      ipv4 / ipv6: prefix length -> {leading network bits: indicator index}.
+        Longest-prefix matching is one dict probe per prefix length, so
+        IP values may be single addresses or CIDR networks.
+      domains: reversed-label trie, e.g. {"com": {"evil": {"": index}}}.
+        A domain indicator also matches all of its subdomains.
+    Values that are not valid IPs or domains are counted in "skipped".
+    The IP readers live in week4, week6 and week12; week12 also matches
+    host-name sources against the domains.
+    """
+    entries = []
+    tables = {4: {}, 6: {}}
+    domains = {}
+    skipped = 0
+
+    for ind in indicators:
+        if ind["type"] == "ip":
+            try:
+                network = ipaddress.ip_network(ind["value"], strict=False)
+            except ValueError:
+                skipped += 1
+                continue
+
+            table = tables[network.version].setdefault(str(network.prefixlen), {})
+            key = str(int(network.network_address) >> (network.max_prefixlen - network.prefixlen))
+            if key in table:
+                continue
+            table[key] = len(entries)
+
+        elif ind["type"] == "domain":
+            labels = domain_labels(ind["value"])
+            if labels is None:
+                skipped += 1
+                continue
+
+            node = domains
+            for label in reversed(labels):
+                node = node.setdefault(label, {})
+            if "" in node:
+                continue
+            node[""] = len(entries)
+
+        else:
+            continue
+
+        entries.append({
+            "value": ind["value"],
+            "type": ind["type"],
+            "threat_level": ind["threat_level"],
+            "confidence": ind["confidence"],
+            "sources": ind["sources"]
+        })
+
+    return {
+        "format": THREAT_LOOKUP_FORMAT,
+        "version": THREAT_LOOKUP_VERSION,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "skipped": skipped,
+        "indicators": entries,
+        "ipv4": tables[4],
+        "ipv6": tables[6],
+        "domains": domains
+    }
+
+
+# -------------------------
+# Fused Pipeline
+# -------------------------
+ERROR_SAMPLE_LIMIT = 3
+FEED_WORKERS = min(4, os.cpu_count() or 1)
+
+
+@contextmanager
+def paused_gc(freeze=False):
+    """
+    Indicator records never form reference cycles (refcounting frees
+    them), so keep the cyclic GC from rescanning millions of them while
+    they are created. With freeze=True every object alive at the end is
+    also moved out of the GC's view for good; only main does that, as it
+    owns the whole process.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if freeze:
+            gc.freeze()
+        if was_enabled:
+            gc.enable()
+
+
+def new_aggregate():
+    """Empty dedup store plus the pipeline counters."""
+    return {
+        "unique": {},
+        "total_loaded": 0,
+        "valid_count": 0,
+        "duplicates": 0,
+        "error_count": 0,
+        "error_samples": [],
+        "feed_timings": []
+    }
+
+
+def add_error(result, idx, problem):
+    result["error_count"] += 1
+    if len(result["error_samples"]) < ERROR_SAMPLE_LIMIT:
+        result["error_samples"].append(f"Indicator {idx}: {problem}")
+
+
+def add_timing(result, path, source, loaded, seconds, cached=False):
+    result["feed_timings"].append({
+        "source": source,
+        "path": path,
+        "loaded": loaded,
+        "seconds": seconds,
+        "cached": cached
+    })
+
+
+def load_feed(path, source):
+    """
+    Stream, normalize and validate one feed (runs in a pool worker).
+    Returns a batch dict with the valid indicators, the feed-local
+    indexes of the first few errors and the time it took. "complete" is
+    False if the feed could not be read to the end.
+    """
+    started = time.perf_counter()
+    valid = []
+    loaded = 0
+    error_count = 0
+    error_samples = []
+    complete = True
+
+    with paused_gc():
+        try:
+            for ind in normalize_feed(read_feed_indicators(path), source):
+                problem = check_indicator(ind)
+
+                if problem:
+                    error_count += 1
+                    if len(error_samples) < ERROR_SAMPLE_LIMIT:
+                        error_samples.append((loaded, problem))
+                else:
+                    valid.append(ind)
+
+                loaded += 1
+        except (FileNotFoundError, ValueError) as e:
+            print(feed_error_message(path, e))
+            complete = False
+
+    return {
+        "path": path,
+        "source": source,
+        "indicators": valid,
+        "loaded": loaded,
+        "valid": len(valid),
+        "error_count": error_count,
+        "error_samples": error_samples,
+        "complete": complete,
+        "cached": False,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def count_batch(result, batch):
+    """Add a batch's counts and errors to result, continuing the global index."""
+    offset = result["total_loaded"]
+
+    for idx, problem in batch["error_samples"]:
+        add_error(result, offset + idx, problem)
+    result["error_count"] += batch["error_count"] - len(batch["error_samples"])
+
+    result["total_loaded"] += batch["loaded"]
+    result["valid_count"] += batch["valid"]
+
+
+def merge_batch(result, batch):
+    """
+    Merge one load_feed batch into the dedup store, in feed order.
+    A feed that could not be read to the end is left out entirely, like
+    a feed load_json cannot read, so no half feed reaches the blocklist.
+    """
+    started = time.perf_counter()
+    if not batch["complete"]:
+        add_timing(result, batch["path"], batch["source"], 0, batch["seconds"])
+        return
+
+    count_batch(result, batch)
+
+    unique = result["unique"]
+    for ind in batch["indicators"]:
+        if merge_indicator(unique, ind):
+            result["duplicates"] += 1
+
+    seconds = batch["seconds"] + time.perf_counter() - started
+    add_timing(result, batch["path"], batch["source"], batch["loaded"], seconds, batch["cached"])
+
+
+def feed_batches(feeds, workers=1, use_threads=False, cache=None):
+    """
+    Yield one load_feed batch per feed, in feed order. Feeds the cache
+    has seen unchanged are read back from it; the rest are parsed (in a
+    pool when workers > 1) and saved to the cache.
+    """
+    entries = [None] * len(feeds)
+    digests = [None] * len(feeds)
+    if cache is not None:
+        for i, (path, source) in enumerate(feeds):
+            digests[i] = cache.digest(path)
+            entries[i] = cache.lookup(path, source, digests[i])
+
+    todo = [feeds[i] for i, entry in enumerate(entries) if entry is None]
+    paths = [path for path, _ in todo]
+    sources = [source for _, source in todo]
+
+    with ExitStack() as stack:
+        if workers > 1 and len(todo) > 1:
+            pool_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+            pool = stack.enter_context(pool_class(max_workers=min(workers, len(todo))))
+            parsed = pool.map(load_feed, paths, sources)
+        else:
+            parsed = map(load_feed, paths, sources)
+
+        for (path, source), entry, digest in zip(feeds, entries, digests):
+            batch = cache.load(entry) if entry else None
+            if batch is None:
+                batch = next(parsed) if entry is None else load_feed(path, source)
+                if cache is not None and digest and batch["complete"]:
+                    cache.save(batch, digest)
+            yield batch
+
+    if cache is not None:
+        cache.save_manifest()
+
+
+def aggregate_feeds(feeds, workers=1, use_threads=False, cache=None):
+    """
+    Normalize, validate and deduplicate every indicator of every feed into
+    a single dict store keyed by (type, value).
+    Each feed is streamed into a batch, from a FeedCache if it is
+    unchanged or else parsed (in a process pool, or a thread pool for
+    slow I/O-bound sources, when workers > 1). The batches are merged in
+    feed order, so the output is the same either way. Only one feed's
+    batch is held at a time when workers=1.
+    Returns a dict with the store, the counts, a few sample errors and
+    per-feed timings.
+    """
+    result = new_aggregate()
+
+    with paused_gc():
+        for batch in feed_batches(list(feeds), workers, use_threads, cache):
+            merge_batch(result, batch)
+
+    return result
+
+
+# -------------------------
+# Feed Cache
+# -------------------------
+CACHE_VERSION = 3
+BATCH_FIELDS = {"path", "source", "indicators", "loaded", "valid", "error_count", "error_samples", "complete"}
+MANIFEST_NAME = "manifest.json"
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(filepath):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeedCache:
+    """
+    Manifest of each feed's size, mtime and content hash, plus a JSON copy of
+    its normalized and validated batch, so unchanged feeds are not parsed
+    again. The hash is only recomputed when size or mtime change.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.feeds = {}
+        self.stats = {}
+
+        manifest = load_json(self.manifest_path) if os.path.exists(self.manifest_path) else None
+        if isinstance(manifest, dict) and manifest.get("version") == CACHE_VERSION:
+            self.feeds = manifest.get("feeds", {})
+
+    def _cache_path(self, key, source):
+        name = hashlib.sha256(f"{key}\0{source}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{name}.json")
+
+    def digest(self, path):
+        """Content hash of a feed, or None if it cannot be read."""
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        self.stats[key] = (st.st_size, st.st_mtime_ns)
+        entry = self.feeds.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+
+        try:
+            return file_digest(path)
+        except OSError:
+            return None
+
+    def lookup(self, path, source, digest):
+        """Manifest entry of an unchanged feed with a cached batch, else None."""
+        key = os.path.abspath(path)
+        entry = self.feeds.get(key)
+        if not (digest and entry and entry["sha256"] == digest and entry["source"] == source):
+            return None
+        if not os.path.exists(self._cache_path(key, source)):
+            return None
+
+        # same content under a new mtime (e.g. touched): skip hashing next time
+        entry["size"], entry["mtime_ns"] = self.stats[key]
+        return entry
+
+    def load(self, entry):
+        """Read a cached batch back, or None if the cache file is unusable."""
+        started = time.perf_counter()
+        try:
+            with open(self._cache_path(entry["path"], entry["source"]), "r", encoding="utf-8") as f:
+                batch = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # written by another version, or not by this cache at all
+        if not isinstance(batch, dict) or batch.get("version") != CACHE_VERSION \
+                or not BATCH_FIELDS <= batch.keys():
+            return None
+
+        batch["cached"] = True
+        batch["seconds"] = time.perf_counter() - started
+        return batch
+
+    def save(self, batch, digest):
+        """Cache a complete batch and record the feed in the manifest."""
+        key = os.path.abspath(batch["path"])
+        cache_path = self._cache_path(key, batch["source"])
+
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+            # dumps uses the C encoder; dump() would stream it in Python
+            f.write(json.dumps(dict(batch, version=CACHE_VERSION), separators=(",", ":")))
+        os.replace(cache_path + ".tmp", cache_path)
+
+        size, mtime_ns = self.stats[key]
+        self.feeds[key] = {
+            "path": key,
+            "source": batch["source"],
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": digest,
+            "loaded": batch["loaded"],
+            "valid": batch["valid"],
+            "error_count": batch["error_count"],
+            "error_samples": batch["error_samples"]
+        }
+
+    def save_manifest(self):
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "feeds": self.feeds}, f, indent=2)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+
+# -------------------------
+# Persistent Store
+# -------------------------
+# Columns without a declared type keep the exact value stored, so an int
+# confidence stays an int and a float stays a float.
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    source TEXT PRIMARY KEY,
+    rank INTEGER NOT NULL,
+    path TEXT,
+    digest TEXT
+);
+CREATE TABLE IF NOT EXISTS feed_indicators (
+    type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    source TEXT NOT NULL,
+    confidence,
+    threat_level TEXT,
+    first_seen,
+    position INTEGER,
+    PRIMARY KEY (type, value, source)
+);
+CREATE INDEX IF NOT EXISTS feed_indicators_source ON feed_indicators (source);
+CREATE TABLE IF NOT EXISTS indicators (
+    type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    confidence,
+    threat_level TEXT,
+    first_seen,
+    sources TEXT,
+    first_rank INTEGER,
+    first_position INTEGER,
+    PRIMARY KEY (type, value)
+);
+CREATE INDEX IF NOT EXISTS indicators_order ON indicators (first_rank, first_position);
+CREATE INDEX IF NOT EXISTS indicators_filter ON indicators (type, threat_level, confidence);
+CREATE TEMP TABLE IF NOT EXISTS incoming (
+    type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    confidence,
+    threat_level TEXT,
+    first_seen,
+    position INTEGER,
+    PRIMARY KEY (type, value)
+);
+CREATE TEMP TABLE IF NOT EXISTS affected (
+    type TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (type, value)
+);
+"""
+
+# Duplicates inside one feed keep the first highest confidence record,
+# but the position of the key's first appearance.
+INSERT_INCOMING = """
+INSERT INTO incoming (type, value, confidence, threat_level, first_seen, position)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (type, value) DO UPDATE SET
+    confidence = excluded.confidence,
+    threat_level = excluded.threat_level,
+    first_seen = excluded.first_seen
+WHERE excluded.confidence > incoming.confidence
+"""
+
+MARK_CHANGED = """
+INSERT OR IGNORE INTO affected (type, value)
+SELECT i.type, i.value FROM incoming i
+WHERE NOT EXISTS (
+    SELECT 1 FROM feed_indicators f
+    WHERE f.type = i.type AND f.value = i.value AND f.source = ?
+    AND f.confidence IS i.confidence AND typeof(f.confidence) = typeof(i.confidence)
+    AND f.threat_level IS i.threat_level
+    AND f.first_seen IS i.first_seen AND typeof(f.first_seen) = typeof(i.first_seen)
+    AND f.position IS i.position
+)
+"""
+
+MARK_REMOVED = """
+INSERT OR IGNORE INTO affected (type, value)
+SELECT f.type, f.value FROM feed_indicators f
+WHERE f.source = ?
+AND NOT EXISTS (SELECT 1 FROM incoming i WHERE i.type = f.type AND i.value = f.value)
+"""
+
+
+def _sql_value(value):
+    """SQLite only stores scalars; keep anything else as its JSON text."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value)
+
+
+class IndicatorStore:
+    """
+    Persistent dedup store in SQLite, keyed by (type, value).
+    feed_indicators holds what each feed contributed last run, and
+    indicators holds the merged record for every key (highest confidence,
+    merged sources), so a run only has to apply what changed.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        self.conn.execute("PRAGMA cache_size = -65536")
+        self.conn.executescript(STORE_SCHEMA)
+
+        # stores created before feed digests were tracked
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(feeds)")]
+        if "digest" not in columns:
+            self.conn.execute("ALTER TABLE feeds ADD COLUMN digest TEXT")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def begin_run(self, feeds):
+        """
+        Record this run's feed order. Keys from feeds that were dropped or
+        moved are recomputed, since order decides ties and output order.
+        """
+        conn = self.conn
+        conn.execute("DELETE FROM affected")
+
+        ranks = {source: rank for rank, (_, source) in enumerate(feeds)}
+        for source, rank in conn.execute("SELECT source, rank FROM feeds").fetchall():
+            if ranks.get(source) == rank:
+                continue
+
+            conn.execute(
+                "INSERT OR IGNORE INTO affected SELECT type, value FROM feed_indicators WHERE source = ?",
+                (source,)
+            )
+            if source not in ranks:
+                conn.execute("DELETE FROM feed_indicators WHERE source = ?", (source,))
+                conn.execute("DELETE FROM feeds WHERE source = ?", (source,))
+
+        conn.executemany(
+            """
+            INSERT INTO feeds (source, rank, path) VALUES (?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET rank = excluded.rank, path = excluded.path
+            """,
+            [(source, rank, str(path)) for rank, (path, source) in enumerate(feeds)]
+        )
+
+    def feed_digest(self, source):
+        """Content hash of the feed snapshot last applied for source, if known."""
+        row = self.conn.execute("SELECT digest FROM feeds WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def apply_feed(self, source, indicators, digest=None):
+        """
+        Replace one feed's snapshot with the given valid indicators, only
+        touching the keys that changed. Nothing is applied if reading the
+        indicators raises. digest is the feed's content hash, if known.
+        Returns the number of changed keys.
+        """
+        conn = self.conn
+        conn.execute("DELETE FROM incoming")
+        conn.executemany(INSERT_INCOMING, (
+            (ind["type"], ind["value"], ind["confidence"], ind["threat_level"], _sql_value(ind.get("first_seen")), position)
+            for position, ind in enumerate(indicators)
+        ))
+
+        before = conn.total_changes
+        conn.execute(MARK_CHANGED, (source,))
+        conn.execute(MARK_REMOVED, (source,))
+        changed = conn.total_changes - before
+
+        conn.execute("""
+            DELETE FROM feed_indicators
+            WHERE source = ? AND (type, value) IN (SELECT type, value FROM affected)
+        """, (source,))
+        conn.execute("""
+            INSERT INTO feed_indicators (type, value, source, confidence, threat_level, first_seen, position)
+            SELECT i.type, i.value, ?, i.confidence, i.threat_level, i.first_seen, i.position
+            FROM incoming i JOIN affected a ON a.type = i.type AND a.value = i.value
+        """, (source,))
+        conn.execute("DELETE FROM incoming")
+        conn.execute("UPDATE feeds SET digest = ? WHERE source = ?", (digest, source))
+        return changed
+
+    def _merged_rows(self):
+        """Merge the feed snapshots of every affected key, like merge_indicator."""
+        rows = self.conn.execute("""
+            SELECT f.type, f.value, f.source, f.confidence, f.threat_level, f.first_seen, f.position, feeds.rank
+            FROM affected a
+            JOIN feed_indicators f ON f.type = a.type AND f.value = a.value
+            JOIN feeds ON feeds.source = f.source
+            ORDER BY f.type, f.value, feeds.rank
+        """)
+
+        for (_type, value), group in groupby(rows, key=itemgetter(0, 1)):
+            group = list(group)
+            best = group[0]
+            for row in group[1:]:
+                if row[3] > best[3]:
+                    best = row
+
+            sources = json.dumps([row[2] for row in group])
+            yield (_type, value, best[3], best[4], best[5], sources, group[0][7], group[0][6])
+
+    def finish_run(self):
+        """Rebuild the merged indicators of every changed key and commit."""
+        conn = self.conn
+        conn.execute("DELETE FROM indicators WHERE (type, value) IN (SELECT type, value FROM affected)")
+        conn.executemany("""
+            INSERT INTO indicators (type, value, confidence, threat_level, first_seen, sources, first_rank, first_position)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, list(self._merged_rows()))
+
+        changed = conn.execute("SELECT COUNT(*) FROM affected").fetchone()[0]
+        conn.execute("DELETE FROM affected")
+        conn.commit()
+        return changed
+
+    def unique_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM indicators").fetchone()[0]
+
+    def source_counts(self):
+        """Unique indicators per source, in feed order."""
+        return dict(self.conn.execute("""
+            SELECT f.source, COUNT(*) FROM feed_indicators f
+            JOIN feeds ON feeds.source = f.source
+            GROUP BY f.source ORDER BY MIN(feeds.rank)
+        """))
+
+    def query(self, min_conf=0, levels=None, types=None):
+        """Yield merged indicators in first-seen order, optionally filtered."""
+        sql = "SELECT type, value, confidence, threat_level, first_seen, sources FROM indicators WHERE confidence >= ?"
+        params = [min_conf]
+
+        for column, allowed in (("threat_level", levels), ("type", types)):
+            if allowed is not None:
+                allowed = list(allowed)
+                sql += f" AND {column} IN ({', '.join('?' * len(allowed))})"
+                params += allowed
+
+        sql += " ORDER BY first_rank, first_position"
+        for _type, value, confidence, level, seen, sources in self.conn.execute(sql, params):
+            yield {
+                "type": _type,
+                "value": value,
+                "confidence": confidence,
+                "threat_level": level,
+                "first_seen": seen,
+                "sources": json.loads(sources)
+            }
+
+
+def _valid_feed_indicators(path, source, counts):
+    """Stream one feed's valid normalized indicators, counting into a batch-shaped dict."""
+    for ind in normalize_feed(read_feed_indicators(path), source):
+        problem = check_indicator(ind)
+        idx = counts["loaded"]
+        counts["loaded"] += 1
+
+        if problem:
+            counts["error_count"] += 1
+            if len(counts["error_samples"]) < ERROR_SAMPLE_LIMIT:
+                counts["error_samples"].append((idx, problem))
+            continue
+
+        counts["valid"] += 1
+        yield ind
+
+
+def update_store(store, feeds, cache=None):
+    """
+    Stream every feed into a persistent IndicatorStore, applying only what
+    changed since the last run. With a FeedCache, a feed whose content
+    hash matches the snapshot already in the store is skipped entirely.
+    A feed that cannot be read keeps its stored indicators.
+    Returns the same counters as aggregate_feeds, plus "changed" (keys
+    updated this run); the dedup store stays in SQLite.
+    """
+    result = new_aggregate()
+    feeds = list(feeds)
+    store.begin_run(feeds)
+
+    for path, source in feeds:
+        started = time.perf_counter()
+
+        if cache is None:
+            counts = {"loaded": 0, "valid": 0, "error_count": 0, "error_samples": []}
+            try:
+                store.apply_feed(source, _valid_feed_indicators(path, source, counts))
+                count_batch(result, counts)
+            except (FileNotFoundError, ValueError) as e:
+                print(feed_error_message(path, e))
+                print(f"Keeping stored {source} indicators")
+                counts["loaded"] = 0
+
+            add_timing(result, path, source, counts["loaded"], time.perf_counter() - started)
+            continue
+
+        digest = cache.digest(path)
+        entry = cache.lookup(path, source, digest)
+
+        if entry and store.feed_digest(source) == digest:
+            # the store already holds exactly this feed
+            count_batch(result, entry)
+            add_timing(result, path, source, entry["loaded"], time.perf_counter() - started, cached=True)
+            continue
+
+        batch = (cache.load(entry) if entry else None) or load_feed(path, source)
+
+        if batch["complete"]:
+            count_batch(result, batch)
+            store.apply_feed(source, batch["indicators"], digest)
+            if not batch["cached"] and digest:
+                cache.save(batch, digest)
+        else:
+            print(f"Keeping stored {source} indicators")
+            batch["loaded"] = 0
+
+        add_timing(result, path, source, batch["loaded"], time.perf_counter() - started, batch["cached"])
+
+    if cache is not None:
+        cache.save_manifest()
+
+    result["changed"] = store.finish_run()
+    result["duplicates"] = max(0, result["valid_count"] - store.unique_count())
+    return result
+
+
 # -------------------------
 # Transform Outputs
 # -------------------------
@@ -262,6 +1474,14 @@ def build_text_summary(stats):
     for k, v in stats["source_contribution"].items():
         lines.append(f"{k}: {v}")
 
+    if stats.get("feed_timings"):
+        lines.append("")
+        lines.append("FEED TIMINGS")
+        lines.append("-" * 70)
+        for t in stats["feed_timings"]:
+            cached = " [cached]" if t.get("cached") else ""
+            lines.append(f"{t['source']}: {t['loaded']} indicators in {t['seconds']:.3f}s ({t['path']}){cached}")
+
     lines.append("=" * 70)
     return "\n".join(lines)
 
@@ -269,25 +1489,29 @@ def build_text_summary(stats):
 # -------------------------
 # Statistics
 # -------------------------
-def generate_statistics(total_loaded, valid_list, unique_list, filtered_list):
-    type_counts = Counter(ind["type"] for ind in filtered_list)
-    severity_counts = Counter(ind["threat_level"] for ind in filtered_list)
-
+def count_sources(unique_list):
     source_counts = Counter()
     for ind in unique_list:
         for s in ind["sources"]:
             source_counts[s] += 1
+    return dict(source_counts)
+
+
+def generate_statistics(total_loaded, valid_count, unique_count, filtered_list, source_counts, feed_timings=None):
+    type_counts = Counter(ind["type"] for ind in filtered_list)
+    severity_counts = Counter(ind["threat_level"] for ind in filtered_list)
 
     return {
         "generated_at": datetime.now().isoformat(timespec="seconds"),
         "total_loaded": total_loaded,
-        "valid_count": len(valid_list),
-        "unique_count": len(unique_list),
+        "valid_count": valid_count,
+        "unique_count": unique_count,
         "filtered_count": len(filtered_list),
-        "duplicates_removed": total_loaded - len(unique_list),
+        "duplicates_removed": total_loaded - unique_count,
         "type_distribution": dict(type_counts),
         "severity_distribution": dict(severity_counts),
-        "source_contribution": dict(source_counts)
+        "source_contribution": source_counts,
+        "feed_timings": feed_timings or []
     }
 
 
@@ -304,62 +1528,93 @@ def write_text(filepath, text):
         f.write(text)
 
 
-def main():
-    feeds = [
-        ("vendor_a.json", "VendorA"),
-        ("vendor_b.json", "VendorB"),
-        ("vendor_c.json", "VendorC"),
-    ]
+def create_parser():
+    parser = argparse.ArgumentParser(description="Aggregate vendor threat feeds into firewall and SIEM outputs")
 
-    normalized_all = []
-    total_loaded = 0
+    parser.add_argument("--store", help="SQLite indicator store; only changes since the last run are applied")
+    parser.add_argument("-w", "--workers", type=int, default=FEED_WORKERS,
+                        help="Feeds loaded in parallel (default: %(default)s)")
+    parser.add_argument("--threads", action="store_true", help="Use threads instead of processes for --workers")
+    parser.add_argument("--cache-dir", help="Cache normalized feeds here and skip feeds that have not changed")
+    parser.add_argument("--exports", help="JSON list of extra filtered export variants to write from the same load")
 
-    for path, source in feeds:
-        data = load_json(path)
-        if data is None:
-            continue
+    return parser
 
-        raw_list = extract_raw_indicators(data)
-        total_loaded += len(raw_list)
 
-        for raw in raw_list:
-            normalized_all.append(normalize_indicator(raw, source))
+def main(argv=None):
+    args = create_parser().parse_args(argv)
 
-    valid_list, error_count, error_messages = validate_indicators(normalized_all)
-
-    unique_list, dup_count = deduplicate_indicators(valid_list)
-
-    filtered_list = filter_indicators(unique_list, min_conf=85, levels=["high", "critical"], types=["ip", "domain"])
+    feeds = [
+        ("vendor_a.json", "VendorA"),
+        ("vendor_b.json", "VendorB"),
+        ("vendor_c.json", "VendorC"),
+    ]
 
-    firewall_out = transform_to_firewall(filtered_list)
-    siem_out = transform_to_siem(filtered_list)
+    cache = FeedCache(args.cache_dir) if args.cache_dir else None
+    exports = [DEFAULT_EXPORT] + (load_exports(args.exports) if args.exports else [])
 
-    stats = generate_statistics(total_loaded, valid_list, unique_list, filtered_list)
-    summary_txt = build_text_summary(stats)
+    with ExitStack() as stack:
+        # the loaded indicators live until exit, so freeze them after loading
+        stack.enter_context(paused_gc(freeze=True))
 
-    write_json("firewall_blocklist.json", firewall_out)
-    write_json("siem_feed.json", siem_out)
-    write_text("summary_report.txt", summary_txt)
+        if args.store:
+            store = stack.enter_context(IndicatorStore(args.store))
+            result = update_store(store, feeds, cache)
+            query = store.query
+            unique_count = store.unique_count()
+            source_counts = store.source_counts()
+        else:
+            result = aggregate_feeds(feeds, workers=args.workers, use_threads=args.threads, cache=cache)
+            unique_list = list(result["unique"].values())
+            unique_count = len(unique_list)
+            source_counts = count_sources(unique_list)
+
+            # one scan is cheaper than building the index for a single export
+            if len(exports) > 1:
+                query = IndicatorIndex(unique_list).query
+            else:
+                query = partial(filter_indicators, unique_list)
+
+        # every variant is answered from the same load
+        export_counts = {}
+        for export in exports:
+            indicators = write_export(query, export)
+            export_counts[export["name"]] = len(indicators)
+            if not export["name"]:
+                filtered_list = indicators
+
+    stats = generate_statistics(
+        result["total_loaded"], result["valid_count"], unique_count, filtered_list, source_counts,
+        result["feed_timings"]
+    )
+    write_text("summary_report.txt", build_text_summary(stats))
+
+    lookup = build_threat_lookup(filtered_list)
+    write_json(THREAT_LOOKUP_PATH, lookup)
 
     # Console output (useful for video)
     print("=" * 70)
     print("AGGREGATOR RUN COMPLETE")
     print("=" * 70)
-    print(f"Loaded indicators:      {total_loaded}")
-    print(f"Valid indicators:       {len(valid_list)}")
-    print(f"Validation errors:      {error_count}")
-    print(f"Duplicates removed:     {dup_count}")
+    print(f"Loaded indicators:      {result['total_loaded']}")
+    print(f"Valid indicators:       {result['valid_count']}")
+    print(f"Validation errors:      {result['error_count']}")
+    print(f"Duplicates removed:     {result['duplicates']}")
+    if "changed" in result:
+        print(f"Store keys changed:     {result['changed']}")
     print(f"Filtered output count:  {len(filtered_list)}")
     print("-" * 70)
-    if error_messages:
+    if result["error_samples"]:
         print("Sample validation errors:")
-        for msg in error_messages[:3]:
+        for msg in result["error_samples"]:
             print(f" - {msg}")
     print("-" * 70)
     print("Outputs created:")
-    print(" - firewall_blocklist.json")
-    print(" - siem_feed.json")
+    for export in exports:
+        for path in export_paths(export):
+            print(f" - {path}" + (f" ({export_counts[export['name']]} indicators)" if export["name"] else ""))
     print(" - summary_report.txt")
+    print(f" - {THREAT_LOOKUP_PATH} ({len(lookup['indicators'])} indicators)")
 
 
 if __name__ == "__main__":